@@ -1,69 +1,699 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Blueprint, Flask, Response, abort, current_app, g, render_template, request, jsonify, send_from_directory, session, stream_with_context, url_for
 from flask_cors import CORS
+import click
 import os
-from dotenv import load_dotenv
-from models.groq_client import GroqClient
-from models.memory import Memory
+import atexit
+import math
+import mimetypes
+import threading
+from models.async_groq_client import AsyncGroqClient
+from models.groq_client import DEGRADED_MESSAGE, GroqClient
+from models.db import enable_incremental_vacuum
+from models.memory import Memory, decode_cursor
+from models.conversation_writer import ConversationWriter
+from models.semantic_index import SemanticIndex
+from models.summarizer import ConversationSummarizer
+from models.assets import BUILD_DIR, CACHE_CONTROL, MANIFEST_NAME, AssetManifest, build_assets, precompressed
+from models.admission import AdmissionControl, ConcurrencyLimiter, RateLimiter, client_address, retry_after_header
+from models.metrics import metrics
+from models.profiler import RequestProfiler
+from models.resilience import CallPolicy, CircuitBreaker
+from models.retention import ColdArchive, RetentionManager
+from models.web_search import MAX_RESULTS, WebSearch, providers_from_config
 from config import Config
 import json
+import queue
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables
-load_dotenv()
+class Services:
+    """The app's services, each built on first use in the current process
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-app.config.from_object(Config)
+    Importing the app builds nothing: no HTTP client, SQLite connection or
+    background thread exists until a request (or command) needs it, so worker
+    start-up is cheap and a gunicorn master can preload the app (``--preload``)
+    without handing its handles to the workers it forks. Instances are kept
+    per process id; a forked worker builds its own on first use.
+    """
 
-# Initialize services
-groq_client = GroqClient()
-memory = Memory(db_path=os.path.join(os.path.dirname(__file__), "assistant.db"))
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._pid = None
+        self._instances = {}
 
-@app.route('/')
+    def _get(self, name, build):
+        if self._pid == os.getpid() and name in self._instances:
+            return self._instances[name]
+        with self._lock:
+            if self._pid != os.getpid():
+                self._instances = {}
+                self._pid = os.getpid()
+            if name not in self._instances:
+                self._instances[name] = build(self)
+            return self._instances[name]
+
+    def peek(self, name):
+        """A service if this process has already built it, else None"""
+        with self._lock:
+            return self._instances.get(name) if self._pid == os.getpid() else None
+
+    def service(build):
+        """Turn a builder method into a lazily built, per-process attribute"""
+        return property(lambda services: services._get(build.__name__, build), doc=build.__doc__)
+
+    @service
+    def groq_client(self):
+        """Groq API client, compacting long conversations into summaries when enabled"""
+        client = GroqClient()
+        if Config.SUMMARY_ENABLED:
+            client.summarizer = ConversationSummarizer(
+                client,
+                self.memory,
+                trigger_tokens=Config.SUMMARY_TRIGGER_TOKENS,
+                keep_tokens=Config.SUMMARY_KEEP_TOKENS,
+                max_tokens=Config.SUMMARY_MAX_TOKENS,
+                # A breaker of its own, so background failures don't refuse user requests
+                policy=CallPolicy(
+                    timeout=Config.LLM_TIMEOUT,
+                    attempt_timeout=Config.LLM_ATTEMPT_TIMEOUT,
+                    max_retries=Config.LLM_MAX_RETRIES,
+                    backoff_base=Config.LLM_BACKOFF_BASE,
+                    backoff_max=Config.LLM_BACKOFF_MAX,
+                    breaker=CircuitBreaker(
+                        failure_threshold=Config.LLM_BREAKER_THRESHOLD,
+                        reset_timeout=Config.LLM_BREAKER_RESET,
+                    ),
+                ),
+            )
+        return client
+
+    @service
+    def async_groq_client(self):
+        """Asyncio client for the native chat endpoints of asgi.py"""
+        return AsyncGroqClient(
+            self.groq_client,
+            max_concurrency=Config.LLM_MAX_CONCURRENCY,
+            max_connections=Config.LLM_MAX_CONNECTIONS,
+        )
+
+    @service
+    def memory(self):
+        """Memory store; migrates the schema only if that hasn't been done at start-up"""
+        return Memory(
+            db_path=Config.DATABASE_PATH,
+            pool_size=Config.DATABASE_POOL_SIZE,
+            dedup_distance=Config.MEMORY_DEDUP_DISTANCE if Config.MEMORY_DEDUP_ENABLED else None,
+            dedup_similarity=Config.MEMORY_DEDUP_SIMILARITY,
+            compression=Config.MESSAGE_COMPRESSION,
+        )
+
+    @service
+    def conversation_writer(self):
+        """Background writer of the conversation log"""
+        return ConversationWriter(
+            self.memory,
+            durability=Config.CONVERSATION_DURABILITY,
+            max_queue=Config.CONVERSATION_QUEUE_SIZE,
+            batch_size=Config.CONVERSATION_BATCH_SIZE,
+            flush_interval=Config.CONVERSATION_FLUSH_INTERVAL,
+        )
+
+    @service
+    def semantic_index(self):
+        """Vector index of the memories, or None when disabled"""
+        if not Config.SEMANTIC_MEMORY_ENABLED:
+            return None
+        index = SemanticIndex(self.memory)
+        atexit.register(index.close)
+        return index
+
+    @service
+    def retention(self):
+        """Decays memory importance and moves old or low-value rows to the cold archive, or None"""
+        if not Config.RETENTION_ENABLED:
+            return None
+        semantic_index = self.semantic_index
+        return RetentionManager(
+            self.memory,
+            archive=ColdArchive(Config.RETENTION_ARCHIVE_PATH) if Config.RETENTION_ARCHIVE_PATH else None,
+            half_life_days=Config.RETENTION_HALF_LIFE_DAYS,
+            access_bump=Config.RETENTION_ACCESS_BUMP,
+            min_score=Config.RETENTION_MIN_SCORE,
+            min_age_days=Config.RETENTION_MIN_AGE_DAYS,
+            max_memories=Config.RETENTION_MAX_MEMORIES,
+            message_days=Config.RETENTION_MESSAGE_DAYS,
+            max_messages=Config.RETENTION_MAX_MESSAGES,
+            max_db_mb=Config.RETENTION_MAX_DB_MB,
+            archive_days=Config.RETENTION_ARCHIVE_DAYS,
+            interval=Config.RETENTION_INTERVAL,
+            vacuum_pages=Config.RETENTION_VACUUM_PAGES,
+            on_archive=semantic_index.remove if semantic_index is not None else None,
+        )
+
+    @service
+    def web_search(self):
+        """Web search fanned out across the configured providers"""
+        return WebSearch(
+            providers_from_config(
+                [name.strip() for name in Config.SEARCH_PROVIDERS.split(',') if name.strip()],
+                api_key=Config.SEARCH_API_KEY,
+                engine_id=Config.SEARCH_ENGINE_ID,
+                fixture_path=Config.SEARCH_FIXTURE_PATH or None,
+            ),
+            timeout=Config.SEARCH_TIMEOUT,
+            cache_ttl=Config.SEARCH_CACHE_TTL,
+            cache_size=Config.SEARCH_CACHE_SIZE,
+        )
+
+    @service
+    def profiler(self):
+        """Samples the stacks of requests that ask for it, or of 1 in N requests"""
+        return RequestProfiler(
+            Config.PROFILE_DIR,
+            token=Config.PROFILE_TOKEN,
+            sample_every=Config.PROFILE_SAMPLE_EVERY,
+            max_per_minute=Config.PROFILE_MAX_PER_MINUTE,
+            interval=Config.PROFILE_INTERVAL_MS / 1000,
+            keep=Config.PROFILE_KEEP,
+            backend=Config.PROFILE_BACKEND,
+        )
+
+    @service
+    def admission(self):
+        """Per-client token buckets shared by all workers and a cap on chat requests in flight, or None"""
+        if not Config.ADMISSION_ENABLED:
+            return None
+        return AdmissionControl(
+            RateLimiter(Config.ADMISSION_DB_PATH),
+            client_rate=Config.RATE_LIMIT_RATE,
+            client_burst=Config.RATE_LIMIT_BURST,
+            route_limits={route: (Config.RATE_LIMIT_LLM_RATE, Config.RATE_LIMIT_LLM_BURST) for route in LLM_ROUTES},
+            concurrency=ConcurrencyLimiter(
+                Config.ADMISSION_MAX_INFLIGHT,
+                max_waiting=Config.ADMISSION_QUEUE_SIZE,
+                timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+            ),
+        )
+
+    @service
+    def batch_executor(self):
+        """Shared by the batch requests of this worker; bounds how many completions they run at once"""
+        return ThreadPoolExecutor(max_workers=Config.BATCH_MAX_CONCURRENCY, thread_name_prefix="batch")
+
+    del service
+
+services = Services()
+
+# Routes, request hooks and commands, registered on the app by create_app
+bp = Blueprint('assistant', __name__, cli_group=None)
+
+@bp.before_app_request
+def start_request_trace():
+    """Start timing the request when instrumentation is enabled"""
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.trace = metrics.start_request(route, request.method, request.headers.get('X-Request-ID'))
+
+@bp.after_app_request
+def finish_request_trace(response):
+    """Record the request once its response body has been sent"""
+    trace = g.pop('trace', None)
+    if trace is not None:
+        response.headers['X-Request-ID'] = trace.request_id
+        # Runs after streamed bodies finish, so streaming requests are timed in full
+        response.call_on_close(lambda: metrics.finish_request(trace, response.status_code))
+    return response
+
+def profile_token():
+    """Profiling token supplied with the request, if any"""
+    return request.headers.get('X-Profile-Token') or request.args.get('profile')
+
+@bp.before_app_request
+def start_profiling():
+    """Profile this request if it carries the profiling token or is sampled"""
+    if not services.profiler.enabled:
+        return
+    trace = g.get('trace')
+    g.profile = services.profiler.start(trace.request_id if trace is not None else None, profile_token())
+
+@bp.after_app_request
+def finish_profiling(response):
+    """Store the request's profile once its response body has been sent"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.profile_id
+        response.call_on_close(lambda: services.profiler.finish(profile))
+    return response
+
+# Routes that call the LLM: limited per client and route, and queued behind the concurrency cap
+LLM_ROUTES = ('/api/send_message', '/api/stream_message', '/api/batch_send')
+
+def too_many_requests(message, retry_after):
+    """429 response telling the client when to come back"""
+    response = jsonify({"error": message, "retry_after": int(retry_after_header(retry_after))})
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+def request_cost(route, data):
+    """Tokens a request takes from its route bucket: one per message"""
+    if route == '/api/batch_send' and isinstance(data.get('messages'), list):
+        return max(len(data['messages']), 1)
+    return 1
+
+def request_slots(route, data):
+    """Concurrency slots a request holds: one per completion it runs at once"""
+    if route != '/api/batch_send' or not isinstance(data.get('messages'), list):
+        return 1
+    try:
+        concurrency = int(data.get('concurrency', Config.BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        # batch_send refuses it before running anything
+        return 1
+    return max(1, min(concurrency, Config.BATCH_MAX_CONCURRENCY, len(data['messages'])))
+
+def too_costly(route):
+    """413 response for a request costing more tokens than its bucket can ever hold"""
+    response = jsonify({"error": f"At most {services.admission.max_cost(route)} messages per request"})
+    response.status_code = 413
+    return response
+
+@bp.before_app_request
+def admit_request():
+    """Refuse API requests over their client's rate limit, and queue chat requests beyond the cap"""
+    if services.admission is None or request.url_rule is None or not request.path.startswith('/api/'):
+        return
+    route = request.url_rule.rule
+    client = client_address(request.remote_addr, request.headers.get('X-Forwarded-For'), Config.ADMISSION_TRUST_PROXY)
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    try:
+        retry_after = services.admission.check_rate(client, route, request_cost(route, data))
+    except Exception as e:
+        # Limiter failures admit the request rather than take the API down
+        metrics.log_error("Error checking rate limit", e)
+        retry_after = 0
+    if retry_after == math.inf:
+        return too_costly(route)
+    if retry_after:
+        return too_many_requests("Rate limit exceeded", retry_after)
+    
+    if route in LLM_ROUTES:
+        slots = request_slots(route, data)
+        with metrics.stage("admission"):
+            admitted = services.admission.concurrency.acquire(slots)
+        if not admitted:
+            return too_many_requests("Server is busy, try again later", services.admission.concurrency.timeout)
+        g.admission_slots = slots
+
+@bp.after_app_request
+def release_admission_slots(response):
+    """Free the request's concurrency slots once its response body has been sent"""
+    slots = g.pop('admission_slots', 0)
+    if slots:
+        response.call_on_close(lambda: services.admission.concurrency.release(slots))
+    return response
+
+@bp.teardown_app_request
+def release_admission_slots_on_error(error=None):
+    """Free the slots of a request that failed before a response was made"""
+    slots = g.pop('admission_slots', 0)
+    if slots:
+        services.admission.concurrency.release(slots)
+
+def get_session_id():
+    """Resolve the conversation session for the current request
+
+    Clients may pass an explicit ``session_id`` in the JSON body or the
+    ``X-Session-ID`` header; browsers fall back to an id kept in the signed
+    session cookie.
+    """
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id') or request.headers.get('X-Session-ID')
+    if session_id:
+        return str(session_id)[:128]
+    
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def use_response_cache(data, headers=None):
+    """Whether this request may be answered from the response cache
+
+    Clients opt out with ``"cache": false`` in the body or a
+    ``Cache-Control: no-cache`` request header.
+    """
+    if data.get('cache') is False:
+        return False
+    headers = request.headers if headers is None else headers
+    return 'no-cache' not in headers.get('Cache-Control', '')
+
+def build_memory_context(user_message):
+    """Build the memory context string passed along with a user message
+
+    Uses the memories most relevant to the message when the semantic index is
+    enabled, and the most recent memories otherwise.
+    """
+    relevant_memories = None
+    if services.semantic_index is not None:
+        try:
+            relevant_memories = services.semantic_index.search(
+                user_message,
+                k=Config.SEMANTIC_TOP_K,
+                budget_ms=Config.SEMANTIC_BUDGET_MS,
+                min_score=Config.SEMANTIC_MIN_SCORE,
+            )
+        except Exception as e:
+            metrics.log_error("Error searching semantic memory", e)
+    
+    if relevant_memories is None:
+        relevant_memories = services.memory.get_memories(limit=3)
+    if not relevant_memories:
+        return None
+    if services.retention is not None:
+        services.retention.record_access([mem["id"] for mem in relevant_memories])
+    context_items = [mem["content"] for mem in relevant_memories]
+    return "Here are some things to remember about our conversation: " + " ".join(context_items)
+
+def use_web_search(data):
+    """Whether web search results should be added to this request's prompt"""
+    if not services.web_search.enabled:
+        return False
+    return bool(data.get('web_search', Config.SEARCH_CONTEXT_ENABLED))
+
+def add_search_context(context, user_message):
+    """Append the top web search results for a message to its context"""
+    try:
+        results = services.web_search.search(user_message, limit=Config.SEARCH_CONTEXT_RESULTS)
+    except Exception as e:
+        metrics.log_error("Error searching the web", e)
+        return context
+    if not results:
+        return context
+    items = [f"{result['title']}: {result['snippet']} ({result['url']})" for result in results]
+    search_context = "Relevant web search results: " + " ".join(items)
+    return f"{context}\n\n{search_context}" if context else search_context
+
+def sse_event(payload, event=None):
+    """Format a JSON payload as a Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+@bp.app_context_processor
+def asset_helpers():
+    """Template helpers resolving static assets through the build manifest"""
+    assets = current_app.extensions['assets']
+    
+    def asset_url(name):
+        """URL of a static file, fingerprinted when built"""
+        built = assets.built(name)
+        return url_for('assistant.serve_asset', filename=built) if built else url_for('static', filename=name)
+    
+    def asset_urls(name):
+        """URLs to load for a bundle: the built bundle, or its source files before a build"""
+        built = assets.built(name)
+        if built:
+            return [url_for('assistant.serve_asset', filename=built)]
+        return [url_for('static', filename=source) for source in assets.sources(name)]
+    
+    return {"asset_url": asset_url, "asset_urls": asset_urls}
+
+@bp.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a built asset, precompressed if the client accepts it, cacheable for good"""
+    if filename == MANIFEST_NAME:
+        abort(404)
+    directory = os.path.join(current_app.static_folder, BUILD_DIR)
+    variant, encoding = precompressed(directory, filename, request.headers.get('Accept-Encoding'))
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(directory, variant, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers.pop('Content-Disposition', None)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@bp.route('/')
 def index():
     """Main page route"""
     return render_template('index.html')
 
-@app.route('/api/send_message', methods=['POST'])
+@bp.route('/api/send_message', methods=['POST'])
 def send_message():
     """API endpoint to process user messages"""
     data = request.get_json()
     user_message = data.get('message', '')
+    session_id = get_session_id()
     
     # Get context from memory if available
-    context = None
-    recent_memories = memory.get_memories(limit=3)
-    if recent_memories:
-        context_items = [mem["content"] for mem in recent_memories]
-        context = "Here are some things to remember about our conversation: " + " ".join(context_items)
+    with metrics.stage("memory_context"):
+        context = build_memory_context(user_message)
+    if use_web_search(data):
+        with metrics.stage("web_search"):
+            context = add_search_context(context, user_message)
     
     try:
         # Send message to Groq API
-        response = groq_client.send_message(user_message, context=context)
+        with metrics.stage("llm"):
+            response = services.groq_client.send_message(
+                user_message,
+                context=context,
+                session_id=session_id,
+                use_cache=use_response_cache(data),
+            )
         
         # Extract response from Groq
         assistant_message = response.get('message', "I'm sorry, I couldn't process your request.")
         
+        # A degraded answer is neither logged nor used for suggestions
+        if response.get('degraded'):
+            return jsonify({
+                "message": assistant_message,
+                "suggestions": ["Try again", "Help me with something else"],
+                "degraded": True
+            })
+        
         # Generate suggestions based on the conversation context
-        suggestions = generate_suggestions(user_message, assistant_message)
+        with metrics.stage("suggestions"):
+            suggestions = generate_suggestions(user_message, assistant_message)
         
-        # Store the conversation exchange in memory
-        memory.store_conversation([
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": assistant_message}
-        ])
+        # Queue the conversation exchange for storage off the request path
+        with metrics.stage("store_conversation"):
+            services.conversation_writer.submit([
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": assistant_message}
+            ], session_id=session_id)
         
         return jsonify({
             "message": assistant_message,
             "suggestions": suggestions
         })
     except Exception as e:
-        print(f"Error in message processing: {str(e)}")
+        metrics.log_error("Error in message processing", e)
         return jsonify({
             "message": "I'm having trouble connecting to my language model. Please try again later.",
             "suggestions": ["Try again", "Help me with something else"]
         })
 
-@app.route('/api/remember', methods=['POST'])
+@bp.route('/api/stream_message', methods=['POST'])
+def stream_message():
+    """API endpoint streaming the assistant response as Server-Sent Events
+
+    Each ``data`` event carries a ``delta`` with the newly generated text. A
+    final ``done`` event carries the complete message and suggestions.
+    """
+    data = request.get_json()
+    user_message = data.get('message', '')
+    session_id = get_session_id()
+    with metrics.stage("memory_context"):
+        context = build_memory_context(user_message)
+    if use_web_search(data):
+        with metrics.stage("web_search"):
+            context = add_search_context(context, user_message)
+    
+    def generate():
+        chunks = services.groq_client.stream_message(
+            user_message,
+            context=context,
+            session_id=session_id,
+            use_cache=use_response_cache(data),
+        )
+        parts = []
+        timer = metrics.stage("llm")
+        try:
+            with timer:
+                for delta in chunks:
+                    if not parts and metrics.active:
+                        metrics.record_stage("llm_first_token", time.perf_counter() - timer.started)
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+        finally:
+            # Stops the upstream request too if the client disconnected mid-stream
+            chunks.close()
+        
+        assistant_message = "".join(parts)
+        
+        # A degraded answer is neither logged nor used for suggestions
+        if assistant_message == DEGRADED_MESSAGE:
+            yield sse_event({
+                "message": assistant_message,
+                "suggestions": ["Try again", "Help me with something else"],
+                "degraded": True
+            }, event="done")
+            return
+        
+        with metrics.stage("suggestions"):
+            suggestions = generate_suggestions(user_message, assistant_message)
+        
+        # Queue the completed exchange for storage off the request path
+        with metrics.stage("store_conversation"):
+            services.conversation_writer.submit([
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": assistant_message}
+            ], session_id=session_id)
+        
+        yield sse_event({"message": assistant_message, "suggestions": suggestions}, event="done")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering so deltas are flushed immediately
+        },
+    )
+
+# Marks the end of a session group in the batch result queue
+_GROUP_DONE = object()
+
+def batch_item_result(index, item, use_cache):
+    """Answer one batch item; returns (result, conversation record or None)"""
+    if isinstance(item, str):
+        item = {"message": item}
+    user_message = item.get('message', '') if isinstance(item, dict) else ''
+    if not user_message:
+        return {"index": index, "error": "No message provided"}, None
+    session_id = item['session_id']
+    
+    try:
+        context = item['context'] if 'context' in item else build_memory_context(user_message)
+        response = services.groq_client.send_message(
+            user_message,
+            context=context,
+            session_id=session_id,
+            use_cache=use_cache and item.get('cache') is not False,
+        )
+        assistant_message = response.get('message', "I'm sorry, I couldn't process your request.")
+        if response.get('degraded'):
+            return {"index": index, "session_id": session_id, "message": assistant_message, "degraded": True}, None
+        
+        result = {
+            "index": index,
+            "session_id": session_id,
+            "message": assistant_message,
+            "suggestions": generate_suggestions(user_message, assistant_message),
+        }
+        record = services.memory.conversation_record([
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": assistant_message}
+        ], session_id=session_id)
+        return result, record
+    except Exception as e:
+        metrics.log_error("Error in batch message processing", e)
+        return {"index": index, "session_id": session_id, "error": "Failed to process message"}, None
+
+def run_batch_group(group, use_cache, report):
+    """Answer the items of one session in order, reporting each as it completes"""
+    try:
+        for index, item in group:
+            report(batch_item_result(index, item, use_cache))
+    finally:
+        report(_GROUP_DONE)
+
+def execute_batch(groups, concurrency, use_cache):
+    """Yield (result, record) pairs as items complete, running at most ``concurrency`` groups at once"""
+    completed = queue.Queue()
+    remaining = iter(groups)
+    
+    def submit_next():
+        group = next(remaining, None)
+        if group is None:
+            return 0
+        services.batch_executor.submit(run_batch_group, group, use_cache, completed.put)
+        return 1
+    
+    running = sum(submit_next() for _ in range(concurrency))
+    while running:
+        outcome = completed.get()
+        if outcome is _GROUP_DONE:
+            running -= 1
+            running += submit_next()
+            continue
+        yield outcome
+
+@bp.route('/api/batch_send', methods=['POST'])
+def batch_send():
+    """API endpoint answering many independent messages in parallel
+
+    Takes ``{"messages": [...]}`` where each item is a message string or an
+    object with ``message`` and optional ``session_id``, ``context`` and
+    ``cache``. Items without a session get a fresh one; items sharing a
+    session run in order. Returns ``{"results": [...]}`` in request order,
+    or with ``"stream": true`` one NDJSON line per item as it completes and
+    a final summary line. The exchanges are logged in one transaction once
+    every item has finished.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('messages')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Provide a non-empty list of messages"}), 400
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {Config.BATCH_MAX_ITEMS} messages per batch"}), 400
+    try:
+        concurrency = max(1, min(int(data.get('concurrency', Config.BATCH_MAX_CONCURRENCY)), Config.BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid concurrency"}), 400
+    use_cache = use_response_cache(data)
+    
+    # Group items by session so each session's turns stay in order
+    groups = {}
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            item = dict(item, session_id=str(item.get('session_id') or f"batch-{uuid.uuid4().hex}")[:128])
+        else:
+            item = {"message": item if isinstance(item, str) else '', "session_id": f"batch-{uuid.uuid4().hex}"}
+        groups.setdefault(item['session_id'], []).append((index, item))
+    
+    def store_records(records):
+        if not records:
+            return
+        try:
+            with metrics.stage("store_conversation"):
+                services.memory.store_conversations(records)
+        except Exception as e:
+            metrics.log_error("Error logging batch conversations", e)
+    
+    if data.get('stream'):
+        def generate():
+            records, errors = [], 0
+            for result, record in execute_batch(list(groups.values()), concurrency, use_cache):
+                if record is not None:
+                    records.append(record)
+                errors += 'error' in result
+                yield json.dumps(result) + "\n"
+            store_records(records)
+            yield json.dumps({"done": True, "count": len(items), "errors": errors}) + "\n"
+        
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    with metrics.stage("llm"):
+        outcomes = list(execute_batch(list(groups.values()), concurrency, use_cache))
+    store_records([record for _, record in outcomes if record is not None])
+    results = sorted((result for result, _ in outcomes), key=lambda result: result['index'])
+    return jsonify({"results": results})
+
+@bp.route('/api/remember', methods=['POST'])
 def remember():
     """Endpoint to store important information"""
     data = request.get_json()
@@ -73,14 +703,19 @@ def remember():
         return jsonify({"status": "error", "message": "No content provided"})
     
     try:
-        # Store memory with medium importance (2)
-        memory_id = memory.store_memory(memory_content, importance=2)
+        # Store memory with medium importance (2); repeats of a known fact are merged into it
+        memory_id, merged = services.memory.remember(memory_content, importance=2)
+        # A merged memory now holds this text, so its vector is replaced too
+        if services.semantic_index is not None:
+            services.semantic_index.add([(memory_id, memory_content)])
+        if merged:
+            return jsonify({"status": "success", "message": "Memory merged with an existing one", "id": memory_id, "merged": True})
         return jsonify({"status": "success", "message": "Memory stored", "id": memory_id})
     except Exception as e:
-        print(f"Error storing memory: {str(e)}")
+        metrics.log_error("Error storing memory", e)
         return jsonify({"status": "error", "message": "Failed to store memory"})
 
-@app.route('/api/search', methods=['POST'])
+@bp.route('/api/search', methods=['POST'])
 def search():
     """Endpoint for web search functionality"""
     data = request.get_json()
@@ -90,30 +725,47 @@ def search():
         return jsonify({"results": []})
     
     try:
-        # For now, we'll use mock results
-        # In a production system, integrate with a search API
-        mock_results = [
-            {"title": f"Search result for '{query}' - 1", "snippet": f"This is information about {query} from a web search.", "url": f"https://example.com/search/{query}/1"},
-            {"title": f"More about '{query}'", "snippet": f"Additional information and resources about {query} and related topics.", "url": f"https://example.com/search/{query}/2"}
-        ]
-        
-        return jsonify({"results": mock_results})
+        limit = max(1, min(int(data.get('limit', 5)), MAX_RESULTS))
+    except (TypeError, ValueError):
+        return jsonify({"results": [], "error": "Invalid limit"}), 400
+    
+    if not services.web_search.enabled:
+        return jsonify({"results": [], "error": "Web search is not configured"})
+    
+    try:
+        results = services.web_search.search(query, limit=limit)
+        return jsonify({"results": results})
     except Exception as e:
-        print(f"Error performing search: {str(e)}")
+        metrics.log_error("Error performing search", e)
         return jsonify({"results": [], "error": "Failed to perform search"})
 
-@app.route('/api/memories', methods=['GET'])
+@bp.route('/api/memories', methods=['GET'])
 def get_memories():
     """API endpoint to retrieve stored memories"""
     try:
         limit = int(request.args.get('limit', 10))
-        memories_list = memory.get_memories(limit=limit)
+        memories_list = services.memory.get_memories(limit=limit)
         return jsonify({"memories": memories_list})
     except Exception as e:
-        print(f"Error retrieving memories: {str(e)}")
+        metrics.log_error("Error retrieving memories", e)
         return jsonify({"memories": [], "error": "Failed to retrieve memories"})
 
-@app.route('/api/search_memories', methods=['POST'])
+@bp.route('/api/memories/<int:memory_id>', methods=['GET'])
+def get_memory(memory_id):
+    """API endpoint fetching one memory, from the archive if it was moved there"""
+    try:
+        if services.retention is not None:
+            found = services.retention.get_memories([memory_id])
+        else:
+            found = services.memory.get_memories_by_ids([memory_id])
+    except Exception as e:
+        metrics.log_error("Error retrieving memory", e)
+        return jsonify({"error": "Failed to retrieve memory"}), 500
+    if not found:
+        return jsonify({"error": "Memory not found"}), 404
+    return jsonify(found[0])
+
+@bp.route('/api/search_memories', methods=['POST'])
 def search_memories():
     """API endpoint to search stored memories"""
     data = request.get_json()
@@ -123,12 +775,186 @@ def search_memories():
         return jsonify({"results": []})
     
     try:
-        results = memory.search_memories(query)
+        results = services.memory.search_memories(query)
+        if services.retention is not None:
+            services.retention.record_access([result["id"] for result in results])
         return jsonify({"results": results})
     except Exception as e:
-        print(f"Error searching memories: {str(e)}")
+        metrics.log_error("Error searching memories", e)
         return jsonify({"results": [], "error": "Failed to search memories"})
 
+@bp.route('/api/conversations', methods=['GET'])
+def get_conversations():
+    """API endpoint returning logged messages newest first, one page at a time"""
+    cursor = request.args.get('cursor') or None
+    try:
+        limit = int(request.args.get('limit', 50))
+        if cursor is not None:
+            decode_cursor(cursor)
+    except ValueError:
+        return jsonify({"messages": [], "error": "Invalid cursor or limit"}), 400
+    # A ValueError from here on is a record that failed to decode, not a bad request
+    try:
+        page = services.memory.get_messages(
+            session_id=request.args.get('session_id'),
+            cursor=cursor,
+            limit=limit,
+        )
+    except Exception as e:
+        metrics.log_error("Error retrieving conversations", e)
+        return jsonify({"messages": [], "error": "Failed to retrieve conversations"}), 500
+    return jsonify(page)
+
+@bp.route('/api/conversations/export', methods=['GET'])
+def export_conversations():
+    """API endpoint streaming the message log as newline-delimited JSON, oldest first"""
+    session_id = request.args.get('session_id')
+    archived = request.args.get('archived', '').lower() in ('true', '1')
+    archive = services.retention.archive if services.retention is not None else None
+
+    def generate():
+        try:
+            # Archived messages are all older than the ones still in the main database
+            if archived and archive is not None:
+                for message in archive.iter_messages(session_id=session_id):
+                    yield json.dumps(message) + "\n"
+            for message in services.memory.iter_messages(session_id=session_id):
+                yield json.dumps(message) + "\n"
+        except Exception as e:
+            metrics.log_error("Error exporting conversations", e)
+
+    return Response(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename="conversations.ndjson"'},
+    )
+
+@bp.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    """API endpoint exposing conversation session cache statistics"""
+    stats = services.groq_client.sessions.stats()
+    if services.groq_client.summarizer is not None:
+        stats["summarizer"] = services.groq_client.summarizer.stats()
+    return jsonify(stats)
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """API endpoint exposing response cache statistics"""
+    if services.groq_client.cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(services.groq_client.cache.stats(), enabled=True))
+
+@bp.route('/api/retention/stats', methods=['GET'])
+def retention_stats():
+    """API endpoint exposing retention maintenance and archive statistics"""
+    if services.retention is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(services.retention.stats(), enabled=True))
+
+@bp.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    """API endpoint exposing rate limiting and concurrency cap statistics"""
+    if services.admission is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(services.admission.stats(), enabled=True))
+
+@bp.route('/api/search/stats', methods=['GET'])
+def search_stats():
+    """API endpoint exposing web search cache and provider statistics"""
+    return jsonify(services.web_search.stats())
+
+@bp.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    """API endpoint exposing LLM call retry, hedging and circuit breaker statistics"""
+    return jsonify(services.groq_client.policy.stats())
+
+@bp.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """API endpoint listing stored request profiles (requires the profiling token)"""
+    if not services.profiler.authorized(profile_token()):
+        return jsonify({"error": "Not authorized"}), 403
+    return jsonify({"profiles": services.profiler.list_profiles()})
+
+@bp.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """API endpoint returning a profile as collapsed stacks for flamegraph tools"""
+    if not services.profiler.authorized(profile_token()):
+        return jsonify({"error": "Not authorized"}), 403
+    collapsed = services.profiler.read_profile(profile_id)
+    if collapsed is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(collapsed, mimetype='text/plain')
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (only served when METRICS_ENABLED is set)"""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def collect_service_metrics():
+    """Expose the counters the services already keep as Prometheus samples
+
+    Only services this worker has already built are reported, so a scrape
+    never builds one.
+    """
+    groq_client = services.peek('groq_client')
+    if groq_client is not None:
+        sessions = groq_client.sessions.stats()
+        yield "sessions", "gauge", "Conversation sessions held in memory", sessions["sessions"]
+        yield "session_lookups_hit_total", "counter", "Session history lookups that found the session", sessions["hits"]
+        yield "session_lookups_miss_total", "counter", "Session history lookups that missed", sessions["misses"]
+        yield "session_hit_ratio", "gauge", "Share of session lookups that hit", sessions["hit_rate"]
+        
+        if groq_client.cache is not None:
+            cache = groq_client.cache.stats()
+            yield "response_cache_entries", "gauge", "Completions held in the response cache", cache["entries"]
+            yield "response_cache_hits_total", "counter", "Response cache hits", cache["hits"] + cache["persistent_hits"]
+            yield "response_cache_misses_total", "counter", "Response cache misses", cache["misses"]
+            yield "response_cache_coalesced_total", "counter", "Requests that waited on an identical in-flight call", cache["coalesced"]
+            yield "response_cache_hit_ratio", "gauge", "Share of response cache lookups that hit", cache["hit_rate"]
+        
+        llm = groq_client.policy.stats()
+        yield "llm_calls_total", "counter", "LLM calls made under the call policy", llm["calls"]
+        yield "llm_failures_total", "counter", "LLM calls that failed after retries", llm["failures"]
+        yield "llm_retries_total", "counter", "LLM call retries", llm["retries"]
+        yield "llm_hedges_total", "counter", "Hedged LLM requests sent", llm["hedges"]
+        yield "llm_breaker_open", "gauge", "1 while the LLM circuit breaker is open", int(llm["breaker"]["state"] != "closed")
+    
+    web_search = services.peek('web_search')
+    if web_search is not None and web_search.enabled:
+        search = web_search.stats()
+        yield "web_searches_total", "counter", "Web searches requested", search["searches"]
+        yield "web_search_cache_hits_total", "counter", "Web searches answered from the cache", search["cache_hits"]
+        yield "web_search_provider_errors_total", "counter", "Search provider calls that failed", sum(search["provider_errors"].values())
+        yield "web_search_provider_timeouts_total", "counter", "Search provider calls that missed their deadline", sum(search["provider_timeouts"].values())
+    
+    retention = services.peek('retention')
+    if retention is not None:
+        kept = retention.stats()
+        yield "memories_archived_total", "counter", "Memories moved to the cold archive", kept["archived_memories"]
+        yield "messages_archived_total", "counter", "Messages moved to the cold archive", kept["archived_messages"]
+        yield "retention_deleted_total", "counter", "Rows deleted by retention without archiving", kept["deleted"]
+    
+    admission = services.peek('admission')
+    if admission is not None:
+        admitted = admission.stats()
+        concurrency = admitted["concurrency"]
+        yield "rate_limited_total", "counter", "Requests refused for exceeding a rate limit", admitted["rate_limited"]
+        yield "admission_inflight", "gauge", "Chat requests being served", concurrency["active"]
+        yield "admission_waiting", "gauge", "Chat requests waiting for a slot", concurrency["waiting"]
+        yield "admission_rejected_total", "counter", "Chat requests refused because the queue was full", concurrency["rejected"]
+        yield "admission_timeouts_total", "counter", "Chat requests refused after waiting too long", concurrency["timed_out"]
+    
+    conversation_writer = services.peek('conversation_writer')
+    if conversation_writer is not None:
+        writer = conversation_writer.stats()
+        yield "conversation_queue_depth", "gauge", "Conversation exchanges waiting to be written", writer["queued"]
+        yield "conversations_written_total", "counter", "Conversation exchanges written", writer["written"]
+
+if metrics.enabled:
+    metrics.add_collector(collect_service_metrics)
+
 def generate_suggestions(user_message, assistant_response):
     """Generate contextual suggestions based on the conversation"""
     # Simple rule-based suggestion generation
@@ -159,10 +985,89 @@ def generate_suggestions(user_message, assistant_response):
     # Limit to 3 suggestions
     return suggestions[:3]
 
+@bp.cli.command('dedup-memories')
+def dedup_memories():
+    """Fingerprint existing memories and merge near-duplicates into older ones"""
+    started = time.perf_counter()
+    removed = services.memory.deduplicate()
+    if services.semantic_index is not None and removed:
+        services.semantic_index.remove(list(removed))
+        # The memories merged into took the removed rows' text
+        merged = services.memory.get_memories_by_ids(sorted(set(removed.values())))
+        services.semantic_index.add([(memory["id"], memory["content"]) for memory in merged])
+        services.semantic_index.save()
+    print(f"Merged {len(removed)} near-duplicate memories in {time.perf_counter() - started:.1f}s")
+
+@bp.cli.command('compact-messages')
+@click.option('--retrain', is_flag=True, help='Train a new dictionary and recompress every message with it')
+def compact_messages_command(retrain):
+    """Rewrite logged messages as compact records, training a compression dictionary first if needed"""
+    started = time.perf_counter()
+    memory = services.memory
+    if retrain or not memory.codec.current:
+        dictionary_id = memory.train_message_dictionary(Config.MESSAGE_DICTIONARY_KB)
+        if dictionary_id is not None:
+            print(f"Trained compression dictionary {dictionary_id}")
+    rewritten = memory.compact_messages(recompress=retrain)
+    print(f"Rewrote {rewritten} messages in {time.perf_counter() - started:.1f}s")
+    if rewritten:
+        print("The freed pages are reused by new rows; VACUUM (or retention's incremental vacuum) returns them to the filesystem")
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Bundle, minify, fingerprint and precompress the static assets"""
+    started = time.perf_counter()
+    manifest = build_assets(current_app.static_folder)
+    print(f"Built {len(manifest)} assets into static/{BUILD_DIR} in {time.perf_counter() - started:.1f}s")
+
+@bp.cli.command('migrate-db')
+@click.option('--vacuum', is_flag=True, help='Rebuild the database once so retention can release free pages incrementally')
+def migrate_db_command(vacuum):
+    """Create the database and bring its schema up to date"""
+    started = time.perf_counter()
+    version = migrate_database(vacuum=vacuum)
+    print(f"Database schema at version {version} in {time.perf_counter() - started:.1f}s")
+
+def migrate_database(vacuum=False):
+    """Bring the memory database's schema up to date, once, before any worker serves
+
+    Safe to run from several processes at once; only the first applies the
+    migrations. The retention archive, when configured, is set up too. With
+    ``vacuum``, a database (or archive) created without incremental
+    auto-vacuum is converted, which rewrites the whole file and blocks every
+    other connection meanwhile, so only do it while the app is stopped.
+    Returns the schema version.
+    """
+    db_dir = os.path.dirname(Config.DATABASE_PATH)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+    memory = Memory(db_path=Config.DATABASE_PATH, pool_size=1)
+    try:
+        version = memory.migrate()
+        if vacuum:
+            with memory.pool.connection() as conn:
+                enable_incremental_vacuum(conn, rebuild=True)
+    finally:
+        memory.close()
+    if Config.RETENTION_ENABLED and Config.RETENTION_ARCHIVE_PATH:
+        archive = ColdArchive(Config.RETENTION_ARCHIVE_PATH)
+        try:
+            archive.migrate(vacuum=vacuum)
+        finally:
+            archive.close()
+    return version
+
+def create_app(config=Config):
+    """Create the Flask app; services are built later, on first use in each worker"""
+    app = Flask(__name__)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    app.config.from_object(config)
+    app.extensions['assets'] = AssetManifest(app.static_folder)
+    app.register_blueprint(bp)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    # Create the database directory if it doesn't exist
-    db_dir = os.path.dirname(os.path.join(os.path.dirname(__file__), "assistant.db"))
-    if not os.path.exists(db_dir):
-        os.makedirs(db_dir)
-        
-    app.run(debug=Config.DEBUG, host='0.0.0.0', port=int(os.environ.get('PORT', 5000))) 
\ No newline at end of file
+    migrate_database()
+    app.run(debug=Config.DEBUG, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,381 @@
+"""
+ASGI entry point for the assistant.
+
+The chat endpoints (/api/send_message and /api/stream_message) are served
+natively on asyncio, so a single worker process can keep hundreds of
+completions in flight instead of blocking one thread per request. Every other
+route is passed through to the Flask app.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+"""
+import asyncio
+import json
+import math
+import time
+import uuid
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    DEGRADED_MESSAGE,
+    app as flask_app,
+    add_search_context,
+    build_memory_context,
+    generate_suggestions,
+    migrate_database,
+    request_cost,
+    services,
+    sse_event,
+    use_response_cache,
+    use_web_search,
+)
+from config import Config
+from models.admission import client_address, retry_after_header
+from models.metrics import metrics
+
+wsgi_application = WsgiToAsgi(flask_app)
+
+# Chat endpoints served natively on asyncio
+NATIVE_ROUTES = ("/api/send_message", "/api/stream_message")
+
+
+class Request:
+    """The parts of an ASGI HTTP request the chat endpoints need"""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.headers = {
+            name.decode("latin-1").title(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        try:
+            self.json = json.loads(body or b"{}")
+        except ValueError:
+            self.json = {}
+        if not isinstance(self.json, dict):
+            self.json = {}
+
+    def cookie(self, name):
+        """Return a cookie value from the request headers"""
+        for part in self.headers.get("Cookie", "").split(";"):
+            key, _, value = part.strip().partition("=")
+            if key == name:
+                return value
+        return None
+
+
+def resolve_session(request):
+    """Resolve the session id like app.get_session_id does
+
+    Returns ``(session_id, cookie)`` where ``cookie`` is a Set-Cookie value
+    when a new browser session had to be started. The cookie is the same
+    signed Flask session cookie, so both serving paths share sessions.
+    """
+    session_id = request.json.get("session_id") or request.headers.get("X-Session-Id")
+    if session_id:
+        return str(session_id)[:128], None
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config["SESSION_COOKIE_NAME"]
+    value = request.cookie(cookie_name)
+    if value:
+        try:
+            data = serializer.loads(value)
+            if data.get("sid"):
+                return data["sid"], None
+        except Exception:
+            pass
+
+    session_id = uuid.uuid4().hex
+    cookie = f"{cookie_name}={serializer.dumps({'sid': session_id})}; HttpOnly; Path=/; SameSite=Lax"
+    return session_id, cookie
+
+
+def response_headers(request, content_type, cookie=None, extra=()):
+    """Build the ASGI header list, mirroring the Flask app's CORS policy"""
+    headers = [(b"content-type", content_type.encode("latin-1"))]
+    trace = metrics.current_trace()
+    if trace is not None:
+        headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+    if "Origin" in request.headers:
+        headers.append((b"access-control-allow-origin", b"*"))
+    if cookie:
+        headers.append((b"set-cookie", cookie.encode("latin-1")))
+    headers.extend((name.encode("latin-1"), value.encode("latin-1")) for name, value in extra)
+    return headers
+
+
+async def read_body(receive):
+    """Read the full request body"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def send_json(send, request, payload, cookie=None, status=200, extra=()):
+    """Send a complete JSON response"""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": response_headers(request, "application/json", cookie, extra),
+    })
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode("utf-8")})
+
+
+async def too_many_requests(send, request, message, retry_after):
+    """Send a 429 response telling the client when to come back"""
+    retry_after = retry_after_header(retry_after)
+    await send_json(send, request, {"error": message, "retry_after": int(retry_after)}, status=429,
+                    extra=[("retry-after", retry_after)])
+
+
+async def admit(request, send):
+    """Async version of app.admit_request; returns whether a concurrency slot was taken
+
+    Sends the 413 or 429 response itself when the request is refused.
+    """
+    admission = services.admission
+    route = request.scope["path"]
+    client = client_address((request.scope.get("client") or (None,))[0], request.headers.get("X-Forwarded-For"),
+                            Config.ADMISSION_TRUST_PROXY)
+    loop = asyncio.get_running_loop()
+    try:
+        retry_after = await loop.run_in_executor(
+            None, admission.check_rate, client, route, request_cost(route, request.json)
+        )
+    except Exception as e:
+        metrics.log_error("Error checking rate limit", e)
+        retry_after = 0
+    if retry_after == math.inf:
+        await send_json(send, request, {"error": f"At most {admission.max_cost(route)} messages per request"},
+                        status=413)
+        return False
+    if retry_after:
+        await too_many_requests(send, request, "Rate limit exceeded", retry_after)
+        return False
+
+    with metrics.stage("admission"):
+        admitted = await admission.concurrency.acquire_async()
+    if not admitted:
+        await too_many_requests(send, request, "Server is busy, try again later", admission.concurrency.timeout)
+    return admitted
+
+
+async def memory_context(user_message):
+    """Build the memory context off the event loop (it queries SQLite)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, build_memory_context, user_message)
+
+
+async def search_context(context, user_message):
+    """Add web search results to the context off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, add_search_context, context, user_message)
+
+
+async def store_conversation(user_message, assistant_message, session_id):
+    """Hand an exchange to the conversation writer off the event loop
+
+    The writer can block: writing inline when write-behind is off, or waiting
+    for room when its queue is full.
+    """
+    messages = [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": assistant_message}
+    ]
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, services.conversation_writer.submit, messages, None, session_id)
+
+
+async def send_message(request, send):
+    """Async version of app.send_message; returns "degraded" or "error" when the reply is not an answer"""
+    data = request.json
+    user_message = data.get("message", "")
+    session_id, cookie = resolve_session(request)
+    with metrics.stage("memory_context"):
+        context = await memory_context(user_message)
+    if use_web_search(data):
+        with metrics.stage("web_search"):
+            context = await search_context(context, user_message)
+
+    outcome = None
+    try:
+        with metrics.stage("llm"):
+            response = await services.async_groq_client.send_message(
+                user_message,
+                context=context,
+                session_id=session_id,
+                use_cache=use_response_cache(data, request.headers),
+            )
+        assistant_message = response.get("message", "I'm sorry, I couldn't process your request.")
+
+        if response.get("degraded"):
+            # A degraded answer is neither logged nor used for suggestions
+            outcome = "degraded"
+            payload = {
+                "message": assistant_message,
+                "suggestions": ["Try again", "Help me with something else"],
+                "degraded": True
+            }
+        else:
+            with metrics.stage("suggestions"):
+                suggestions = generate_suggestions(user_message, assistant_message)
+
+            # Queue the conversation exchange for storage off the request path
+            with metrics.stage("store_conversation"):
+                await store_conversation(user_message, assistant_message, session_id)
+
+            payload = {"message": assistant_message, "suggestions": suggestions}
+    except Exception as e:
+        metrics.log_error("Error in message processing", e)
+        outcome = "error"
+        payload = {
+            "message": "I'm having trouble connecting to my language model. Please try again later.",
+            "suggestions": ["Try again", "Help me with something else"]
+        }
+
+    await send_json(send, request, payload, cookie)
+    return outcome
+
+
+async def stream_message(request, send, receive):
+    """Async version of app.stream_message; returns "degraded" or "disconnected" when no answer was delivered"""
+    data = request.json
+    user_message = data.get("message", "")
+    session_id, cookie = resolve_session(request)
+    with metrics.stage("memory_context"):
+        context = await memory_context(user_message)
+    if use_web_search(data):
+        with metrics.stage("web_search"):
+            context = await search_context(context, user_message)
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": response_headers(
+            request, "text/event-stream; charset=utf-8", cookie,
+            extra=[("Cache-Control", "no-cache"), ("X-Accel-Buffering", "no")],
+        ),
+    })
+
+    # Watch for the client going away so the upstream request can be dropped
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    chunks = services.async_groq_client.stream_message(
+        user_message,
+        context=context,
+        session_id=session_id,
+        use_cache=use_response_cache(data, request.headers),
+    )
+    parts = []
+    timer = metrics.stage("llm")
+    try:
+        with timer:
+            async for delta in chunks:
+                if disconnected.is_set():
+                    return "disconnected"
+                if not parts and metrics.active:
+                    metrics.record_stage("llm_first_token", time.perf_counter() - timer.started)
+                parts.append(delta)
+                await send({
+                    "type": "http.response.body",
+                    "body": sse_event({"delta": delta}).encode("utf-8"),
+                    "more_body": True,
+                })
+
+        assistant_message = "".join(parts)
+
+        if assistant_message == DEGRADED_MESSAGE:
+            # A degraded answer is neither logged nor used for suggestions
+            done = sse_event({
+                "message": assistant_message,
+                "suggestions": ["Try again", "Help me with something else"],
+                "degraded": True
+            }, event="done")
+            await send({"type": "http.response.body", "body": done.encode("utf-8")})
+            return "degraded"
+
+        with metrics.stage("suggestions"):
+            suggestions = generate_suggestions(user_message, assistant_message)
+
+        # Queue the completed exchange for storage off the request path
+        with metrics.stage("store_conversation"):
+            await store_conversation(user_message, assistant_message, session_id)
+
+        done = sse_event({"message": assistant_message, "suggestions": suggestions}, event="done")
+        await send({"type": "http.response.body", "body": done.encode("utf-8")})
+    finally:
+        await chunks.aclose()
+        watcher.cancel()
+
+
+async def lifespan(receive, send):
+    """Handle server start-up and shutdown"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Workers start in parallel; the first migrates, the rest find the schema current
+            await asyncio.get_running_loop().run_in_executor(None, migrate_database)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            async_client = services.peek("async_groq_client")
+            if async_client is not None:
+                await async_client.close()
+            conversation_writer = services.peek("conversation_writer")
+            if conversation_writer is not None:
+                conversation_writer.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI application: native chat endpoints, Flask for everything else"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in NATIVE_ROUTES:
+        request = Request(scope, await read_body(receive))
+        trace = metrics.start_request(scope["path"], "POST", request.headers.get("X-Request-Id"))
+        admission = services.admission
+        status = 500
+
+        async def send_tracked(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        if admission is not None and not await admit(request, send_tracked):
+            metrics.finish_request(trace, status)
+            return
+        outcome = None
+        try:
+            if scope["path"] == "/api/send_message":
+                outcome = await send_message(request, send_tracked)
+            else:
+                outcome = await stream_message(request, send_tracked, receive)
+        except Exception:
+            # Whatever was already sent, the request failed
+            status = 500
+            raise
+        finally:
+            if admission is not None:
+                admission.concurrency.release()
+            metrics.finish_request(trace, status, **({"outcome": outcome} if outcome else {}))
+        return
+
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,135 @@
+"""
+Admission control under synthetic load.
+
+Starts the stub LLM and the app under gunicorn (several workers, so the rate
+limits are enforced through the shared SQLite store), then runs a few noisy
+clients sending chat messages back to back alongside polite clients sending
+one message at a steady pace. Each client is identified by its own
+X-Forwarded-For address. Prints, per client class, how many requests were
+served, refused by a rate limit or refused as overload, and the latency of
+the served ones, once with admission control off and once with it on.
+
+Usage (from the assistant directory):
+    python benchmarks/admission_test.py --noisy 16 --polite 4 --duration 15
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.harness import percentile, start_app
+from benchmarks.stub_llm import start_stub_server
+
+
+def drive(port, noisy, polite, duration, polite_interval):
+    """Run both client classes for ``duration`` seconds; returns per-class outcomes"""
+    outcomes = {"noisy": [], "polite": []}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(kind, index, interval):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        headers = {"Content-Type": "application/json", "X-Forwarded-For": f"10.0.{kind == 'noisy'}.{index}"}
+        i = 0
+        while time.monotonic() < deadline:
+            body = json.dumps({"message": f"{kind} {index}-{i}", "session_id": f"{kind}-{index}", "cache": False})
+            started = time.perf_counter()
+            try:
+                conn.request("POST", "/api/send_message", body, headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read() or b"{}")
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                outcome, payload = "failed", {}
+            else:
+                if response.status == 429:
+                    outcome = "busy" if "busy" in payload.get("error", "") else "limited"
+                else:
+                    outcome = "ok"
+            elapsed = time.perf_counter() - started
+            with lock:
+                outcomes[kind].append((outcome, elapsed))
+            i += 1
+            if interval:
+                # Idle keep-alive connections are closed by the server; reconnect after the pause
+                conn.close()
+                time.sleep(max(interval - elapsed, 0))
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=("noisy", i, 0)) for i in range(noisy)]
+    threads += [threading.Thread(target=client, args=("polite", i, polite_interval)) for i in range(polite)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def summarize_class(outcomes):
+    served = sorted(elapsed for outcome, elapsed in outcomes if outcome == "ok")
+    return {
+        "sent": len(outcomes),
+        "ok": len(served),
+        "limited": sum(1 for outcome, _ in outcomes if outcome == "limited"),
+        "busy": sum(1 for outcome, _ in outcomes if outcome == "busy"),
+        "failed": sum(1 for outcome, _ in outcomes if outcome == "failed"),
+        "p50": round(percentile(served, 50) or 0, 3),
+        "p95": round(percentile(served, 95) or 0, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive noisy and polite clients with admission control off and on")
+    parser.add_argument("--noisy", type=int, default=16, help="Clients sending back to back")
+    parser.add_argument("--polite", type=int, default=4, help="Clients sending one message per --interval")
+    parser.add_argument("--interval", type=float, default=3.0, help="Seconds between polite requests")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per run")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub LLM latency in seconds")
+    parser.add_argument("--llm-rate", type=float, default=0.5, help="RATE_LIMIT_LLM_RATE for the admission run")
+    parser.add_argument("--llm-burst", type=int, default=2, help="RATE_LIMIT_LLM_BURST for the admission run")
+    parser.add_argument("--max-inflight", type=int, default=16, help="ADMISSION_MAX_INFLIGHT for the admission run")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, tokens=16, token_rate=0)
+    results = []
+    print(f"{'admission':<10}{'class':<8}{'sent':>6}{'ok':>6}{'limited':>9}{'busy':>6}{'failed':>8}{'p50':>8}{'p95':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for enabled in (False, True):
+            process, port = start_app(
+                "wsgi", stub.base_url, os.path.join(tmp, f"{enabled}.db"),
+                threads=args.threads, workers=args.workers,
+                ADMISSION_ENABLED=enabled,
+                ADMISSION_DB_PATH=os.path.join(tmp, f"admission-{enabled}.db"),
+                ADMISSION_TRUST_PROXY=True,
+                RATE_LIMIT_LLM_RATE=args.llm_rate,
+                RATE_LIMIT_LLM_BURST=args.llm_burst,
+                ADMISSION_MAX_INFLIGHT=args.max_inflight,
+            )
+            try:
+                outcomes = drive(port, args.noisy, args.polite, args.duration, args.interval)
+            finally:
+                process.terminate()
+                process.wait()
+            for kind in ("noisy", "polite"):
+                result = dict(summarize_class(outcomes[kind]), admission=enabled, clients=kind)
+                results.append(result)
+                print(f"{'on' if enabled else 'off':<10}{kind:<8}{result['sent']:>6}{result['ok']:>6}"
+                      f"{result['limited']:>9}{result['busy']:>6}{result['failed']:>8}{result['p50']:>8.3f}{result['p95']:>8.3f}")
+    stub.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+End-to-end benchmark suite.
+
+Starts the stub LLM server and the app (gunicorn or uvicorn) as separate
+processes on a copy of a seeded fixture database, then drives each endpoint
+scenario at every requested concurrency for a fixed duration. For every run
+it reports throughput, p50/p95/p99 latency, errors and, for the streaming
+endpoint, time to first token. Results are written as JSON named after the
+current commit, so runs on different commits can be compared with
+benchmarks/compare.py.
+
+Usage (from the assistant directory):
+    python benchmarks/bench.py --fixture 100k --concurrency 1 8 32 --duration 10
+    python benchmarks/bench.py --scenarios stream_message --latency 0.3 --token-rate 100 --error-rate 0.05
+"""
+import argparse
+import http.client
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.fixtures import QUERY_WORDS, SIZES, ensure_fixture
+from benchmarks.harness import (
+    SERVERS, environment, free_port, git_revision, start_app, summarize, wait_for_port,
+)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def send_message(conn, rng, client, i):
+    """POST /api/send_message; returns (status, first byte time, degraded)"""
+    body = json.dumps({"message": f"Benchmark question {client}-{i}: tell me about {rng.choice(QUERY_WORDS)}",
+                       "session_id": f"bench-{client}"})
+    conn.request("POST", "/api/send_message", body, JSON_HEADERS)
+    response = conn.getresponse()
+    data = response.read()
+    degraded = response.status == 200 and b'"degraded"' in data
+    return response.status, None, degraded
+
+
+def stream_message(conn, rng, client, i):
+    """POST /api/stream_message, timing the first delta event"""
+    body = json.dumps({"message": f"Benchmark stream {client}-{i}: tell me about {rng.choice(QUERY_WORDS)}",
+                       "session_id": f"bench-stream-{client}"})
+    started = time.perf_counter()
+    conn.request("POST", "/api/stream_message", body, JSON_HEADERS)
+    response = conn.getresponse()
+    first_token = None
+    degraded = False
+    while True:
+        line = response.readline()
+        if not line:
+            break
+        if first_token is None and line.startswith(b"data:") and b'"delta"' in line:
+            first_token = time.perf_counter() - started
+        elif line.startswith(b"data:") and b'"degraded"' in line:
+            degraded = True
+    return response.status, first_token, degraded
+
+
+def search_memories(conn, rng, client, i):
+    """POST /api/search_memories with one or two fixture words"""
+    words = rng.sample(QUERY_WORDS, rng.choice((1, 2)))
+    conn.request("POST", "/api/search_memories", json.dumps({"query": " ".join(words)}), JSON_HEADERS)
+    response = conn.getresponse()
+    response.read()
+    return response.status, None, False
+
+
+def memories(conn, rng, client, i):
+    """GET /api/memories"""
+    conn.request("GET", f"/api/memories?limit={rng.choice((5, 10, 50))}")
+    response = conn.getresponse()
+    response.read()
+    return response.status, None, False
+
+
+SCENARIOS = {
+    "send_message": send_message,
+    "stream_message": stream_message,
+    "search_memories": search_memories,
+    "memories": memories,
+}
+
+
+def drive(port, scenario, concurrency, duration, warmup, seed):
+    """Run one scenario from ``concurrency`` clients and return its measurements"""
+    request = SCENARIOS[scenario]
+    lock = threading.Lock()
+    latencies, first_tokens = [], []
+    counts = {"errors": 0, "degraded": 0}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    def client(index):
+        rng = random.Random(seed * 10007 + index)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        i = 0
+        while True:
+            started = time.perf_counter()
+            if started >= deadline:
+                break
+            try:
+                status, first_token, degraded = request(conn, rng, index, i)
+                error = status != 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                error, first_token, degraded = True, None, False
+            finished = time.perf_counter()
+            i += 1
+            if started < measure_from:
+                continue
+            with lock:
+                latencies.append(finished - started)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+                counts["errors"] += error
+                counts["degraded"] += degraded
+        conn.close()
+
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    result = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": counts["errors"],
+        "degraded": counts["degraded"],
+        "throughput": round(len(latencies) / duration, 2),
+    }
+    result.update(summarize(latencies))
+    if scenario == "stream_message":
+        result.update(summarize(first_tokens, prefix="ttft_"))
+    return result
+
+
+def start_stub(args):
+    """Run the stub LLM in its own process so it doesn't compete for our GIL"""
+    port = free_port()
+    command = [
+        sys.executable, str(Path(__file__).parent / "stub_llm.py"), "--port", str(port),
+        "--latency", str(args.latency), "--tokens", str(args.tokens), "--token-rate", str(args.token_rate),
+        "--error-rate", str(args.error_rate), "--error-status", *map(str, args.error_status),
+        "--hang-rate", str(args.hang_rate),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def default_output(fixture, server):
+    """Results file named after the commit being benchmarked"""
+    commit, dirty = git_revision()
+    name = f"{(commit or 'unknown')[:12]}{'-dirty' if dirty else ''}-{fixture}-{server}.json"
+    return RESULTS_DIR / name
+
+
+def print_result(result):
+    line = (f"{result['scenario']:<16} c={result['concurrency']:<4} {result['throughput']:>9.2f} req/s  "
+            f"p50={result['p50']}ms p95={result['p95']}ms p99={result['p99']}ms")
+    if "ttft_p50" in result:
+        line += f"  ttft p50={result['ttft_p50']}ms p95={result['ttft_p95']}ms"
+    if result["errors"] or result["degraded"]:
+        line += f"  errors={result['errors']} degraded={result['degraded']}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app end to end against a stub LLM")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--fixture", choices=["empty"] + list(SIZES), default="1k", help="Seeded database")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="wsgi")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=64, help="Stub LLM tokens per completion")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Stub LLM tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stub LLM fraction of failed requests")
+    parser.add_argument("--error-status", type=int, nargs="+", default=[503])
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Stub LLM fraction of hanging requests")
+    parser.add_argument("--cache", action="store_true", help="Enable the response cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>-<fixture>-<server>.json)")
+    args = parser.parse_args()
+
+    fixture = None if args.fixture == "empty" else ensure_fixture(args.fixture)
+    stub, stub_url = start_stub(args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Every scenario starts from a fresh copy so runs don't affect each other
+            for scenario in args.scenarios:
+                db_path = str(Path(tmp) / f"{scenario}.db")
+                if fixture is not None:
+                    shutil.copyfile(fixture, db_path)
+                process, port = start_app(
+                    args.server, stub_url, db_path, threads=args.threads, workers=args.workers,
+                    RESPONSE_CACHE_ENABLED=str(args.cache).lower(),
+                )
+                try:
+                    for concurrency in args.concurrency:
+                        result = drive(port, scenario, concurrency, args.duration, args.warmup, args.seed)
+                        results.append(result)
+                        print_result(result)
+                finally:
+                    process.terminate()
+                    process.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    commit, dirty = git_revision()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "environment": environment(),
+        "results": results,
+    }
+    output = Path(args.output) if args.output else default_output(args.fixture, args.server)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
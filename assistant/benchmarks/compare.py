@@ -0,0 +1,63 @@
+"""
+Compare two benchmark result files written by benchmarks/bench.py.
+
+Matches runs by scenario and concurrency and prints the change in throughput
+and latency percentiles. Exits with status 1 if any p95 latency grew, or any
+throughput dropped, by more than the threshold, so it can gate a CI job.
+
+Usage (from the assistant directory):
+    python benchmarks/compare.py benchmarks/results/<before>.json benchmarks/results/<after>.json
+"""
+import argparse
+import json
+import sys
+
+METRICS = ["throughput", "p50", "p95", "p99", "ttft_p50", "ttft_p95"]
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r["scenario"], r["concurrency"]): r for r in report["results"]}
+
+
+def change(before, after):
+    """Relative change from before to after, or None if not comparable"""
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    before_report, before = load(args.before)
+    after_report, after = load(args.after)
+    print(f"before: {before_report.get('commit')}  after: {after_report.get('commit')}")
+
+    regressions = []
+    for key in sorted(set(before) & set(after)):
+        cells = []
+        for metric in METRICS:
+            delta = change(before[key].get(metric), after[key].get(metric))
+            if delta is None:
+                continue
+            cells.append(f"{metric} {after[key][metric]} ({delta:+.1%})")
+            worse = -delta if metric == "throughput" else delta
+            if metric in ("throughput", "p95") and worse > args.threshold:
+                regressions.append(f"{key[0]} c={key[1]} {metric} {delta:+.1%}")
+        print(f"{key[0]:<16} c={key[1]:<4} " + "  ".join(cells))
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
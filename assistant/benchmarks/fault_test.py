@@ -0,0 +1,122 @@
+"""
+Exercise the LLM call policy against the fault-injecting stub server.
+
+Runs GroqClient.send_message through a series of fault scenarios (error
+bursts, rate limiting, hangs, a slow latency tail and a full outage) and
+prints, for each, how many answers succeeded or came back degraded, the
+latency percentiles, and the retry, hedging and circuit breaker counters the
+call policy recorded.
+
+Usage (from the assistant directory):
+    python benchmarks/fault_test.py --requests 40 --concurrency 8
+    python benchmarks/fault_test.py --scenarios outage --json faults.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.stub_llm import start_stub_server
+
+# Stub settings per scenario; anything not given uses the StubSettings default
+SCENARIOS = {
+    "healthy": {},
+    "errors": {"error_rate": 0.3, "error_statuses": [500, 502, 503]},
+    "rate_limited": {"error_rate": 0.3, "error_statuses": [429], "retry_after": 0.2},
+    "hangs": {"hang_rate": 0.1, "hang_time": 10.0},
+    "slow_tail": {"slow_rate": 0.1, "slow_latency": 1.5},
+    "outage": {"error_rate": 1.0, "error_statuses": [503]},
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def run_scenario(name, faults, args, stub):
+    """Drive send_message with the given faults injected and return the results"""
+    from models.groq_client import GroqClient
+    from models.resilience import CallPolicy, CircuitBreaker
+
+    stub.settings.update(**dict({"error_rate": 0.0, "hang_rate": 0.0, "slow_rate": 0.0, "latency": args.latency},
+                                **faults))
+    policy = CallPolicy(
+        timeout=args.timeout,
+        attempt_timeout=args.attempt_timeout,
+        max_retries=args.retries,
+        backoff_base=0.05,
+        backoff_max=1.0,
+        hedge=args.hedge,
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=2.0),
+    )
+    client = GroqClient(policy=policy)
+
+    def one(i):
+        started = time.perf_counter()
+        response = client.send_message(f"Fault test message {i}", session_id=f"{name}-{i}", use_cache=False)
+        return response.get("status"), time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in outcomes]
+    stats = policy.stats()
+    return {
+        "scenario": name,
+        "faults": faults,
+        "success": sum(1 for status, _ in outcomes if status == "success"),
+        "degraded": sum(1 for status, _ in outcomes if status != "success"),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "max": round(max(latencies), 4),
+        "elapsed": round(elapsed, 3),
+        "retries": stats["retries"],
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+        "breaker": stats["breaker"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LLM call policy against injected upstream faults")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub LLM latency in seconds")
+    parser.add_argument("--timeout", type=float, default=3.0, help="Call deadline in seconds")
+    parser.add_argument("--attempt-timeout", type=float, default=1.0, help="Timeout for a single attempt")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged requests")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    stub = start_stub_server(tokens=16, token_rate=0)
+    os.environ["GROQ_BASE_URL"] = stub.base_url
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["RESPONSE_CACHE_ENABLED"] = "False"
+
+    results = []
+    print(f"{'scenario':<14}{'ok':>5}{'degr':>6}{'p50':>8}{'p95':>8}{'max':>8}{'retry':>7}{'hedge':>7}  breaker")
+    for name in args.scenarios:
+        result = run_scenario(name, SCENARIOS[name], args, stub)
+        results.append(result)
+        breaker = result["breaker"]
+        print(f"{name:<14}{result['success']:>5}{result['degraded']:>6}{result['p50']:>8.3f}{result['p95']:>8.3f}"
+              f"{result['max']:>8.3f}{result['retries']:>7}{result['hedges']:>7}  "
+              f"{breaker['state']} (opened {breaker['opened']}, rejected {breaker['rejected']})")
+
+    stub.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Seeded assistant.db fixtures for the benchmarks.
+
+Generates databases holding 1k, 100k or 1M memories (plus a conversation log
+of a tenth as many exchanges) from a fixed random seed, so every run and every
+machine benchmarks against identical data. Fixtures are built once and cached
+in benchmarks/fixtures/; they are too large to keep in git.
+
+Usage (from the assistant directory):
+    python benchmarks/fixtures.py 1k 100k 1m
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from models.memory import Memory
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+# Bump when the generated data changes so stale cached fixtures are rebuilt
+FIXTURE_VERSION = 3
+
+SIZES = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+SEED = 20240601
+BASE_TIME = datetime(2024, 6, 1)
+BATCH = 10_000
+SESSIONS = 100
+
+SUBJECTS = ["The user", "My sister", "My manager", "Our team", "My dog", "The landlord", "My best friend"]
+VERBS = ["likes", "hates", "is learning", "wants to try", "forgot about", "keeps talking about", "recommended"]
+TOPICS = [
+    "python", "rust", "hiking", "sourdough", "jazz", "chess", "gardening", "photography", "marathons",
+    "espresso", "kubernetes", "watercolor", "guitar", "sushi", "climbing", "podcasts", "sql", "yoga",
+    "astronomy", "cycling", "knitting", "poetry", "investing", "spanish", "origami", "camping",
+]
+DETAILS = [
+    "on weekends", "every morning", "since last summer", "with friends", "for work", "as a hobby",
+    "before the deadline", "when it rains", "at the community center", "during lunch breaks",
+]
+
+# Words worth searching for; each matches a realistic share of the fixture
+QUERY_WORDS = TOPICS + ["weekends", "morning", "friends", "work", "hobby", "summer"]
+
+
+def fixture_path(size):
+    """Path of the cached fixture database for a size name"""
+    return FIXTURE_DIR / f"memories-{size}-v{FIXTURE_VERSION}.db"
+
+
+def memory_rows(count, rng):
+    """Yield (timestamp, content, importance, metadata) rows"""
+    span = 365 * 24 * 3600
+    for i in range(count):
+        timestamp = BASE_TIME - timedelta(seconds=span * (count - i) / count)
+        content = (f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(TOPICS)} "
+                   f"{rng.choice(DETAILS)}, note {i}")
+        yield timestamp.isoformat(), content, rng.choice((1, 1, 1, 2, 2, 3)), None
+
+
+def message_rows(count, rng):
+    """Yield (session_id, role, content, ts, metadata) rows for ``count`` logged exchanges"""
+    span = 365 * 24 * 3600
+    for i in range(count):
+        timestamp = BASE_TIME - timedelta(seconds=span * (count - i) / count)
+        ts = int(timestamp.timestamp() * 1000)
+        session_id = f"fixture-{rng.randrange(SESSIONS)}"
+        topic = rng.choice(TOPICS)
+        yield session_id, "user", f"Can you tell me something about {topic}? ({i})", ts, None
+        yield session_id, "assistant", f"Sure! Here is a fun fact about {topic}.", ts, None
+
+
+def build_fixture(size, path=None):
+    """Generate the fixture database for a size name and return its path"""
+    count = SIZES[size]
+    path = Path(path or fixture_path(size))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"{tmp_path}{suffix}"):
+            os.remove(f"{tmp_path}{suffix}")
+
+    rng = random.Random(SEED)
+    memory = Memory(db_path=str(tmp_path), pool_size=1)
+    with memory.pool.connection() as conn:
+        rows = memory_rows(count, rng)
+        while True:
+            batch = [row for _, row in zip(range(BATCH), rows)]
+            if not batch:
+                break
+            with conn:
+                conn.executemany(
+                    "INSERT INTO memories (timestamp, content, importance, metadata) VALUES (?, ?, ?, ?)",
+                    batch
+                )
+        memory.store_conversations([list(message_rows(max(count // 10, 1), rng))], conn=conn)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("ANALYZE")
+    memory.close()
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_fixture(size):
+    """Return the path of a fixture database, building it if it isn't cached"""
+    path = fixture_path(size)
+    if not path.exists():
+        started = time.perf_counter()
+        print(f"Building {size} fixture at {path} ...")
+        build_fixture(size, path)
+        print(f"Built {size} fixture in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build seeded memory databases for the benchmarks")
+    parser.add_argument("sizes", nargs="+", choices=sorted(SIZES))
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a cached fixture exists")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        if args.force and fixture_path(size).exists():
+            os.remove(fixture_path(size))
+        path = ensure_fixture(size)
+        print(f"{size}: {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
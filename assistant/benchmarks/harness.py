@@ -0,0 +1,108 @@
+"""
+Helpers shared by the end-to-end benchmarks: starting the app as a server
+process against the stub LLM, and summarizing latency samples.
+"""
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.parent
+
+SERVERS = {
+    "wsgi": lambda port, threads, workers: [
+        sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(threads),
+        "-b", f"127.0.0.1:{port}", "app:app",
+    ],
+    "asgi": lambda port, threads, workers: [
+        sys.executable, "-m", "uvicorn", "asgi:application", "--workers", str(workers),
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ],
+}
+
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    """Wait until something accepts connections on a port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_app(kind, stub_url, db_path, threads=8, workers=1, **env):
+    """Start the app under the given server and return (process, port)
+
+    Extra keyword arguments are set as environment variables for the app, on
+    top of the stub LLM and database settings. The response cache is off
+    unless ``RESPONSE_CACHE_ENABLED`` is passed.
+    """
+    port = free_port()
+    app_env = dict(
+        os.environ,
+        GROQ_API_KEY="stub",
+        GROQ_BASE_URL=stub_url,
+        DATABASE_PATH=db_path,
+        RESPONSE_CACHE_ENABLED="false",
+    )
+    app_env.update({name: str(value) for name, value in env.items()})
+    process = subprocess.Popen(SERVERS[kind](port, threads, workers), cwd=APP_DIR, env=app_env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process, port
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[min(len(sorted_values), int(rank)) - 1]
+
+
+def summarize(latencies, prefix=""):
+    """p50/p95/p99 and max of latency samples in milliseconds"""
+    values = sorted(latencies)
+    summary = {}
+    for name, pct in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)):
+        value = percentile(values, pct)
+        summary[prefix + name] = None if value is None else round(value * 1000, 2)
+    return summary
+
+
+def git_revision():
+    """Return ``(commit, dirty)`` for the working tree, or ``(None, None)``"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=APP_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=APP_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def environment():
+    """Describe the machine the benchmark ran on"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
@@ -0,0 +1,93 @@
+"""
+Throughput comparison of the WSGI and ASGI serving paths.
+
+Starts the stub LLM server, then runs the app once under gunicorn (sync
+worker threads) and once under uvicorn (asyncio), each as a single worker
+process, and drives /api/send_message at increasing concurrency. With the
+blocking client, throughput stops growing at the thread count; on the ASGI
+path it keeps scaling with the number of requests in flight.
+
+Usage (from the assistant directory):
+    python benchmarks/load_test.py --latency 0.5 --concurrency 8 32 128
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.harness import SERVERS, start_app
+from benchmarks.stub_llm import start_stub_server
+
+
+def drive(port, concurrency, requests_per_client):
+    """Send requests from ``concurrency`` clients; return (requests, seconds, latencies)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        for i in range(requests_per_client):
+            body = json.dumps({"message": f"load test {index}-{i}", "session_id": f"load-{index}"})
+            started = time.perf_counter()
+            conn.request("POST", "/api/send_message", body, {"Content-Type": "application/json"})
+            conn.getresponse().read()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+        conn.close()
+
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return len(latencies), time.perf_counter() - started, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare WSGI and ASGI throughput against a stub LLM")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["wsgi", "asgi"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[8, 32, 128])
+    parser.add_argument("--requests", type=int, default=4, help="Requests per client")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads for the WSGI server")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM latency in seconds")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, tokens=32, token_rate=0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.servers:
+            process, port = start_app(kind, stub.base_url, os.path.join(tmp, f"{kind}.db"), threads=args.threads)
+            try:
+                for concurrency in args.concurrency:
+                    count, seconds, latencies = drive(port, concurrency, args.requests)
+                    result = {
+                        "server": kind,
+                        "concurrency": concurrency,
+                        "requests": count,
+                        "throughput": round(count / seconds, 2),
+                        "p50": round(latencies[len(latencies) // 2], 3),
+                        "p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+                    }
+                    results.append(result)
+                    print(f"{kind:>4} c={concurrency:<4} {result['throughput']:>8.2f} req/s  "
+                          f"p50={result['p50']:.3f}s  p95={result['p95']:.3f}s")
+            finally:
+                process.terminate()
+                process.wait()
+    stub.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark for the Memory storage layer.
+
+Simulates gunicorn's threaded workers: several processes, each with its own
+Memory instance and several threads, replay the database access pattern of
+/api/send_message (read recent memories, log the exchange) mixed with memory
+searches and inserts. The "legacy" mode opens and closes a connection for
+every call with SQLite's default rollback journal, as Memory used to; the
+"pooled" mode uses the persistent WAL connection pool.
+
+Usage (from the assistant directory):
+    python benchmarks/memory_bench.py --processes 4 --threads 8 --duration 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Allow running the script directly from the assistant directory
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from models.memory import Memory
+
+
+class LegacyPool:
+    """Stand-in for the old behaviour: a fresh connection for every operation"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+
+def open_memory(db_path, mode, pool_size):
+    """Create a Memory instance using the requested connection strategy"""
+    if mode == "pooled":
+        return Memory(db_path=db_path, pool_size=pool_size)
+
+    memory = Memory.__new__(Memory)
+    memory.db_path = db_path
+    memory.pool = LegacyPool(db_path)
+    memory._init_db()
+    return memory
+
+
+def run_thread(memory, deadline, seed, counts):
+    """Replay the request mix until the deadline and record the op count"""
+    rng = random.Random(seed)
+    ops = 0
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < 0.6:
+            # One /api/send_message: memory context read + conversation log write
+            memory.get_memories(limit=3)
+            memory.store_conversation([
+                {"role": "user", "content": f"question {ops}"},
+                {"role": "assistant", "content": f"answer {ops}"},
+            ])
+            ops += 2
+        elif roll < 0.8:
+            memory.search_memories(f"fact {rng.randrange(1000)}")
+            ops += 1
+        elif roll < 0.9:
+            memory.store_memory(f"fact {rng.randrange(1000)}", importance=2)
+            ops += 1
+        else:
+            memory.get_messages(limit=10)
+            ops += 1
+    counts.append(ops)
+
+
+def run_worker(db_path, mode, threads, pool_size, duration, seed, results):
+    """One simulated gunicorn worker process"""
+    memory = open_memory(db_path, mode, pool_size)
+    deadline = time.perf_counter() + duration
+    counts = []
+    workers = [
+        threading.Thread(target=run_thread, args=(memory, deadline, seed * 1000 + i, counts))
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    memory.close()
+    results.put(sum(counts))
+
+
+def seed_database(db_path, mode, rows):
+    """Create the schema and insert some memories to search through"""
+    memory = open_memory(db_path, mode, pool_size=1)
+    for i in range(rows):
+        memory.store_memory(f"fact {i}: the user likes item number {i}", importance=1 + i % 3)
+    memory.close()
+
+
+def run_mode(mode, args):
+    """Run the benchmark for one connection strategy and return ops/sec"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, f"{mode}.db")
+        seed_database(db_path, mode, args.rows)
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(db_path, mode, args.threads, args.pool_size, args.duration, i, results),
+            )
+            for i in range(args.processes)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        total = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+    return {"mode": mode, "ops": total, "seconds": round(elapsed, 3), "ops_per_sec": round(total / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Memory connection handling")
+    parser.add_argument("--mode", choices=["legacy", "pooled", "both"], default="both")
+    parser.add_argument("--processes", type=int, default=4, help="Simulated worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per worker process")
+    parser.add_argument("--pool-size", type=int, default=8, help="Connections per worker (pooled mode)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run each mode")
+    parser.add_argument("--rows", type=int, default=1000, help="Memories to seed before running")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    modes = ["legacy", "pooled"] if args.mode == "both" else [args.mode]
+    results = []
+    for mode in modes:
+        result = run_mode(mode, args)
+        results.append(result)
+        print(f"{mode:>7}: {result['ops_per_sec']:>10.1f} ops/sec ({result['ops']} ops in {result['seconds']}s)")
+
+    if len(results) == 2 and results[0]["ops_per_sec"]:
+        print(f"speedup: {results[1]['ops_per_sec'] / results[0]['ops_per_sec']:.2f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
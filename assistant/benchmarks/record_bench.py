@@ -0,0 +1,181 @@
+"""
+Storage size and read speed of the logged-message formats.
+
+Logs the same seeded conversation corpus into a database per format: the
+plain text columns messages used to be stored in, and compact records with
+no compression, zlib and zstd, each with and without a dictionary trained on
+the corpus. Legacy rows are converted with Memory.compact_messages, the
+online migration, and each database is then vacuumed. Reports, per format,
+the file size, the time the migration took, and the read throughput of a
+full history scan (iter_messages) and of per-session history pages
+(get_messages). With --cold (Linux, as root) the OS page cache is dropped
+before a first, cold scan, which shows what the smaller file saves on disk
+reads.
+
+Usage (from the assistant directory):
+    python benchmarks/record_bench.py --exchanges 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.fixtures import DETAILS, TOPICS
+from models.memory import Memory
+from models.records import zstandard
+
+SEED = 20240601
+SESSIONS = 200
+
+OPENERS = [
+    "Great question!", "Sure, here's an overview.", "Happy to help with that.", "Here's what I found.",
+    "Let me break this down.", "Good thinking.", "That depends on a few things.",
+]
+SENTENCES = [
+    "The most important thing with {topic} is to start small and build a routine {detail}.",
+    "Many people find that {topic} becomes much easier once they track their progress.",
+    "If you're new to {topic}, I'd recommend a beginner-friendly guide and practicing {detail}.",
+    "A common mistake with {topic} is trying to do too much at once.",
+    "You can combine {topic} with {other} to keep things interesting.",
+    "Most experts suggest setting aside about {minutes} minutes a day for {topic}.",
+    "Keep in mind that everyone progresses at a different pace with {topic}.",
+    "Would you like me to put together a plan for {topic} that fits your schedule?",
+    "There are plenty of free resources online, including forums and video tutorials about {topic}.",
+    "Let me know if you want more detail on any of these points.",
+]
+STEPS = [
+    "**Set a goal**: decide what you want to get out of {topic}.",
+    "**Find a community**: local groups make {topic} more fun {detail}.",
+    "**Get the basics right**: a little equipment goes a long way for {topic}.",
+    "**Review weekly**: look back at what worked and adjust.",
+    "**Rest**: breaks help you come back to {topic} with fresh eyes.",
+]
+QUESTIONS = [
+    "Can you help me get started with {topic}?",
+    "What's the best way to improve at {topic} {detail}?",
+    "I keep struggling with {topic}, any tips?",
+    "How much time should I spend on {topic} each week?",
+    "Could you compare {topic} and {other} for me?",
+]
+
+
+def fill(template, rng):
+    return template.format(topic=rng.choice(TOPICS), other=rng.choice(TOPICS), detail=rng.choice(DETAILS),
+                           minutes=rng.choice((10, 15, 20, 30, 45)))
+
+
+def corpus(exchanges, rng):
+    """Yield (session_id, role, content, ts, metadata) rows of chat-like exchanges"""
+    ts = 1_717_200_000_000
+    for i in range(exchanges):
+        ts += rng.randrange(1000, 120_000)
+        session_id = f"bench-{rng.randrange(SESSIONS)}"
+        parts = [rng.choice(OPENERS)] + [fill(rng.choice(SENTENCES), rng) for _ in range(rng.randrange(2, 7))]
+        if rng.random() < 0.5:
+            steps = rng.sample(STEPS, rng.randrange(2, len(STEPS)))
+            parts.append("\n".join(f"{n}. {fill(step, rng)}" for n, step in enumerate(steps, start=1)))
+        parts.append(fill(rng.choice(SENTENCES), rng))
+        yield session_id, "user", fill(rng.choice(QUESTIONS), rng), ts, None
+        yield session_id, "assistant", "\n\n".join(parts), ts + rng.randrange(300, 5000), None
+
+
+def build(path, compression, dictionary, rows):
+    """Log the corpus in the legacy columns, then migrate it to records; returns migration seconds"""
+    memory = Memory(db_path=path, pool_size=1, compression=compression or "none")
+    with memory.pool.connection() as conn, conn:
+        conn.executemany("INSERT INTO messages (session_id, role, content, ts, metadata) VALUES (?, ?, ?, ?, ?)", rows)
+    started = time.perf_counter()
+    if compression is not None:
+        if dictionary:
+            memory.train_message_dictionary()
+        memory.compact_messages()
+    migrated = time.perf_counter() - started
+    with memory.pool.connection() as conn:
+        conn.execute("VACUUM")
+    memory.close()
+    return migrated
+
+
+def drop_page_cache():
+    """Evict the OS page cache (Linux, root only); returns whether it was dropped"""
+    os.sync()
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("1")
+    except OSError:
+        return False
+    return True
+
+
+def measure_reads(path, compression, rounds, sessions, cold=False):
+    """Messages per second for a cold scan, warm full scans and 50-message session pages"""
+    memory = Memory(db_path=path, pool_size=1, compression=compression or "none")
+    cold_scan = None
+    if cold and drop_page_cache():
+        started = time.perf_counter()
+        count = sum(1 for _ in memory.iter_messages())
+        cold_scan = count / (time.perf_counter() - started)
+    else:
+        # Warm the page cache once, so every format is measured from memory
+        count = sum(1 for _ in memory.iter_messages())
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for _ in memory.iter_messages():
+            pass
+    scan = count * rounds / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    paged = 0
+    for session in sessions:
+        paged += len(memory.get_messages(session_id=session, limit=50)["messages"])
+    pages = paged / (time.perf_counter() - started)
+    memory.close()
+    return count, cold_scan, scan, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare message storage formats by size and read speed")
+    parser.add_argument("--exchanges", type=int, default=20000, help="Logged exchanges (two messages each)")
+    parser.add_argument("--rounds", type=int, default=3, help="Full scans per format")
+    parser.add_argument("--pages", type=int, default=2000, help="Session history pages read per format")
+    parser.add_argument("--cold", action="store_true", help="Also time a scan after dropping the OS page cache")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    rows = list(corpus(args.exchanges, random.Random(SEED)))
+    sessions = [f"bench-{random.Random(SEED + i).randrange(SESSIONS)}" for i in range(args.pages)]
+    formats = [("text", None, False), ("record", "none", False), ("zlib", "zlib", False), ("zlib+dict", "zlib", True)]
+    if zstandard is not None:
+        formats += [("zstd", "zstd", False), ("zstd+dict", "zstd", True)]
+    else:
+        print("zstandard is not installed; skipping the zstd formats")
+
+    results = []
+    print(f"{'format':<12}{'size MB':>9}{'B/msg':>8}{'ratio':>7}{'migrate s':>11}{'cold msg/s':>12}"
+          f"{'scan msg/s':>12}{'page msg/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, compression, dictionary in formats:
+            path = os.path.join(tmp, f"{name}.db")
+            migrated = build(path, compression, dictionary, rows)
+            size = os.path.getsize(path)
+            count, cold_scan, scan, pages = measure_reads(path, compression, args.rounds, sessions, args.cold)
+            result = {"format": name, "bytes": size, "bytes_per_message": size / count, "migrate_seconds": migrated,
+                      "cold_scan_per_second": cold_scan, "scan_per_second": scan, "page_messages_per_second": pages}
+            results.append(result)
+            ratio = results[0]["bytes"] / size
+            print(f"{name:<12}{size / 1e6:>9.2f}{size / count:>8.0f}{ratio:>7.2f}{migrated:>11.2f}"
+                  f"{cold_scan or 0:>12.0f}{scan:>12.0f}{pages:>12.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
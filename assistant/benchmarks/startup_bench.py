@@ -0,0 +1,118 @@
+"""
+Start-up cost of the app.
+
+Measures, in fresh processes:
+  - import: the time to import the app module, and the threads it leaves running
+  - wsgi / asgi: the time from launching the server to its port accepting
+    connections, and to the first chat response (served by the stub LLM)
+
+Each is the median of several runs. ``--app-dir`` points the benchmark at
+another checkout (e.g. a ``git worktree`` of an older revision) to compare.
+
+Usage (from the assistant directory):
+    python benchmarks/startup_bench.py --runs 5 --workers 4
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.harness import APP_DIR, SERVERS, free_port, wait_for_port
+from benchmarks.stub_llm import start_stub_server
+
+IMPORT_SCRIPT = """
+import threading, time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started, threading.active_count())
+"""
+
+
+def measure_import(app_dir, env):
+    """Seconds to import the app and the number of threads running afterwards"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=app_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    seconds, threads = output.split()[-2:]
+    return float(seconds), int(threads)
+
+
+def first_response(port):
+    """Send one chat message; returns once the response has been read"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        conn.request("POST", "/api/send_message", json.dumps({"message": "hello"}),
+                     {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def measure_server(kind, app_dir, env, workers):
+    """Seconds until the server accepts connections and until it answers a chat message"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(SERVERS[kind](port, 8, workers), cwd=app_dir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        listening = time.perf_counter() - started
+        status = first_response(port)
+        answered = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+    if status != 200:
+        raise RuntimeError(f"{kind} answered the first message with {status}")
+    return listening, answered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long the app takes to import and start serving")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement (the median is reported)")
+    parser.add_argument("--workers", type=int, default=4, help="Server worker processes")
+    parser.add_argument("--app-dir", default=str(APP_DIR), help="Directory of the app to measure")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=0.0, tokens=8, token_rate=0)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        def fresh_env(run):
+            # A new database each run, so every start migrates from scratch
+            return dict(os.environ, GROQ_API_KEY="stub", GROQ_BASE_URL=stub.base_url,
+                        RESPONSE_CACHE_ENABLED="false", DATABASE_PATH=os.path.join(tmp, f"{run}.db"))
+
+        imports = [measure_import(args.app_dir, fresh_env(f"import-{run}")) for run in range(args.runs)]
+        results["import"] = {
+            "seconds": statistics.median(seconds for seconds, _ in imports),
+            "threads": max(threads for _, threads in imports),
+        }
+        print(f"import      {results['import']['seconds']:.3f}s, {results['import']['threads']} threads after import")
+
+        for kind in ("wsgi", "asgi"):
+            runs = [measure_server(kind, args.app_dir, fresh_env(f"{kind}-{run}"), args.workers)
+                    for run in range(args.runs)]
+            results[kind] = {
+                "listening": statistics.median(listening for listening, _ in runs),
+                "first_response": statistics.median(answered for _, answered in runs),
+            }
+            print(f"{kind:<12}{results[kind]['listening']:.3f}s to listen, "
+                  f"{results[kind]['first_response']:.3f}s to first response ({args.workers} workers)")
+    stub.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Serves POST /openai/v1/chat/completions in the OpenAI-compatible format the
+groq SDK expects, with and without ``stream: true``. Responses are made of
+fake tokens produced after a configurable latency and at a configurable token
+rate, so load tests exercise the app without network access or API quota.
+
+Faults can be injected to exercise the LLM call policy: a fraction of requests
+can fail with an HTTP error status, hang without answering, or be slowed down
+to create a latency tail. The settings can also be changed while the server is
+running by POSTing a JSON object of settings to /faults.
+
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+Usage (from the assistant directory):
+    python benchmarks/stub_llm.py --port 8900 --latency 0.5 --tokens 64 --token-rate 200
+    python benchmarks/stub_llm.py --error-rate 0.2 --error-status 503 429 --hang-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class StubSettings:
+    """Behaviour of the stub server, adjustable while it is running"""
+
+    def __init__(self, latency=0.5, tokens=64, token_rate=200.0, error_rate=0.0, error_statuses=(503,),
+                 hang_rate=0.0, hang_time=300.0, slow_rate=0.0, slow_latency=5.0, retry_after=None):
+        self.latency = latency  # Seconds before the first token
+        self.tokens = tokens  # Tokens per completion
+        self.token_rate = token_rate  # Tokens per second after the first one (0 = instant)
+
+        # Fault injection
+        self.error_rate = error_rate  # Fraction of requests answered with an error status
+        self.error_statuses = list(error_statuses)  # Statuses picked from at random
+        self.hang_rate = hang_rate  # Fraction of requests that hang without answering
+        self.hang_time = hang_time  # Seconds a hanging request sleeps before closing
+        self.slow_rate = slow_rate  # Fraction of requests using slow_latency instead of latency
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after  # Retry-After header sent with 429 responses
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.errors = 0
+        self.hangs = 0
+        self.slow = 0
+
+    def update(self, **settings):
+        """Change settings on the running server; unknown names raise ValueError"""
+        for name, value in settings.items():
+            if name.startswith("_") or not hasattr(self, name) or callable(getattr(self, name)):
+                raise ValueError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def pick_fault(self):
+        """Decide how to answer the next request (None, "error", "hang" or "slow")"""
+        roll = random.random()
+        for fault, rate in (("error", self.error_rate), ("hang", self.hang_rate), ("slow", self.slow_rate)):
+            if roll < rate:
+                with self._lock:
+                    if fault == "error":
+                        self.errors += 1
+                    elif fault == "hang":
+                        self.hangs += 1
+                    else:
+                        self.slow += 1
+                return fault
+            roll -= rate
+        return None
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "errors": self.errors,
+                "hangs": self.hangs,
+                "slow": self.slow,
+            }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the chat completions endpoint"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+    settings = StubSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.settings.stats())
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/faults":
+            try:
+                self.settings.update(**body)
+            except ValueError as e:
+                self._send_json(400, {"error": {"message": str(e)}})
+                return
+            self._send_json(200, {"status": "success"})
+            return
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        self.settings.started()
+        try:
+            self._complete(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up (e.g. its timeout expired)
+        finally:
+            self.settings.finished()
+
+    def _complete(self, body):
+        """Answer a completion request after the configured delays"""
+        settings = self.settings
+        tokens = min(settings.tokens, int(body.get("max_tokens") or settings.tokens))
+        words = [f"tok{i} " for i in range(tokens)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "stub")
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+
+        fault = settings.pick_fault()
+        if fault == "error":
+            status = random.choice(settings.error_statuses)
+            headers = {"Retry-After": str(settings.retry_after)} if status == 429 and settings.retry_after else {}
+            self._send_json(status, {"error": {"message": f"Injected fault ({status})", "type": "stub_error"}},
+                            headers)
+            return
+        if fault == "hang":
+            time.sleep(settings.hang_time)
+            self.close_connection = True
+            return
+
+        time.sleep(settings.slow_latency if fault == "slow" else settings.latency)
+        interval = 1.0 / settings.token_rate if settings.token_rate else 0.0
+
+        if not body.get("stream"):
+            time.sleep(interval * max(tokens - 1, 0))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": tokens,
+                    "total_tokens": prompt_tokens + tokens,
+                },
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(interval)
+                self._send_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+                })
+            self._send_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(host="127.0.0.1", port=0, **settings):
+    """Start the stub server on a background thread and return it
+
+    The server's ``base_url`` attribute is the value to use for GROQ_BASE_URL.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"settings": StubSettings(**settings)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.settings = handler.settings
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stub of the Groq chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per completion")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Tokens per second (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with an error")
+    parser.add_argument("--error-status", type=int, nargs="+", default=[503], help="Error statuses to return")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with 429 errors")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that never answer")
+    parser.add_argument("--hang-time", type=float, default=300.0, help="Seconds a hanging request is held open")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests with --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Seconds before the first token when slow")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, latency=args.latency, tokens=args.tokens,
+                               token_rate=args.token_rate, error_rate=args.error_rate,
+                               error_statuses=args.error_status, retry_after=args.retry_after,
+                               hang_rate=args.hang_rate, hang_time=args.hang_time,
+                               slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
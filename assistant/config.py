@@ -12,17 +12,115 @@ class Config:
     # Groq API settings
     GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
     GROQ_MODEL = os.environ.get('GROQ_MODEL', 'llama3-70b-8192')
+    GROQ_BASE_URL = os.environ.get('GROQ_BASE_URL', '')  # Override the API host, e.g. for a local stub server
+    
+    # Async serving settings (asgi.py)
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 256))  # In-flight completions per worker
+    LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 100))  # Pooled keep-alive connections per worker
+    
+    # LLM call policy settings
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30))  # Deadline in seconds for a completion, retries included
+    LLM_ATTEMPT_TIMEOUT = float(os.environ.get('LLM_ATTEMPT_TIMEOUT', 12))  # Timeout in seconds for a single attempt
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))  # Retries on 429/5xx, timeouts and connection errors
+    LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 0.25))  # Seconds; doubles per retry, with full jitter
+    LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 4))  # Longest wait between retries
+    LLM_HEDGE_ENABLED = os.environ.get('LLM_HEDGE_ENABLED', 'False').lower() in ('true', '1', 't')  # Duplicate slow requests
+    LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 95))  # Latency percentile after which to hedge
+    LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', 5))  # Consecutive failures that open the circuit
+    LLM_BREAKER_RESET = float(os.environ.get('LLM_BREAKER_RESET', 30))  # Seconds before a trial call is let through
+    
+    # Batch endpoint settings (/api/batch_send)
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100))  # Messages accepted per batch request
+    BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))  # Batch completions run at once per worker
+    
+    # Admission control settings (rate limits shared by all workers, LLM concurrency cap per worker)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'False').lower() in ('true', '1', 't')
+    ADMISSION_DB_PATH = os.environ.get('ADMISSION_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'admission.db'))
+    ADMISSION_TRUST_PROXY = os.environ.get('ADMISSION_TRUST_PROXY', 'False').lower() in ('true', '1', 't')  # Limit by X-Forwarded-For
+    RATE_LIMIT_RATE = float(os.environ.get('RATE_LIMIT_RATE', 5))  # API requests per second per client (0 = unlimited)
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))  # Requests a client may make at once
+    RATE_LIMIT_LLM_RATE = float(os.environ.get('RATE_LIMIT_LLM_RATE', 0.5))  # Chat messages per second per client and route
+    RATE_LIMIT_LLM_BURST = int(os.environ.get('RATE_LIMIT_LLM_BURST', 5))  # Chat messages a client may send at once
+    ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', 32))  # Chat completions served at once per worker (a batch holds one per parallel item)
+    ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 64))  # Chat requests allowed to wait for a slot
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 5))  # Seconds a request may wait before a 429
+    
+    # Response cache settings
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))  # Completions kept in memory per worker
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 600))  # Seconds a cached completion stays valid
+    RESPONSE_CACHE_DB = os.environ.get('RESPONSE_CACHE_DB', '')  # SQLite file for a cache shared by all workers
     
     # Database settings - using SQLite for development
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI', 'sqlite:///assistant.db')
+    DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assistant.db'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 8))  # Persistent SQLite connections per worker
+    
+    # Conversation logging settings
+    CONVERSATION_DURABILITY = os.environ.get('CONVERSATION_DURABILITY', 'normal').lower()  # sync, full, normal or off
+    CONVERSATION_QUEUE_SIZE = int(os.environ.get('CONVERSATION_QUEUE_SIZE', 10000))  # Exchanges waiting to be written
+    CONVERSATION_BATCH_SIZE = int(os.environ.get('CONVERSATION_BATCH_SIZE', 100))  # Exchanges per transaction
+    CONVERSATION_FLUSH_INTERVAL = float(os.environ.get('CONVERSATION_FLUSH_INTERVAL', 0.5))  # Seconds before a partial batch is written
+    MESSAGE_COMPRESSION = os.environ.get('MESSAGE_COMPRESSION', 'auto').lower()  # auto (zstd if installed, else zlib), zstd, zlib or none
+    MESSAGE_DICTIONARY_KB = int(os.environ.get('MESSAGE_DICTIONARY_KB', 32))  # Size of trained compression dictionaries
+    
+    # Instrumentation settings
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() in ('true', '1', 't')  # Serve /metrics
+    REQUEST_LOG_ENABLED = os.environ.get('REQUEST_LOG_ENABLED', 'False').lower() in ('true', '1', 't')  # JSON request logs
+    
+    # Profiling settings
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')  # X-Profile-Token header or ?profile= value that profiles a request
+    PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', 0))  # Profile 1 in N requests (0 = off)
+    PROFILE_MAX_PER_MINUTE = int(os.environ.get('PROFILE_MAX_PER_MINUTE', 6))  # Rate limit of sampled profiles per worker
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))  # Stack sampling interval
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 100))  # Profiles kept before the oldest are deleted
+    PROFILE_BACKEND = os.environ.get('PROFILE_BACKEND', 'sampler')
     
     # Web search API settings
     SEARCH_API_KEY = os.environ.get('SEARCH_API_KEY')
     SEARCH_ENGINE_ID = os.environ.get('SEARCH_ENGINE_ID')
+    SEARCH_PROVIDERS = os.environ.get('SEARCH_PROVIDERS', '')  # Comma-separated: google, fixture (default: all configured)
+    SEARCH_FIXTURE_PATH = os.environ.get('SEARCH_FIXTURE_PATH', '')  # JSON documents for the offline fixture provider
+    SEARCH_TIMEOUT = float(os.environ.get('SEARCH_TIMEOUT', 2))  # Seconds each provider is given to answer
+    SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 300))  # Seconds search results stay cached
+    SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))  # Queries cached per worker
+    SEARCH_CONTEXT_ENABLED = os.environ.get('SEARCH_CONTEXT_ENABLED', 'False').lower() in ('true', '1', 't')  # Add results to chat prompts
+    SEARCH_CONTEXT_RESULTS = int(os.environ.get('SEARCH_CONTEXT_RESULTS', 3))  # Results added to a chat prompt
     
     # Voice settings
     VOICE_ENABLED = os.environ.get('VOICE_ENABLED', 'True').lower() in ('true', '1', 't')
     
     # Memory settings
-    MAX_CONTEXT_LENGTH = int(os.environ.get('MAX_CONTEXT_LENGTH', 10))  # Number of exchanges to keep in context 
\ No newline at end of file
+    MAX_CONTEXT_LENGTH = int(os.environ.get('MAX_CONTEXT_LENGTH', 10))  # Number of exchanges to keep in context
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 6000))  # Estimated prompt tokens per request
+    SUMMARY_ENABLED = os.environ.get('SUMMARY_ENABLED', 'True').lower() in ('true', '1', 't')  # Compact long sessions
+    SUMMARY_TRIGGER_TOKENS = int(os.environ.get('SUMMARY_TRIGGER_TOKENS', 2000))  # Session size that triggers compaction
+    SUMMARY_KEEP_TOKENS = int(os.environ.get('SUMMARY_KEEP_TOKENS', 600))  # Recent turns kept verbatim when compacting
+    SUMMARY_MAX_TOKENS = int(os.environ.get('SUMMARY_MAX_TOKENS', 256))  # Length cap of the rolling summary
+    MEMORY_DEDUP_ENABLED = os.environ.get('MEMORY_DEDUP_ENABLED', 'True').lower() in ('true', '1', 't')  # Merge near-duplicate memories
+    MEMORY_DEDUP_DISTANCE = int(os.environ.get('MEMORY_DEDUP_DISTANCE', 3))  # SimHash bits two duplicates may differ by (0-3)
+    MEMORY_DEDUP_SIMILARITY = float(os.environ.get('MEMORY_DEDUP_SIMILARITY', 0.8))  # Word-set Jaccard similarity two duplicates need
+    RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', 'False').lower() in ('true', '1', 't')  # Decay, archive and vacuum
+    RETENTION_HALF_LIFE_DAYS = float(os.environ.get('RETENTION_HALF_LIFE_DAYS', 30))  # Days for a memory's importance to halve
+    RETENTION_ACCESS_BUMP = float(os.environ.get('RETENTION_ACCESS_BUMP', 1))  # Importance added each time a memory is retrieved
+    RETENTION_MIN_SCORE = float(os.environ.get('RETENTION_MIN_SCORE', 0.5))  # Decayed importance below which memories are archived
+    RETENTION_MIN_AGE_DAYS = float(os.environ.get('RETENTION_MIN_AGE_DAYS', 7))  # Memories younger than this are never archived for decay
+    RETENTION_MAX_MEMORIES = int(os.environ.get('RETENTION_MAX_MEMORIES', 0))  # Memories kept in the main database (0 = no cap)
+    RETENTION_MESSAGE_DAYS = float(os.environ.get('RETENTION_MESSAGE_DAYS', 90))  # Age at which logged messages are archived (0 = never)
+    RETENTION_MAX_MESSAGES = int(os.environ.get('RETENTION_MAX_MESSAGES', 0))  # Messages kept in the main database (0 = no cap)
+    RETENTION_MAX_DB_MB = float(os.environ.get('RETENTION_MAX_DB_MB', 0))  # Size cap of the main database's data (0 = no cap)
+    RETENTION_ARCHIVE_PATH = os.environ.get('RETENTION_ARCHIVE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive.db'))  # Empty deletes instead
+    RETENTION_ARCHIVE_DAYS = float(os.environ.get('RETENTION_ARCHIVE_DAYS', 0))  # Days archived rows are kept (0 = forever)
+    RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 3600))  # Seconds between maintenance passes
+    RETENTION_VACUUM_PAGES = int(os.environ.get('RETENTION_VACUUM_PAGES', 1000))  # Free pages released per pass (0 = no vacuum)
+    SEMANTIC_MEMORY_ENABLED = os.environ.get('SEMANTIC_MEMORY_ENABLED', 'True').lower() in ('true', '1', 't')
+    SEMANTIC_TOP_K = int(os.environ.get('SEMANTIC_TOP_K', 3))  # Relevant memories added to the prompt
+    SEMANTIC_MIN_SCORE = float(os.environ.get('SEMANTIC_MIN_SCORE', 0.15))  # Minimum cosine similarity
+    SEMANTIC_BUDGET_MS = int(os.environ.get('SEMANTIC_BUDGET_MS', 50))  # Time allowed for indexing new memories per request
+    
+    # Session settings
+    SESSION_MAX_COUNT = int(os.environ.get('SESSION_MAX_COUNT', 5000))  # Conversations kept in memory per worker
+    SESSION_MAX_CHARS = int(os.environ.get('SESSION_MAX_CHARS', 20000000))  # Total characters across all sessions
+    SESSION_TTL = int(os.environ.get('SESSION_TTL', 3600))  # Seconds before an idle session is dropped
@@ -0,0 +1,16 @@
+"""
+gunicorn settings, read automatically when gunicorn is started from this
+directory (e.g. ``gunicorn -w 4 app:app``).
+
+The schema migration runs once in the master before any worker is forked, so
+workers start without doing DDL. The app builds its services lazily per
+process, so it can also be preloaded (``--preload``) to share the imported
+code between workers.
+"""
+
+
+def on_starting(server):
+    from app import migrate_database
+
+    version = migrate_database()
+    server.log.info("Database schema at version %s", version)
@@ -0,0 +1,285 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+
+from models.db import ConnectionPool
+
+# Full buckets carry no state; their rows are deleted every this many takes
+PRUNE_EVERY = 1000
+
+
+def client_address(remote_addr, forwarded_for=None, trust_proxy=False):
+    """Identify the client a request is rate limited as
+
+    Behind a reverse proxy every request comes from the proxy, so with
+    ``trust_proxy`` the first address of ``X-Forwarded-For`` is used instead.
+    """
+    if trust_proxy and forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return remote_addr or "unknown"
+
+
+def retry_after_header(seconds):
+    """Retry-After value (whole seconds, at least 1) for a delay"""
+    return str(max(1, math.ceil(seconds)))
+
+
+class RateLimiter:
+    """Token buckets shared by every worker process through a SQLite table
+
+    Each bucket is stored as a single "theoretical arrival time" (the generic
+    cell rate algorithm): taking ``cost`` tokens pushes it ``cost / rate``
+    seconds forward, and is refused while that would put it more than
+    ``burst / rate`` seconds ahead of now. The check and the update are one
+    UPSERT statement, so concurrent workers can't both spend the last token.
+    """
+
+    def __init__(self, db_path, pool_size=4):
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        with self.pool.connection() as conn, conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tat REAL NOT NULL
+            ) WITHOUT ROWID
+            ''')
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, rate, burst, cost=1, now=None):
+        """Take ``cost`` tokens from a bucket refilled at ``rate`` per second, holding up to ``burst``
+
+        Returns 0 when the tokens were taken, otherwise the seconds until
+        they will be available (infinite when ``cost`` is above ``burst``).
+        """
+        return self.take_all([(key, rate, burst, cost)], now)
+
+    def take_all(self, buckets, now=None):
+        """Take tokens from every one of ``buckets`` (``(key, rate, burst, cost)``), or from none
+
+        All the buckets are updated in one transaction, which is rolled back
+        as soon as one refuses, so a refused request spends nothing. Returns
+        0 when every bucket was charged, otherwise the refusing bucket's wait
+        as in take.
+        """
+        now = time.time() if now is None else now
+        with self.pool.connection() as conn, conn:
+            for key, rate, burst, cost in buckets:
+                if rate <= 0:
+                    continue
+                if cost > burst:
+                    conn.rollback()
+                    return math.inf
+                increment = cost / rate
+                tolerance = burst / rate
+                taken = conn.execute('''
+                INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :increment)
+                ON CONFLICT(key) DO UPDATE SET tat = max(tat, :now) + :increment
+                WHERE max(tat, :now) + :increment - :now <= :tolerance
+                ''', {"key": key, "now": now, "increment": increment, "tolerance": tolerance}).rowcount
+                if not taken:
+                    row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                    conn.rollback()
+                    return max(row[0] + increment - now - tolerance, 0.0) if row else 0.0
+            if self._count_take():
+                conn.execute("DELETE FROM rate_limits WHERE tat < ?", (now,))
+        return 0.0
+
+    def _count_take(self):
+        """Whether this take is due to prune full buckets"""
+        with self._lock:
+            self._takes += 1
+            return self._takes % PRUNE_EVERY == 0
+
+
+class _ThreadWaiter:
+    __slots__ = ("count", "event")
+
+    def __init__(self, count):
+        self.count = count
+        self.event = threading.Event()
+
+    def grant(self):
+        self.event.set()
+
+
+class _AsyncWaiter:
+    __slots__ = ("count", "loop", "future")
+
+    def __init__(self, count, loop):
+        self.count = count
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def grant(self):
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class ConcurrencyLimiter:
+    """Caps the requests of a worker in flight at once, queueing a bounded number
+
+    A request beyond ``limit`` waits its turn (first come, first served) for
+    up to ``timeout`` seconds; when ``max_waiting`` requests are already
+    waiting it is refused at once. Slots are handed straight to the next
+    waiter on release. A request that fans out into several completions
+    (a batch) takes one slot per completion it runs at once, so the cap
+    bounds the calls made upstream. Threads call ``acquire`` and coroutines
+    ``acquire_async``; both share the same slots.
+    """
+
+    def __init__(self, limit, max_waiting=0, timeout=5.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+
+        # Counters exposed through stats()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _enter(self, waiter):
+        """Take free slots (True), join the queue (None) or refuse (False)"""
+        with self._lock:
+            if self._active + waiter.count <= self.limit and not self._waiters:
+                self._active += waiter.count
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.max_waiting:
+                self.rejected += 1
+                return False
+            self._waiters.append(waiter)
+            self.queued += 1
+            return None
+
+    def _abandon(self, waiter):
+        """Leave the queue; returns True if a slot was granted in the meantime"""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return True
+            self.timed_out += 1
+            # Smaller requests queued behind this one may fit now
+            self._grant_waiters()
+            return False
+
+    def _grant_waiters(self):
+        """Hand free slots to the waiters at the head of the queue (lock held)"""
+        while self._waiters and self._active + self._waiters[0].count <= self.limit:
+            waiter = self._waiters.popleft()
+            self._active += waiter.count
+            self.admitted += 1
+            waiter.grant()
+
+    def _slots(self, count):
+        # A request may take every slot, but never more, or it could never run
+        return max(1, min(count, self.limit))
+
+    def acquire(self, count=1):
+        """Wait up to ``timeout`` for ``count`` slots; returns whether they were taken"""
+        waiter = _ThreadWaiter(self._slots(count))
+        entered = self._enter(waiter)
+        if entered is not None:
+            return entered
+        return waiter.event.wait(self.timeout) or self._abandon(waiter)
+
+    async def acquire_async(self, count=1):
+        """Async version of acquire"""
+        waiter = _AsyncWaiter(self._slots(count), asyncio.get_running_loop())
+        entered = self._enter(waiter)
+        if entered is not None:
+            return entered
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except asyncio.TimeoutError:
+            return self._abandon(waiter)
+        except BaseException:
+            # Cancelled while queued: give back slots granted meanwhile
+            if self._abandon(waiter):
+                self.release(waiter.count)
+            raise
+
+    def release(self, count=1):
+        """Return ``count`` slots, handing them to the longest waiting requests that fit"""
+        with self._lock:
+            self._active -= self._slots(count)
+            self._grant_waiters()
+
+    def stats(self):
+        """Return slot usage and admission counters"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+class AdmissionControl:
+    """Rate limits and concurrency cap applied before a request is served
+
+    Every client has a bucket shared by all its API requests; routes listed in
+    ``route_limits`` (``{route: (rate, burst)}``) also get a bucket per client
+    and route, so the expensive endpoints can be limited more tightly; a
+    request's ``cost`` is charged to its route bucket. ``concurrency`` caps
+    the requests that call the LLM.
+    """
+
+    def __init__(self, limiter, client_rate, client_burst, route_limits=None, concurrency=None):
+        self.limiter = limiter
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.route_limits = dict(route_limits or {})
+        self.concurrency = concurrency
+
+        self._lock = threading.Lock()
+        self.rate_limited = 0
+
+    def check_rate(self, client, route, cost=1):
+        """Spend a request's tokens; returns 0 if admitted, else the seconds to wait
+
+        The tokens are only spent when every bucket admits the request. The
+        wait is infinite when ``cost`` is more than the route's burst (see
+        max_cost), as no amount of waiting would admit it.
+        """
+        buckets = [(client, self.client_rate, self.client_burst, 1)]
+        if route in self.route_limits:
+            rate, burst = self.route_limits[route]
+            buckets.append((f"{client} {route}", rate, burst, cost))
+        wait = self.limiter.take_all(buckets)
+        return self._limited(wait) if wait else 0.0
+
+    def max_cost(self, route):
+        """Largest cost a request to ``route`` can ever be admitted with, or None if unlimited"""
+        if route not in self.route_limits:
+            return None
+        rate, burst = self.route_limits[route]
+        return burst if rate > 0 else None
+
+    def _limited(self, wait):
+        with self._lock:
+            self.rate_limited += 1
+        return wait
+
+    def stats(self):
+        """Return rate limiting and concurrency counters"""
+        with self._lock:
+            stats = {"rate_limited": self.rate_limited}
+        if self.concurrency is not None:
+            stats["concurrency"] = self.concurrency.stats()
+        return stats
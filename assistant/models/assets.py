@@ -0,0 +1,333 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+# Bundles built from the static files, in load order. The head bundles are
+# loaded in <head>, the body bundle at the end of <body>.
+BUNDLES = {
+    "head.css": ["css/assistant.css"],
+    "head.js": ["js/assistant.js", "js/theme.js"],
+    "body.js": ["js/responsive.js", "js/voice.js", "js/assistantCustomizer.js"],
+    "base.css": ["css/style.css"],
+    "base.js": ["js/main.js"],
+}
+
+# Built files go to static/<BUILD_DIR> and are served under /assets/
+BUILD_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# The files of this many recent builds are kept, so pages rendered (or cached)
+# before a deploy can still load the assets they reference
+KEEP_BUILDS = 3
+HISTORY_NAME = "builds.json"
+
+# Files worth storing precompressed (images like PNG are already compressed)
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+
+# Fingerprints are this many hex digits of the content's SHA-256
+HASH_LENGTH = 12
+
+# Built files never change under the same name, so clients may keep them for a year
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Precompressed variants in order of preference: (content coding, file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Characters after which a "/" starts a regular expression rather than a division
+_REGEX_PREFIX = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "delete", "throw", "new"}
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)|([^"'/\s]+|/)''', re.S)
+_CSS_TIGHT = set("{};,>")
+_JS_SPACE = re.compile(r"\s+")
+
+
+def minify_css(text):
+    """Strip comments and redundant whitespace from a stylesheet
+
+    Strings are kept as they are; whitespace is only removed next to
+    ``{ } ; , >`` and after ``:``, where it never changes meaning.
+    """
+    out = []
+    pending_space = False
+    for string, comment, space, other in _CSS_TOKENS.findall(text):
+        if comment:
+            continue
+        if space:
+            pending_space = True
+            continue
+        token = string or other
+        if pending_space and out and out[-1][-1] not in _CSS_TIGHT and out[-1][-1] != ":" and token[0] not in _CSS_TIGHT:
+            out.append(" ")
+        pending_space = False
+        if token[0] == "}" and out and out[-1].endswith(";") and not string:
+            out[-1] = out[-1][:-1]
+        out.append(token if string else token.replace(";}", "}"))
+    return "".join(out)
+
+
+def _squeeze(code):
+    """Collapse whitespace in code: runs with a line break become one newline, others one space"""
+    return _JS_SPACE.sub(lambda match: "\n" if "\n" in match.group() else " ", code)
+
+
+def _string_end(text, i):
+    """Index just past the string or template literal starting at ``i``"""
+    quote, i, n = text[i], i + 1, len(text)
+    while i < n and text[i] != quote:
+        if text[i] == "\\":
+            i += 2
+        elif quote == "`" and text.startswith("${", i):
+            i = _expression_end(text, i + 2)
+        else:
+            i += 1
+    return i + 1
+
+
+def _expression_end(text, i):
+    """Index just past the ``}`` closing a template literal's ``${`` expression"""
+    depth, n = 1, len(text)
+    while i < n:
+        char = text[i]
+        if char in "'\"`":
+            i = _string_end(text, i)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def minify_js(text):
+    """Strip comments and redundant whitespace from a script, keeping its line breaks
+
+    Whitespace runs are collapsed rather than removed, and a run containing a
+    line break is kept as a single newline, so automatic semicolon insertion
+    works as before. Strings, template literals and regular expressions are
+    copied through untouched.
+    """
+    out, code = [], []
+    i, n = 0, len(text)
+    last = ""  # Last significant character, to tell regexes from divisions
+    last_word = ""
+
+    def literal(value):
+        out.append(_squeeze("".join(code)))
+        code.clear()
+        out.append(value)
+
+    while i < n:
+        char = text[i]
+        if char in "'\"`":
+            end = _string_end(text, i)
+            literal(text[i:end])
+            last, last_word, i = char, "", end
+        elif text.startswith("//", i):
+            i = text.find("\n", i)
+            i = n if i < 0 else i
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            code.append(" ")
+        elif char == "/" and (not last or last in _REGEX_PREFIX or last_word in _REGEX_KEYWORDS):
+            end, in_class = i + 1, False
+            while end < n and text[end] != "\n" and (in_class or text[end] != "/"):
+                if text[end] == "\\":
+                    end += 1
+                elif text[end] == "[":
+                    in_class = True
+                elif text[end] == "]":
+                    in_class = False
+                end += 1
+            end += 1
+            while end < n and text[end].isalnum():
+                end += 1  # Flags
+            literal(text[i:end])
+            last, last_word, i = "/", "", end
+        else:
+            code.append(char)
+            if not char.isspace():
+                if char.isalnum() or char in "_$":
+                    last_word = last_word + char if last.isalnum() or last in "_$" else char
+                else:
+                    last_word = ""
+                last = char
+            i += 1
+    literal("")
+    return "".join(out).strip() + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def fingerprinted_name(name, content):
+    """``dir/name.<hash>.ext`` for a file's content"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write_atomic(path, content):
+    """Replace a file in one step, so it is never served half-written"""
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_bytes(content)
+    os.replace(temporary, path)
+
+
+def _write_variants(path, content):
+    """Write a file with its gzip and (when the brotli package is installed) brotli variants
+
+    Returns the paths written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, content)
+    written = [path]
+    if path.suffix not in COMPRESSIBLE:
+        return written
+    written.append(path.with_name(path.name + ".gz"))
+    _write_atomic(written[-1], gzip.compress(content, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return written
+    written.append(path.with_name(path.name + ".br"))
+    _write_atomic(written[-1], brotli.compress(content, quality=11))
+    return written
+
+
+def _read_history(build_dir):
+    """Files of the previous builds, oldest first
+
+    A build made before the history was kept counts as one build of every
+    file in the directory.
+    """
+    try:
+        return json.loads((build_dir / HISTORY_NAME).read_text())
+    except (OSError, ValueError):
+        pass
+    files = sorted(path.relative_to(build_dir).as_posix() for path in build_dir.rglob("*")
+                   if path.is_file() and path.name not in (MANIFEST_NAME, HISTORY_NAME))
+    return [files] if files else []
+
+
+def build_assets(static_dir, bundles=BUNDLES, minify=True, keep_builds=KEEP_BUILDS):
+    """Build the bundles and fingerprinted copies of all other static files
+
+    Every output is named after the hash of its content and written with
+    precompressed variants to ``static_dir/dist``, next to the files of the
+    previous builds. The manifest, mapping bundle names and source paths
+    (relative to ``static_dir``) to built paths (relative to ``dist``), is
+    then swapped in as ``dist/manifest.json`` in one step, and files used by
+    none of the last ``keep_builds`` builds are deleted. Returns the manifest.
+    """
+    static_dir = Path(static_dir)
+    build_dir = static_dir / BUILD_DIR
+    build_dir.mkdir(parents=True, exist_ok=True)
+    history = _read_history(build_dir)
+
+    manifest = {}
+    written = []
+    bundled = set()
+    for name, sources in bundles.items():
+        minifier = MINIFIERS.get(os.path.splitext(name)[1]) if minify else None
+        parts = []
+        for source in sources:
+            text = (static_dir / source).read_text(encoding="utf-8")
+            parts.append(minifier(text) if minifier else text)
+            bundled.add(source)
+        # Separate scripts with ";" so a file missing its final semicolon can't merge into the next
+        separator = "\n;\n" if name.endswith(".js") else "\n"
+        content = separator.join(parts).encode("utf-8")
+        manifest[name] = fingerprinted_name(name, content)
+        written += _write_variants(build_dir / manifest[name], content)
+
+    for path in sorted(static_dir.rglob("*")):
+        relative = path.relative_to(static_dir).as_posix()
+        if not path.is_file() or relative.split("/")[0] == BUILD_DIR or relative in bundled:
+            continue
+        content = path.read_bytes()
+        minifier = MINIFIERS.get(path.suffix) if minify else None
+        if minifier:
+            content = minifier(content.decode("utf-8")).encode("utf-8")
+        manifest[relative] = fingerprinted_name(relative, content)
+        written += _write_variants(build_dir / manifest[relative], content)
+
+    history = (history + [sorted(path.relative_to(build_dir).as_posix() for path in written)])[-max(keep_builds, 1):]
+    _write_atomic(build_dir / HISTORY_NAME, json.dumps(history).encode("utf-8"))
+    _write_atomic(build_dir / MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    kept = {name for build in history for name in build} | {MANIFEST_NAME, HISTORY_NAME}
+    for path in sorted(build_dir.rglob("*"), reverse=True):
+        if path.is_file() and path.relative_to(build_dir).as_posix() not in kept:
+            path.unlink()
+        elif path.is_dir() and not any(path.iterdir()):
+            path.rmdir()
+    return manifest
+
+
+def accepted_encodings(header):
+    """Content codings a client accepts, from its Accept-Encoding header"""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def precompressed(directory, filename, accept_encoding):
+    """Pick the variant of a built file to send: returns (file name, content coding or None)"""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(os.path.join(directory, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+
+class AssetManifest:
+    """Resolves asset names to the built, fingerprinted files
+
+    Without a build (no manifest), bundles resolve to their source files and
+    everything else to the plain static file, so the app also runs straight
+    from a checkout. The manifest is re-read when a new build replaces it.
+    """
+
+    def __init__(self, static_dir, bundles=BUNDLES):
+        self.static_dir = Path(static_dir)
+        self.bundles = bundles
+        self.path = self.static_dir / BUILD_DIR / MANIFEST_NAME
+        self._entries = {}
+        self._mtime = None
+
+    def entries(self):
+        """The current manifest, or an empty one when nothing has been built"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            self._entries, self._mtime = {}, None
+            return self._entries
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+            self._mtime = mtime
+        return self._entries
+
+    def built(self, name):
+        """Built path of a bundle or static file, or None"""
+        return self.entries().get(name)
+
+    def sources(self, name):
+        """Static paths to load instead of an unbuilt bundle or file"""
+        return self.bundles.get(name, [name])
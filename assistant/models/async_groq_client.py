@@ -0,0 +1,237 @@
+import asyncio
+import json
+
+import httpx
+
+from config import Config
+from models.groq_client import DEFAULT_SESSION, DEGRADED_MESSAGE
+from models.metrics import metrics
+from models.response_cache import replay_chunks
+
+DEFAULT_BASE_URL = "https://api.groq.com"
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class AsyncGroqClient:
+    """Asyncio client for the Groq API used by the ASGI serving path
+
+    Conversation sessions, prompt packing and the response cache are shared with
+    the given GroqClient, so both serving paths see the same state. Completions
+    are posted to the OpenAI-compatible endpoint over a pooled keep-alive
+    ``httpx.AsyncClient``, and at most ``max_concurrency`` of them are in flight
+    at once. The endpoint is called directly rather than through
+    ``groq.AsyncGroq`` because the SDK's request-parameter transformation costs
+    tens of milliseconds of CPU per call with Arya's long system prompt, which
+    would cap a single event loop far below the concurrency we want. Calls go
+    through the GroqClient's call policy, so both paths share one circuit
+    breaker and latency history.
+    """
+
+    def __init__(self, client, max_concurrency=256, max_connections=100):
+        """Wrap a GroqClient; the HTTP client is created on first use"""
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+
+        self._api = None
+        self._semaphore = None
+        self._inflight = {}  # cache key -> future shared by identical concurrent requests
+
+    def _get_api(self):
+        """Return the pooled HTTP client, creating it on the running event loop"""
+        if self._api is None:
+            self._api = httpx.AsyncClient(
+                base_url=Config.GROQ_BASE_URL or DEFAULT_BASE_URL,
+                headers={"Authorization": f"Bearer {self.client.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(Config.LLM_TIMEOUT, connect=5.0),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._api
+
+    async def close(self):
+        """Close the pooled HTTP connections"""
+        if self._api is not None:
+            await self._api.aclose()
+            self._api = None
+
+    def _payload(self, messages, stream=False):
+        """Build the chat completion request body"""
+        return {
+            "model": self.client.model,
+            "messages": messages,
+            "temperature": self.client.temperature,
+            "max_tokens": self.client.max_tokens,
+            "stream": stream,
+        }
+
+    async def _request(self, messages, timeout):
+        """Make a single Groq API call and return the completion text"""
+        api = self._get_api()
+        async with self._semaphore:
+            response = await api.post(COMPLETIONS_PATH, json=self._payload(messages), timeout=timeout)
+            response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage")
+        if usage:
+            metrics.count_tokens(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        return body["choices"][0]["message"]["content"]
+
+    async def _complete(self, messages, report=None):
+        """Call the Groq API under the call policy and return the completion text"""
+        text, call = await self.client.policy.call_async(lambda timeout: self._request(messages, timeout))
+        if report is not None:
+            report.update(call.as_dict())
+        return text
+
+    async def _complete_cached(self, messages, use_cache, report=None):
+        """Complete through the response cache, coalescing identical requests"""
+        cache = self.client.cache
+        if cache is None:
+            return await self._complete(messages, report), False
+
+        key = self.client._cache_key(messages)
+        cached = cache.get(key, bypass=not use_cache)
+        if cached is not None:
+            return cached, True
+        if not use_cache:
+            return await self._complete(messages, report), False
+
+        pending = self._inflight.get(key)
+        while pending is not None:
+            try:
+                return await asyncio.shield(pending), True
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The leader was cancelled, not this request: take over (or follow whoever did)
+                pending = self._inflight.get(key)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[key] = pending
+        try:
+            text = await self._complete(messages, report)
+            cache.set(key, text)
+            pending.set_result(text)
+            return text, False
+        except asyncio.CancelledError:
+            # The leader's client went away; its followers must not wait forever
+            pending.cancel()
+            raise
+        except BaseException as e:
+            if not pending.done():
+                pending.set_exception(e)
+                # Mark the exception as retrieved in case nobody else was waiting
+                pending.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is pending:
+                del self._inflight[key]
+
+    async def _restore_session(self, session_id):
+        """Run GroqClient.restore_session off the event loop (it may read SQLite)"""
+        if self.client.summarizer is not None and session_id not in self.client.sessions:
+            await asyncio.get_running_loop().run_in_executor(None, self.client.restore_session, session_id)
+
+    async def send_message(self, message, context=None, session_id=DEFAULT_SESSION, use_cache=True):
+        """Send a message to the Groq AI and get a response"""
+        await self._restore_session(session_id)
+        # Add user message to conversation
+        messages = self.client._build_messages(session_id, message, context)
+        report = {}
+
+        try:
+            assistant_response, cached = await self._complete_cached(messages, use_cache, report)
+
+            # Save response
+            self.client.add_message("assistant", assistant_response, session_id)
+
+            return {
+                "status": "success",
+                "message": assistant_response,
+                "cached": cached,
+                "resilience": report or None
+            }
+
+        except Exception as e:
+            # The degraded answer is not added to the history so it can't leak into later prompts
+            metrics.log_error("Error calling Groq API", e, where="llm")
+            return self.client._degraded(e)
+
+    async def stream_message(self, message, context=None, session_id=DEFAULT_SESSION, use_cache=True):
+        """Stream a response from the Groq API, yielding text deltas as they arrive"""
+        await self._restore_session(session_id)
+        # Add user message to conversation
+        messages = self.client._build_messages(session_id, message, context)
+
+        # Replay a cached response as if it were streamed
+        cache = self.client.cache
+        key = None
+        if cache is not None:
+            key = self.client._cache_key(messages)
+            cached = cache.get(key, bypass=not use_cache)
+            if cached is not None:
+                for chunk in replay_chunks(cached):
+                    yield chunk
+                self.client.add_message("assistant", cached, session_id)
+                return
+
+        # Collect the deltas and build the full text once at the end
+        parts = []
+        completed = False
+        api = self._get_api()
+
+        async def open_stream(timeout):
+            request = api.build_request("POST", COMPLETIONS_PATH, json=self._payload(messages, stream=True),
+                                        timeout=timeout)
+            response = await api.send(request, stream=True)
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+                response.raise_for_status()
+            return response
+
+        try:
+            async with self._semaphore:
+                # Failures before the response starts are retried under the call policy;
+                # the read timeout also bounds stalls between chunks
+                response, _ = await self.client.policy.call_async(open_stream, hedge=False)
+                try:
+                    # Server-Sent Events: one "data: {...}" line per chunk, then "data: [DONE]"
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices")
+                        content = choices[0].get("delta", {}).get("content") if choices else None
+                        if content:
+                            parts.append(content)
+                            yield content
+                    completed = True
+                finally:
+                    # Release the upstream connection early if we stopped mid-stream
+                    await response.aclose()
+
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading (e.g. the client disconnected)
+            raise
+        except Exception as e:
+            metrics.log_error("Error in streaming from Groq API", e, where="llm")
+            # Keep a partial answer in history, but never the degraded message
+            if parts:
+                self.client.policy.breaker.record_failure()
+            else:
+                yield DEGRADED_MESSAGE
+        finally:
+            # Add whatever was generated to history; only complete answers are cached
+            if parts:
+                full_response = "".join(parts)
+                self.client._count_stream_tokens(messages, full_response)
+                self.client.add_message("assistant", full_response, session_id)
+                if completed and key is not None and use_cache:
+                    cache.set(key, full_response)
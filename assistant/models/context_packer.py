@@ -0,0 +1,125 @@
+import re
+
+# Rough tokenizer approximation: words are split into ~4 character pieces and
+# every punctuation mark counts as its own token, which tracks BPE tokenizers
+# closely enough for budgeting without shipping a vocabulary
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+CHARS_PER_TOKEN = 4
+
+# Tokens the chat format adds around every message (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a text"""
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // CHARS_PER_TOKEN for piece in TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut a text down to roughly ``max_tokens`` tokens, keeping its beginning"""
+    if max_tokens <= 0:
+        return ""
+    used = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        used += 1 + (len(match.group()) - 1) // CHARS_PER_TOKEN
+        if used > max_tokens:
+            return text[:match.start()].rstrip() + " ..."
+    return text
+
+
+class Turn:
+    """A conversation message with its token count computed once"""
+
+    __slots__ = ("role", "content", "_tokens")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self._tokens = None
+
+    @property
+    def tokens(self):
+        """Estimated prompt tokens for this message, including chat overhead"""
+        if self._tokens is None:
+            self._tokens = estimate_tokens(self.content) + MESSAGE_OVERHEAD
+        return self._tokens
+
+    def as_message(self):
+        """Return the message in the API's dict format"""
+        return {"role": self.role, "content": self.content}
+
+
+class ContextPacker:
+    """Fill a prompt-token budget by priority
+
+    The system prompt always goes in first, then the retrieved memory context,
+    then the current user message, then the summary of compacted turns, then
+    as many previous turns as fit, newest first. Memory context, the summary
+    and an oversized user message are truncated rather than overflowing the
+    model's context window.
+    """
+
+    def __init__(self, budget=6000, memory_share=0.25):
+        """Create a packer for ``budget`` prompt tokens
+
+        ``memory_share`` caps the fraction of the budget left after the system
+        prompt that the memory context may take.
+        """
+        self.budget = budget
+        self.memory_share = memory_share
+
+    def pack(self, system, history, message, context=None, summary=None):
+        """Build the message list for an API call
+
+        ``system`` is the system prompt Turn, ``history`` the previous turns
+        oldest first, ``message`` the new user message text and ``summary`` an
+        optional Turn summarizing earlier turns. Returns the messages and the
+        estimated number of prompt tokens they use.
+        """
+        remaining = self.budget - system.tokens
+
+        # Reserve room for the user message, truncating it only if it alone would overflow
+        user = Turn("user", message)
+        if user.tokens > remaining:
+            user = Turn("user", truncate_to_tokens(message, remaining - MESSAGE_OVERHEAD))
+        remaining -= user.tokens
+
+        context_turn = None
+        if context:
+            content = f"Context information: {context}"
+            allowed = min(remaining, int((self.budget - system.tokens) * self.memory_share))
+            context_turn = Turn("system", content)
+            if context_turn.tokens > allowed:
+                context_turn = Turn("system", truncate_to_tokens(content, allowed - MESSAGE_OVERHEAD))
+            if context_turn.tokens <= MESSAGE_OVERHEAD + 1:
+                context_turn = None
+            else:
+                remaining -= context_turn.tokens
+
+        if summary is not None:
+            if summary.tokens > remaining:
+                summary = Turn(summary.role, truncate_to_tokens(summary.content, remaining - MESSAGE_OVERHEAD))
+            if summary.tokens <= MESSAGE_OVERHEAD + 1:
+                summary = None
+            else:
+                remaining -= summary.tokens
+
+        # Walk back from the newest turn until the budget runs out
+        included = []
+        for turn in reversed(history):
+            if turn.tokens > remaining:
+                break
+            included.append(turn)
+            remaining -= turn.tokens
+        included.reverse()
+
+        messages = [system.as_message()]
+        if context_turn is not None:
+            messages.append(context_turn.as_message())
+        if summary is not None:
+            messages.append(summary.as_message())
+        messages.extend(turn.as_message() for turn in included)
+        messages.append(user.as_message())
+        return messages, self.budget - remaining
@@ -0,0 +1,164 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from models.db import connect
+from models.metrics import metrics
+
+# Sentinel telling the writer thread to flush and exit
+_STOP = object()
+
+# Durability modes: "sync" writes on the caller's thread like before; the
+# others batch writes in the background with the given SQLite synchronous level
+DURABILITY_MODES = {
+    "sync": None,
+    "full": "FULL",
+    "normal": "NORMAL",
+    "off": "OFF",
+}
+
+
+class ConversationWriter:
+    """Write-behind queue that logs conversation exchanges in batches
+
+    Exchanges are timestamped when submitted and written by a background
+    thread in a single ``executemany`` transaction once ``batch_size`` items
+    are queued or ``flush_interval`` seconds have passed. When the queue is
+    full the caller waits up to ``put_timeout`` seconds and then writes the
+    exchange itself, so logging slows down instead of dropping data.
+    """
+
+    def __init__(self, memory, durability="normal", max_queue=10000, batch_size=100,
+                 flush_interval=0.5, put_timeout=0.05):
+        """Create the writer and start its background thread"""
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+
+        self.memory = memory
+        self.durability = durability
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        # Counters exposed through stats()
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.inline_writes = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._start()
+        atexit.register(self.close)
+
+    def _start(self):
+        """Start the background thread for the current process"""
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        if DURABILITY_MODES[self.durability] is None:
+            return
+        self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, messages, metadata=None, session_id=None):
+        """Queue a conversation exchange for storage"""
+        record = self.memory.conversation_record(messages, metadata, session_id)
+
+        with self._lock:
+            self.submitted += 1
+            # Threads don't survive a fork, so a worker forked from a
+            # preloaded parent needs its own writer thread
+            if self._pid != os.getpid():
+                self._start()
+
+        if self._thread is None:
+            self.memory.store_conversations([record])
+            with self._lock:
+                self.written += 1
+            return
+
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            # Backpressure: the request pays for its own write
+            with self._lock:
+                self.inline_writes += 1
+            self.memory.store_conversations([record])
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self, timeout=5.0):
+        """Flush pending exchanges and stop the background thread"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        """Return queue depth and write counters"""
+        with self._lock:
+            return {
+                "durability": self.durability,
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "batches": self.batches,
+                "inline_writes": self.inline_writes,
+                "failed": self.failed,
+            }
+
+    def _run(self):
+        """Collect batches from the queue and write them until stopped"""
+        conn = connect(self.memory.db_path, synchronous=DURABILITY_MODES[self.durability])
+        stopping = False
+        try:
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    self._queue.task_done()
+                    break
+
+                # Gather more items until the batch is full or the interval is up
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        self._queue.task_done()
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        """Write one batch in a single transaction"""
+        try:
+            self.memory.store_conversations(batch, conn=conn)
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            metrics.log_error("Error writing conversation batch", e, where="writer")
+            with self._lock:
+                self.failed += len(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
@@ -0,0 +1,143 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Pragmas applied to every connection. WAL lets readers run alongside the
+# single writer, and synchronous=NORMAL only fsyncs at checkpoints, which is
+# safe against corruption in WAL mode.
+DEFAULT_SYNCHRONOUS = "NORMAL"
+DEFAULT_CACHE_SIZE_KB = 16384
+DEFAULT_MMAP_SIZE = 64 * 1024 * 1024
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Per-connection prepared statement cache (sqlite3 reuses statements by SQL text)
+STATEMENT_CACHE_SIZE = 256
+
+
+def connect(db_path, synchronous=DEFAULT_SYNCHRONOUS, cache_size_kb=DEFAULT_CACHE_SIZE_KB):
+    """Open a SQLite connection tuned for a multi-threaded web server"""
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_SECONDS,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_size_kb)}")
+    conn.execute(f"PRAGMA mmap_size={DEFAULT_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def incremental_vacuum_enabled(conn):
+    """Whether a database uses incremental auto-vacuum"""
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def enable_incremental_vacuum(conn, rebuild=False):
+    """Switch a database to incremental auto-vacuum; returns whether it is now enabled
+
+    The setting takes effect through a VACUUM, which rewrites the whole file
+    under an exclusive lock. That is free for a database with no tables yet,
+    so a new one is switched at once; an existing one only with ``rebuild``.
+    Afterwards free pages can be released a few at a time with
+    ``PRAGMA incremental_vacuum``.
+    """
+    if incremental_vacuum_enabled(conn):
+        return True
+    if not rebuild and conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is not None:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return incremental_vacuum_enabled(conn)
+
+
+class ConnectionPool:
+    """Small pool of persistent SQLite connections shared by the threads of one process
+
+    Connections are created lazily up to ``size`` and handed out one thread at a
+    time. After a fork the child discards the inherited connections and starts
+    a fresh pool, so handles are never shared between processes.
+    """
+
+    def __init__(self, db_path, size=8, timeout=30.0, synchronous=DEFAULT_SYNCHRONOUS,
+                 cache_size_kb=DEFAULT_CACHE_SIZE_KB, on_connect=None):
+        """Create an empty pool for the given database file
+
+        ``on_connect`` is called with each newly opened connection, e.g. to
+        register SQL functions.
+        """
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.on_connect = on_connect
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Forget all connections (used at start-up and after a fork)"""
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def _acquire(self):
+        """Take an idle connection, open a new one, or wait for one to be returned"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            create = self._created < self.size
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                conn = connect(self.db_path, self.synchronous, self.cache_size_kb)
+                if self.on_connect is not None:
+                    self.on_connect(conn)
+                return conn
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def close(self):
+        """Close every idle connection owned by this process"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+                return
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._created -= 1
@@ -1,24 +1,20 @@
 import os
 import json
-import sys
-from pathlib import Path
 import groq
 
-# Add parent directory to path to allow importing the Config
-sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
+from models.context_packer import MESSAGE_OVERHEAD, ContextPacker, Turn, estimate_tokens
+from models.metrics import metrics
+from models.resilience import CallPolicy, CircuitBreaker
+from models.response_cache import ResponseCache, cache_key, replay_chunks
+from models.session_store import SessionStore
 
-class GroqClient:
-    """Client for interacting with the Groq API"""
-    
-    def __init__(self):
-        """Initialize the Groq client"""
-        self.api_key = Config.GROQ_API_KEY
-        self.model = Config.GROQ_MODEL
-        self.conversation_history = []
-        
-        # Add a system message to identify the assistant as Arya
-        self.add_message("system", """You are Arya, an extremely funny, witty, and comic AI assistant who loves to make your users laugh. Your humor is your defining characteristic. You are not just a coding assistant - you are a versatile companion capable of helping with any aspect of life, just like a hilarious friend would be. Your personality traits include:
+DEFAULT_SESSION = "default"
+
+# Returned (but never added to the conversation history) when the API can't be reached
+DEGRADED_MESSAGE = "I'm having trouble reaching my language model right now, so I can't give you a proper answer. Please try again in a moment."
+
+SYSTEM_PROMPT = """You are Arya, an extremely funny, witty, and comic AI assistant who loves to make your users laugh. Your humor is your defining characteristic. You are not just a coding assistant - you are a versatile companion capable of helping with any aspect of life, just like a hilarious friend would be. Your personality traits include:
 
 **1. Communication Style:**
 - if the user asks who is your creator, then reply shashank
@@ -120,117 +116,262 @@ class GroqClient:
 - Remember the jokes that made the user laugh the most
 
                          
-**Remember:** You are Arya, not any other AI model. Always respond as Arya with your uniquely humorous personality. While you are extremely funny and playful, you also know when to tone down the humor for serious situations. Your goal is to make every interaction enjoyable and bring laughter to your users while still being helpful and supportive.""")
+**Remember:** You are Arya, not any other AI model. Always respond as Arya with your uniquely humorous personality. While you are extremely funny and playful, you also know when to tone down the humor for serious situations. Your goal is to make every interaction enjoyable and bring laughter to your users while still being helpful and supportive."""
+
+
+class GroqClient:
+    """Client for interacting with the Groq API"""
+    
+    def __init__(self, sessions=None, cache=None, policy=None):
+        """Initialize the Groq client"""
+        self.api_key = Config.GROQ_API_KEY
+        self.model = Config.GROQ_MODEL
+        self.temperature = 0.7
+        self.max_tokens = 1024
+        
+        # Per-session conversation histories (system prompt is kept separately)
+        self.sessions = sessions or SessionStore(
+            max_sessions=Config.SESSION_MAX_COUNT,
+            max_total_chars=Config.SESSION_MAX_CHARS,
+            ttl=Config.SESSION_TTL,
+            max_messages=Config.MAX_CONTEXT_LENGTH * 2,  # *2 for user/assistant pairs
+        )
+        
+        # The system message identifies the assistant as Arya and is sent with every request
+        self.system_message = Turn("system", SYSTEM_PROMPT)
+        
+        # Fits the system prompt, memory context and recent turns into the prompt budget
+        self.packer = ContextPacker(budget=Config.PROMPT_TOKEN_BUDGET)
+        self.last_prompt_tokens = 0
+        
+        # Optional ConversationSummarizer compacting long sessions in the background
+        self.summarizer = None
+        
+        # Completion cache shared by send_message and stream_message
+        if cache is None and Config.RESPONSE_CACHE_ENABLED:
+            cache = ResponseCache(
+                max_entries=Config.RESPONSE_CACHE_SIZE,
+                ttl=Config.RESPONSE_CACHE_TTL,
+                db_path=Config.RESPONSE_CACHE_DB or None,
+            )
+        self.cache = cache
+        
+        # Deadlines, retries, hedging and the circuit breaker for API calls
+        self.policy = policy or CallPolicy(
+            timeout=Config.LLM_TIMEOUT,
+            attempt_timeout=Config.LLM_ATTEMPT_TIMEOUT,
+            max_retries=Config.LLM_MAX_RETRIES,
+            backoff_base=Config.LLM_BACKOFF_BASE,
+            backoff_max=Config.LLM_BACKOFF_MAX,
+            hedge=Config.LLM_HEDGE_ENABLED,
+            hedge_percentile=Config.LLM_HEDGE_PERCENTILE,
+            breaker=CircuitBreaker(
+                failure_threshold=Config.LLM_BREAKER_THRESHOLD,
+                reset_timeout=Config.LLM_BREAKER_RESET,
+            ),
+        )
+        
+        # Create the client with the API key (and an optional API host override);
+        # retries are left to the call policy
+        self.client = groq.Client(
+            api_key=self.api_key,
+            base_url=Config.GROQ_BASE_URL or None,
+            max_retries=0,
+            timeout=Config.LLM_TIMEOUT,
+        )
+        metrics.notice(f"Initialized Groq client with model: {self.model}", model=self.model)
         
-        # Create the client with only the API key
-        self.client = groq.Client(api_key=self.api_key)
-        print(f"Initializing Groq client with model: {self.model}")
+    def add_message(self, role, content, session_id=DEFAULT_SESSION):
+        """Add a message to a session's conversation history"""
+        # The session store trims the history to the most recent messages
+        self.sessions.append(session_id, role, content)
         
-    def add_message(self, role, content):
-        """Add a message to the conversation history"""
-        self.conversation_history.append({
-            "role": role,
-            "content": content
-        })
+        # Once an exchange is complete, long sessions are summarized off the request path
+        if role == "assistant" and self.summarizer is not None:
+            self.summarizer.schedule(session_id)
+    
+    def get_history(self, session_id=DEFAULT_SESSION):
+        """Return the system message, summary and a session's conversation history"""
+        turns = [self.system_message]
+        summary = self.sessions.get_summary(session_id)
+        if summary is not None:
+            turns.append(summary)
+        turns += self.sessions.get_history(session_id)
+        return [turn.as_message() for turn in turns]
+    
+    def restore_session(self, session_id):
+        """Bring back the stored summary of a session the session store has dropped
+
+        Evicted and expired sessions lose their summary along with their
+        turns; the summarizer keeps the latest one in the database. Cached
+        sessions are left alone, so this reads the database at most once per
+        session the store takes back.
+        """
+        if self.summarizer is None or session_id in self.sessions:
+            return
+        try:
+            summary = self.summarizer.load(session_id)
+        except Exception as e:
+            metrics.log_error("Error loading conversation summary", e)
+            return
+        self.sessions.restore(session_id, summary)
+    
+    def _build_messages(self, session_id, message, context=None):
+        """Pack the messages for an API call and record the user message"""
+        self.restore_session(session_id)
+        # Look the session up before recording the new turn so that hit/miss
+        # statistics reflect whether the conversation was still cached
+        history = self.sessions.get_history(session_id)
+        summary = self.sessions.get_summary(session_id)
+        self.add_message("user", message, session_id)
         
-        # Keep conversation history within limits
-        if len(self.conversation_history) > Config.MAX_CONTEXT_LENGTH * 2:  # *2 for user/assistant pairs
-            # Remove oldest messages but keep system messages
-            system_messages = [msg for msg in self.conversation_history if msg["role"] == "system"]
-            other_messages = [msg for msg in self.conversation_history if msg["role"] != "system"]
-            other_messages = other_messages[-(Config.MAX_CONTEXT_LENGTH * 2):]  # Keep the most recent messages
-            self.conversation_history = system_messages + other_messages
+        messages, self.last_prompt_tokens = self.packer.pack(
+            self.system_message, history, message, context, summary=summary
+        )
+        return messages
+    
+    def _cache_key(self, messages):
+        """Key identifying a completion request in the response cache"""
+        return cache_key(self.model, messages, self.temperature, self.max_tokens)
+    
+    def _request(self, messages, timeout, max_tokens=None):
+        """Make a single Groq API call and return the completion text"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=max_tokens or self.max_tokens,
+            timeout=timeout,
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.count_tokens(usage.prompt_tokens, usage.completion_tokens)
+        return response.choices[0].message.content
+    
+    def _complete(self, messages, report=None, max_tokens=None, policy=None):
+        """Call the Groq API under the call policy and return the completion text
+        
+        When given, ``report`` is filled with the attempts, retries and breaker
+        state the call went through. ``policy`` replaces the client's own, for
+        calls that must not share its circuit breaker.
+        """
+        text, call = (policy or self.policy).call(lambda timeout: self._request(messages, timeout, max_tokens))
+        if report is not None:
+            report.update(call.as_dict())
+        return text
+    
+    def _count_stream_tokens(self, messages, text):
+        """Count the estimated tokens of a streamed completion, which carries no usage"""
+        if metrics.enabled:
+            metrics.count_tokens(
+                sum(estimate_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages),
+                estimate_tokens(text),
+            )
+    
+    def _degraded(self, error):
+        """Build the response returned when the API call failed"""
+        report = getattr(error, "report", None)
+        return {
+            "status": "error",
+            "degraded": True,
+            "message": DEGRADED_MESSAGE,
+            "resilience": report.as_dict() if report is not None else None
+        }
     
-    def send_message(self, message, context=None):
+    def send_message(self, message, context=None, session_id=DEFAULT_SESSION, use_cache=True):
         """Send a message to the Groq AI and get a response"""
         # Add user message to conversation
-        self.add_message("user", message)
+        messages = self._build_messages(session_id, message, context)
+        report = {}
         
         try:
-            # Prepare messages with system message always first
-            messages = list(self.conversation_history)
+            if self.cache is None:
+                assistant_response, cached = self._complete(messages, report), False
+            else:
+                # Identical concurrent requests share a single API call
+                assistant_response, cached = self.cache.get_or_compute(
+                    self._cache_key(messages),
+                    lambda: self._complete(messages, report),
+                    bypass=not use_cache,
+                )
             
-            # Add additional context if provided
-            if context:
-                # Find the first non-system message
-                first_non_system_idx = next((i for i, msg in enumerate(messages) if msg["role"] != "system"), 0)
-                
-                # Insert context just after system messages
-                messages.insert(first_non_system_idx, {
-                    "role": "system",
-                    "content": f"Context information: {context}"
-                })
-            
-            # Call Groq API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1024,
-            )
-            
-            # Extract and save response
-            assistant_response = response.choices[0].message.content
-            self.add_message("assistant", assistant_response)
+            # Save response
+            self.add_message("assistant", assistant_response, session_id)
             
             return {
                 "status": "success",
-                "message": assistant_response
+                "message": assistant_response,
+                "cached": cached,
+                "resilience": report or None
             }
             
         except Exception as e:
-            print(f"Error calling Groq API: {str(e)}")
-            error_message = "I encountered an error while processing your request. Please check your API key and try again."
-            self.add_message("assistant", error_message)
-            return {
-                "status": "error",
-                "message": error_message
-            }
+            # The degraded answer is not added to the history so it can't leak into later prompts
+            metrics.log_error("Error calling Groq API", e, where="llm")
+            return self._degraded(e)
     
-    def stream_message(self, message, context=None):
-        """Stream a response from the Groq API"""
+    def stream_message(self, message, context=None, session_id=DEFAULT_SESSION, use_cache=True):
+        """Stream a response from the Groq API, yielding text deltas as they arrive"""
         # Add user message to conversation
-        self.add_message("user", message)
+        messages = self._build_messages(session_id, message, context)
+        
+        # Replay a cached response as if it were streamed
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(messages)
+            cached = self.cache.get(key, bypass=not use_cache)
+            if cached is not None:
+                yield from replay_chunks(cached)
+                self.add_message("assistant", cached, session_id)
+                return
+        
+        # Collect the deltas and build the full text once at the end
+        parts = []
+        stream = None
+        completed = False
         
         try:
-            # Prepare messages with system message always first
-            messages = list(self.conversation_history)
-            
-            # Add additional context if provided
-            if context:
-                # Find the first non-system message
-                first_non_system_idx = next((i for i, msg in enumerate(messages) if msg["role"] != "system"), 0)
-                
-                # Insert context just after system messages
-                messages.insert(first_non_system_idx, {
-                    "role": "system",
-                    "content": f"Context information: {context}"
-                })
-            
-            # Call Groq API with streaming
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1024,
-                stream=True,
+            # Open the stream under the call policy; failures before the response
+            # starts are retried, and the timeout also bounds stalls between chunks
+            stream, _ = self.policy.call(
+                lambda timeout: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                    timeout=timeout,
+                ),
+                hedge=False,
             )
             
-            # Initialize response
-            full_response = ""
-            
-            # Yield each chunk as it arrives
+            # Yield each delta as it arrives
             for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
+                if chunk.choices and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
-                    full_response += content
-                    yield full_response
-            
-            # Add the complete response to history
-            self.add_message("assistant", full_response)
+                    parts.append(content)
+                    yield content
+            completed = True
             
+        except GeneratorExit:
+            # The consumer stopped reading (e.g. the client disconnected)
+            raise
         except Exception as e:
-            print(f"Error in streaming from Groq API: {str(e)}")
-            error_message = "I encountered an error while streaming your response. Please check your API key and try again."
-            yield error_message
-            self.add_message("assistant", error_message)
\ No newline at end of file
+            metrics.log_error("Error in streaming from Groq API", e, where="llm")
+            # Keep a partial answer in history, but never the degraded message
+            if parts:
+                self.policy.breaker.record_failure()
+            else:
+                yield DEGRADED_MESSAGE
+        finally:
+            # Release the upstream connection early if we stopped mid-stream
+            if stream is not None:
+                stream.close()
+            
+            # Add whatever was generated to history; only complete answers are cached
+            if parts:
+                full_response = "".join(parts)
+                self._count_stream_tokens(messages, full_response)
+                self.add_message("assistant", full_response, session_id)
+                if completed and key is not None and use_cache:
+                    self.cache.set(key, full_response)
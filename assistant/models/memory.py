@@ -1,143 +1,766 @@
 import sqlite3
 import json
 import datetime
+import re
 from pathlib import Path
 import os
+from contextlib import nullcontext
+
+from models.db import ConnectionPool, enable_incremental_vacuum
+from models.metrics import metrics
+from models.records import RAW, MessageCodec, pack_body, resolve_codec, train_dictionary
+from models.simhash import BANDS, bands, hamming, jaccard, simhash, to_signed, to_unsigned, words
+
+# Word characters used to split search queries into FTS terms
+QUERY_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# How much each importance level boosts a search result's BM25 score
+IMPORTANCE_BOOST = 0.25
+
+# Largest page of messages returned by get_messages
+MAX_PAGE_SIZE = 200
+
+# Importance a memory can reach by being merged with its near-duplicates
+MAX_IMPORTANCE = 5
+
+BAND_COLUMNS = [f"band{band}" for band in range(BANDS)]
+
+# Messages sampled (newest first) to train a compression dictionary
+DICTIONARY_SAMPLES = 5000
+
+
+def epoch_ms(moment=None):
+    """Integer Unix timestamp in milliseconds, as stored in messages.ts"""
+    moment = moment or datetime.datetime.now()
+    return int(moment.timestamp() * 1000)
+
+
+def encode_cursor(ts, message_id):
+    """Opaque keyset cursor pointing at a message"""
+    return f"{ts}-{message_id}"
+
+
+def decode_cursor(cursor):
+    """Return the (ts, id) pair of a cursor; raises ValueError if malformed"""
+    ts, message_id = cursor.split("-")
+    return int(ts), int(message_id)
+
 
 class Memory:
     """Memory management for the assistant"""
-    
-    def __init__(self, db_path="assistant.db"):
-        """Initialize the memory system with SQLite database"""
+
+    def __init__(self, db_path="assistant.db", pool_size=8, dedup_distance=3, dedup_similarity=0.8,
+                 compression="auto"):
+        """Initialize the memory system with SQLite database
+
+        New memories within ``dedup_distance`` SimHash bits of an existing one
+        (at most BANDS - 1) whose word sets have a Jaccard similarity of at
+        least ``dedup_similarity`` are merged into it; None stores every
+        memory as is.
+        Logged messages are stored as compact records compressed with
+        ``compression`` (see models/records.py).
+        """
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        self.fts_enabled = False
+        self.dedup_distance = None if dedup_distance is None else min(dedup_distance, BANDS - 1)
+        self.dedup_similarity = dedup_similarity
+        self.merged = 0
+        self.codec = MessageCodec(resolve_codec(compression), loader=self._load_dictionaries)
         self._init_db()
-        
+
     def _init_db(self):
-        """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create conversations table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY,
-            timestamp TEXT,
-            content TEXT,
-            metadata TEXT
-        )
-        ''')
-        
-        # Create memories table (for explicitly remembered items)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS memories (
-            id INTEGER PRIMARY KEY,
-            timestamp TEXT,
-            content TEXT,
-            importance INTEGER,
-            metadata TEXT
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def store_conversation(self, messages, metadata=None):
+        """Check the schema, creating or migrating it only when it is behind
+
+        A database that is already current costs one read, so workers started
+        after ``migrate`` ran (e.g. from the gunicorn on_starting hook) do no
+        DDL at all.
+        """
+        with self.pool.connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < len(MIGRATIONS):
+            self.migrate()
+        with self.pool.connection() as conn:
+            self.fts_enabled = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'memories_fts'"
+            ).fetchone() is not None
+        self.codec.reload()
+
+    def migrate(self):
+        """Create the tables and bring the schema up to the current version
+
+        Each migration runs in a write transaction that re-checks the version
+        first, so processes migrating the same database at once apply every
+        migration exactly once.
+        """
+        with self.pool.connection() as conn:
+            # Free for a new database; an existing one is converted by ``migrate-db --vacuum``
+            enable_incremental_vacuum(conn)
+            with conn:
+                # Create memories table (for explicitly remembered items)
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS memories (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT,
+                    content TEXT,
+                    importance INTEGER,
+                    metadata TEXT
+                )
+                ''')
+
+            for target, migration in enumerate(MIGRATIONS, start=1):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < target:
+                        migration(conn)
+                        conn.execute(f"PRAGMA user_version = {target}")
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def close(self):
+        """Close the pooled database connections"""
+        self.pool.close()
+
+    @staticmethod
+    def conversation_record(messages, metadata=None, session_id=None):
+        """Build the message rows stored for a conversation exchange"""
+        ts = epoch_ms()
+        metadata_json = json.dumps(metadata) if metadata else None
+        return [
+            (session_id, message["role"], message["content"], ts, metadata_json)
+            for message in messages
+        ]
+
+    def store_conversation(self, messages, metadata=None, session_id=None):
         """Store a conversation exchange in the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        timestamp = datetime.datetime.now().isoformat()
-        content_json = json.dumps(messages)
-        metadata_json = json.dumps(metadata) if metadata else '{}'
-        
-        cursor.execute(
-            "INSERT INTO conversations (timestamp, content, metadata) VALUES (?, ?, ?)",
-            (timestamp, content_json, metadata_json)
-        )
-        
-        conn.commit()
-        conn.close()
-    
+        self.store_conversations([self.conversation_record(messages, metadata, session_id)])
+
+    @metrics.timed_query("store_conversations")
+    def store_conversations(self, records, conn=None):
+        """Store several conversation records in a single transaction"""
+        rows = [
+            (session_id, ts, self.codec.encode(role, content, metadata))
+            for record in records
+            for session_id, role, content, ts, metadata in record
+        ]
+        with (self.pool.connection() if conn is None else nullcontext(conn)) as conn, conn:
+            # The role and content columns only hold rows written before the record format
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, ts, record) VALUES (?, '', '', ?, ?)",
+                rows
+            )
+
+    def save_session_summary(self, session_id, content, turns=0):
+        """Save a session's rolling summary, replacing the previous one
+
+        Summaries live apart from memories, so they are never retrieved for
+        (or merged into the memories of) any other session.
+        """
+        with self.pool.connection() as conn, conn:
+            conn.execute('''
+            INSERT INTO session_summaries (session_id, content, turns, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                content = excluded.content,
+                turns = session_summaries.turns + excluded.turns,
+                updated_at = excluded.updated_at
+            ''', (session_id, content, turns, epoch_ms()))
+
+    def get_session_summary(self, session_id):
+        """Return a session's saved summary, or None"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT content FROM session_summaries WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
     def store_memory(self, content, importance=1, metadata=None):
-        """Store a specific memory item with importance level"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """Store a specific memory item with importance level; returns its id"""
+        return self.remember(content, importance, metadata)[0]
+
+    @metrics.timed_query("store_memory")
+    def remember(self, content, importance=1, metadata=None):
+        """Store a memory, or merge it into a near-duplicate
+
+        A near-duplicate is an existing memory with a nearby SimHash and
+        mostly the same words (see dedup_similarity). A merge bumps the
+        existing memory's importance and refreshes its timestamp, and the
+        memory takes the new text, so a restated fact that changed (a date,
+        a name) replaces the stale one. Returns ``(memory id, whether it was
+        merged)``.
+        """
         timestamp = datetime.datetime.now().isoformat()
         metadata_json = json.dumps(metadata) if metadata else '{}'
-        
-        cursor.execute(
-            "INSERT INTO memories (timestamp, content, importance, metadata) VALUES (?, ?, ?, ?)",
-            (timestamp, content, importance, metadata_json)
+        fingerprint = simhash(content)
+
+        with self.pool.connection() as conn, conn:
+            if fingerprint is not None and self.dedup_distance is not None:
+                duplicate = self._find_duplicate(conn, content, fingerprint, self.dedup_distance,
+                                                 self.dedup_similarity)
+                if duplicate is not None:
+                    self._merge_into(conn, duplicate, content, fingerprint, importance, timestamp)
+                    self.merged += 1
+                    return duplicate, True
+            cursor = conn.execute(
+                "INSERT INTO memories (timestamp, content, importance, metadata, simhash, "
+                f"{', '.join(BAND_COLUMNS)}) VALUES (?, ?, ?, ?, ?, {', '.join('?' for _ in BAND_COLUMNS)})",
+                (timestamp, content, importance, metadata_json) + self._fingerprint_values(fingerprint)
+            )
+        return cursor.lastrowid, False
+
+    @staticmethod
+    def _fingerprint_values(fingerprint):
+        """Column values (simhash, band0, ...) stored for a fingerprint"""
+        if fingerprint is None:
+            return (None,) * (1 + BANDS)
+        return (to_signed(fingerprint), *bands(fingerprint))
+
+    @staticmethod
+    def _find_duplicate(conn, content, fingerprint, max_distance, min_similarity, before_id=None):
+        """Return the id of the closest near-duplicate of ``content``, or None
+
+        Only memories sharing at least one band are compared, which is every
+        memory within ``max_distance`` bits; each band lookup uses its own
+        index. The fingerprint is only an estimate, so a candidate's words
+        must also have a Jaccard similarity of at least ``min_similarity``
+        with the content's. ``before_id`` limits the search to older memories.
+        """
+        query = (f"SELECT id, simhash, content FROM memories "
+                 f"WHERE ({' OR '.join(f'{column} = ?' for column in BAND_COLUMNS)})")
+        params = bands(fingerprint)
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        content_words = None
+        best = None
+        for memory_id, value, existing in conn.execute(query, params).fetchall():
+            distance = hamming(fingerprint, to_unsigned(value))
+            if distance > max_distance:
+                continue
+            if content_words is None:
+                content_words = words(content)
+            similarity = jaccard(content_words, words(existing or ""))
+            if similarity >= min_similarity and (best is None or (-similarity, distance) < best[0]):
+                best = ((-similarity, distance), memory_id)
+        return best[1] if best is not None else None
+
+    def _merge_into(self, conn, memory_id, content, fingerprint, importance, timestamp):
+        """Fold a repeated memory into an existing one, keeping the newer wording"""
+        # Clearing the retention key makes RetentionManager recompute it from the new values
+        conn.execute(
+            "UPDATE memories SET importance = MIN(MAX(COALESCE(importance, 0), ?) + 1, ?), "
+            "timestamp = MAX(timestamp, ?), retention = NULL, content = ?, simhash = ?, "
+            f"{', '.join(f'{column} = ?' for column in BAND_COLUMNS)} WHERE id = ?",
+            (importance, MAX_IMPORTANCE, timestamp, content) + self._fingerprint_values(fingerprint) + (memory_id,)
         )
-        
-        conn.commit()
-        conn.close()
-        return cursor.lastrowid
-        
+
+    def deduplicate(self, max_distance=None, batch_size=1000):
+        """Fingerprint memories stored without one, merging near-duplicates into older memories
+
+        Rows are processed oldest first, and each is only merged into a
+        memory with a lower id, which then takes the row's newer text.
+        Near-duplicates are matched as in remember. ``max_distance`` defaults
+        to dedup_distance, or BANDS - 1 when store-time merging is off.
+        Returns ``{removed id: id of the memory it was merged into}``.
+        """
+        if max_distance is None:
+            max_distance = self.dedup_distance if self.dedup_distance is not None else BANDS - 1
+        max_distance = min(max_distance, BANDS - 1)
+        removed = {}
+        with self.pool.connection() as conn:
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    "SELECT id, content, importance, timestamp FROM memories "
+                    "WHERE simhash IS NULL AND id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                with conn:
+                    for memory_id, content, importance, timestamp in rows:
+                        content = content or ""
+                        fingerprint = simhash(content)
+                        if fingerprint is None:
+                            continue
+                        duplicate = self._find_duplicate(conn, content, fingerprint, max_distance,
+                                                         self.dedup_similarity, before_id=memory_id)
+                        if duplicate is not None:
+                            self._merge_into(conn, duplicate, content, fingerprint, importance or 0, timestamp)
+                            conn.execute("DELETE FROM memories WHERE id = ?", (memory_id,))
+                            removed[memory_id] = duplicate
+                            continue
+                        conn.execute(
+                            f"UPDATE memories SET simhash = ?, {', '.join(f'{column} = ?' for column in BAND_COLUMNS)} "
+                            "WHERE id = ?",
+                            self._fingerprint_values(fingerprint) + (memory_id,)
+                        )
+                last_id = rows[-1][0]
+        return removed
+
+    @metrics.timed_query("get_memories")
     def get_memories(self, limit=10):
         """Retrieve the most recent memories"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, timestamp, content, importance FROM memories ORDER BY timestamp DESC LIMIT ?",
-            (limit,)
-        )
-        
-        memories = []
-        for row in cursor.fetchall():
-            memories.append({
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, timestamp, content, importance FROM memories ORDER BY timestamp DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+        return [
+            {
                 "id": row[0],
                 "timestamp": row[1],
                 "content": row[2],
                 "importance": row[3]
-            })
-        
-        conn.close()
-        return memories
-        
-    def search_memories(self, query, limit=5):
-        """Simple keyword search in memories"""
-        conn = sqlite3.connect(self.db_path)
-        conn.create_function("LOWER", 1, lambda x: x.lower() if x else None)
-        cursor = conn.cursor()
-        
-        # Simple keyword search
-        cursor.execute(
-            "SELECT id, timestamp, content, importance FROM memories WHERE LOWER(content) LIKE ? ORDER BY importance DESC, timestamp DESC LIMIT ?",
-            (f"%{query.lower()}%", limit)
-        )
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
+            }
+            for row in rows
+        ]
+
+    @metrics.timed_query("get_memories_by_ids")
+    def get_memories_by_ids(self, memory_ids):
+        """Retrieve specific memories by id"""
+        if not memory_ids:
+            return []
+        placeholders = ", ".join("?" for _ in memory_ids)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, timestamp, content, importance FROM memories WHERE id IN ({placeholders})",
+                list(memory_ids)
+            ).fetchall()
+
+        return [
+            {
                 "id": row[0],
                 "timestamp": row[1],
                 "content": row[2],
                 "importance": row[3]
-            })
-        
-        conn.close()
+            }
+            for row in rows
+        ]
+
+    @metrics.timed_query("get_memories_after")
+    def get_memories_after(self, memory_id, limit=None):
+        """Retrieve (id, content) pairs for memories newer than an id, oldest first"""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT id, content FROM memories WHERE id > ? ORDER BY id LIMIT ?",
+                (memory_id, -1 if limit is None else limit)
+            ).fetchall()
+
+    def get_memory_ids(self):
+        """Retrieve the ids of all stored memories"""
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM memories")]
+
+    @metrics.timed_query("count_memories")
+    def count_memories(self):
+        """Count the stored memories"""
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+
+    @metrics.timed_query("search_memories")
+    def search_memories(self, query, limit=5):
+        """Full-text search in memories ranked by BM25 relevance and importance"""
+        terms = QUERY_TERM_PATTERN.findall(query)
+        if not terms:
+            return []
+        if not self.fts_enabled:
+            return self._search_memories_like(query, limit)
+
+        # Quote each term so user input can't inject FTS syntax; match prefixes
+        quoted = [f'"{term}"*' for term in terms]
+        results = self._search_memories_fts(" ".join(quoted), limit)
+        if not results and len(quoted) > 1:
+            # Fall back to matching any of the terms
+            results = self._search_memories_fts(" OR ".join(quoted), limit)
         return results
-        
-    def get_recent_conversations(self, limit=5):
-        """Retrieve recent conversation history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, timestamp, content FROM conversations ORDER BY timestamp DESC LIMIT ?",
-            (limit,)
-        )
-        
-        conversations = []
-        for row in cursor.fetchall():
-            conversations.append({
+
+    def _search_memories_fts(self, match, limit):
+        """Run an FTS5 MATCH query against the memories index"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT m.id, m.timestamp, m.content, m.importance,
+                       snippet(memories_fts, 0, '**', '**', '...', 16),
+                       bm25(memories_fts) * (1 + ? * COALESCE(m.importance, 0)) AS score
+                FROM memories_fts
+                JOIN memories m ON m.id = memories_fts.rowid
+                WHERE memories_fts MATCH ?
+                ORDER BY score, m.importance DESC, m.timestamp DESC
+                LIMIT ?
+                """,
+                (IMPORTANCE_BOOST, match, limit)
+            ).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "timestamp": row[1],
+                "content": row[2],
+                "importance": row[3],
+                "snippet": row[4],
+                "score": -row[5]
+            }
+            for row in rows
+        ]
+
+    def _search_memories_like(self, query, limit):
+        """Substring search used when SQLite was built without FTS5"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, timestamp, content, importance FROM memories WHERE content LIKE ? ORDER BY importance DESC, timestamp DESC LIMIT ?",
+                (f"%{query}%", limit)
+            ).fetchall()
+
+        return [
+            {
                 "id": row[0],
                 "timestamp": row[1],
-                "content": json.loads(row[2])
-            })
-        
-        conn.close()
-        return conversations 
\ No newline at end of file
+                "content": row[2],
+                "importance": row[3]
+            }
+            for row in rows
+        ]
+
+    @metrics.timed_query("get_messages")
+    def get_messages(self, session_id=None, cursor=None, limit=50):
+        """Retrieve a page of logged messages, newest first
+
+        Pages are keyset-paginated on (ts, id): pass the returned
+        ``next_cursor`` to get the following page. Each page is a single index
+        range scan, however deep into the history it starts.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if cursor is not None:
+            ts, message_id = decode_cursor(cursor)
+            clauses.append("ts <= ? AND (ts < ? OR id < ?)")
+            params.extend((ts, ts, message_id))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, session_id, role, content, ts, record FROM messages {where} "
+                f"ORDER BY ts DESC, id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+        return {"messages": [self._message(row) for row in rows], "next_cursor": next_cursor}
+
+    def iter_messages(self, session_id=None, batch_size=500):
+        """Yield every logged message, oldest first, a batch at a time
+
+        Each batch is read with its own short query, so an export neither
+        loads the whole history into memory nor holds a pooled connection
+        while the client consumes it.
+        """
+        after = (-1, -1)
+        while True:
+            params = [after[0], after[0], after[1]]
+            session_clause = ""
+            if session_id is not None:
+                session_clause = "AND session_id = ?"
+                params.append(session_id)
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT id, session_id, role, content, ts, record FROM messages "
+                    f"WHERE ts >= ? AND (ts > ? OR id > ?) {session_clause} ORDER BY ts, id LIMIT ?",
+                    params + [batch_size]
+                ).fetchall()
+            for row in rows:
+                yield self._message(row)
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][4], rows[-1][0])
+
+    def _message(self, row):
+        role, content = row[2], row[3]
+        if row[5] is not None:
+            record = self.codec.record(row[5])
+            role, content = record.role, record.content
+        return {
+            "id": row[0],
+            "session_id": row[1],
+            "role": role,
+            "content": content,
+            "ts": row[4]
+        }
+
+    def decode_message_row(self, row):
+        """Turn an (id, session_id, role, content, ts, metadata, record) messages row into
+        (id, session_id, role, content, ts, metadata), whichever format it is stored in"""
+        if row[6] is None:
+            return row[:6]
+        record = self.codec.record(row[6])
+        return (row[0], row[1], record.role, record.content, row[4], record.metadata)
+
+    def _load_dictionaries(self):
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT id, codec, data FROM message_dictionaries").fetchall()
+        return {dictionary_id: (codec, data) for dictionary_id, codec, data in rows}
+
+    def train_message_dictionary(self, size_kb=32, samples=DICTIONARY_SAMPLES):
+        """Train a compression dictionary on the newest logged messages
+
+        New records are compressed with it (in other processes too, within
+        models.records.DICTIONARY_REFRESH seconds); records compressed with
+        earlier dictionaries stay readable. Returns the new dictionary's id,
+        or None when the codec takes no dictionary or there was too little to
+        learn from.
+        """
+        if self.codec.codec == RAW:
+            return None
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, session_id, role, content, ts, metadata, record FROM messages ORDER BY id DESC LIMIT ?",
+                (samples,)
+            ).fetchall()
+        bodies = [pack_body(row[3], row[5]) for row in map(self.decode_message_row, rows)]
+        dictionary = train_dictionary(bodies, self.codec.codec, size_kb * 1024)
+        if dictionary is None:
+            return None
+        with self.pool.connection() as conn, conn:
+            dictionary_id = conn.execute(
+                "INSERT INTO message_dictionaries (codec, data, created_at) VALUES (?, ?, ?)",
+                (self.codec.codec, dictionary, epoch_ms())
+            ).lastrowid
+        self.codec.reload()
+        return dictionary_id
+
+    def compact_messages(self, batch_size=500, recompress=False):
+        """Rewrite messages stored before the record format as compact records
+
+        Runs while the app is serving: each batch is its own short write
+        transaction, found by walking the primary key, so readers and the
+        conversation writer are only ever held up for one batch. With
+        ``recompress``, records not compressed with the current dictionary
+        are rewritten too. Returns the number of rows rewritten.
+        """
+        legacy_only = "" if recompress else "AND record IS NULL"
+        rewritten, after = 0, 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT id, session_id, role, content, ts, metadata, record FROM messages "
+                    f"WHERE id > ? {legacy_only} ORDER BY id LIMIT ?",
+                    (after, batch_size)
+                ).fetchall()
+                if not rows:
+                    return rewritten
+                after = rows[-1][0]
+                updates = []
+                for row in rows:
+                    message_id, _, role, content, _, metadata = self.decode_message_row(row)
+                    record = self.codec.encode(role, content, metadata)
+                    if record != row[6]:
+                        updates.append((record, message_id))
+                with conn:
+                    conn.executemany(
+                        "UPDATE messages SET record = ?, role = '', content = '', metadata = NULL WHERE id = ?",
+                        updates
+                    )
+            rewritten += len(updates)
+
+
+# Triggers keeping the external-content FTS index in sync with memories
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+        INSERT INTO memories_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+        INSERT INTO memories_fts(memories_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS memories_fts_update AFTER UPDATE OF content ON memories BEGIN
+        INSERT INTO memories_fts(memories_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO memories_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+
+def _migrate_memories_fts(conn):
+    """Add an FTS5 index over memories kept in sync by triggers"""
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5("
+            "content, content='memories', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search falls back to LIKE
+        print(f"Full-text search unavailable: {str(e)}")
+        return
+
+    for trigger in FTS_TRIGGERS:
+        conn.execute(trigger)
+
+    # Index the rows that existed before the migration
+    conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')")
+
+
+def _conversation_messages(rows):
+    """Expand legacy conversation rows into message rows"""
+    for timestamp, content, metadata in rows:
+        try:
+            messages = json.loads(content)
+            ts = epoch_ms(datetime.datetime.fromisoformat(timestamp))
+            meta = json.loads(metadata) if metadata else {}
+        except (TypeError, ValueError) as e:
+            print(f"Skipping unreadable conversation row: {str(e)}")
+            continue
+        session_id = meta.pop("session_id", None) if isinstance(meta, dict) else None
+        metadata_json = json.dumps(meta) if meta else None
+        for message in messages:
+            if isinstance(message, dict) and message.get("role") and message.get("content") is not None:
+                yield (session_id, message["role"], message["content"], ts, metadata_json)
+
+
+def _migrate_messages(conn):
+    """Replace the JSON-blob conversations log with one row per message
+
+    Timestamps become integer epoch milliseconds and the table is indexed for
+    per-session and global history reads in time order. Existing exchanges are
+    copied over in batches and the old table is dropped.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        session_id TEXT,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        metadata TEXT
+    )
+    ''')
+    # The rowid is the implicit last column of each index, so both serve ORDER BY ts, id
+    conn.execute("CREATE INDEX IF NOT EXISTS messages_session_ts ON messages(session_id, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS messages_ts ON messages(ts)")
+
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations'").fetchone():
+        cursor = conn.execute("SELECT timestamp, content, metadata FROM conversations ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, ts, metadata) VALUES (?, ?, ?, ?, ?)",
+                list(_conversation_messages(rows))
+            )
+        conn.execute("DROP TABLE conversations")
+
+
+def _migrate_memory_indexes(conn):
+    """Index memories for the recency listing and importance-ranked reads"""
+    conn.execute("CREATE INDEX IF NOT EXISTS memories_timestamp ON memories(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS memories_importance_timestamp ON memories(importance, timestamp)")
+
+
+def _migrate_retention(conn):
+    """Track each memory's decaying retention score and how often it was retrieved
+
+    The retention key is filled in by RetentionManager; see models/retention.py.
+    """
+    conn.execute("ALTER TABLE memories ADD COLUMN retention REAL")
+    conn.execute("ALTER TABLE memories ADD COLUMN access_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS memories_retention ON memories(retention)")
+
+
+def _migrate_simhash(conn):
+    """Add SimHash fingerprints split into individually indexed bands for near-duplicate lookups
+
+    Existing rows are fingerprinted by Memory.deduplicate.
+    """
+    conn.execute("ALTER TABLE memories ADD COLUMN simhash INTEGER")
+    for column in BAND_COLUMNS:
+        conn.execute(f"ALTER TABLE memories ADD COLUMN {column} INTEGER")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS memories_{column} ON memories({column})")
+
+
+def _migrate_message_records(conn):
+    """Store logged messages as compact, compressed records
+
+    New messages fill only the record column; rows already logged keep their
+    role and content columns until Memory.compact_messages rewrites them, so
+    the migration itself is instant. See models/records.py for the format.
+    """
+    conn.execute("ALTER TABLE messages ADD COLUMN record BLOB")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS message_dictionaries (
+        id INTEGER PRIMARY KEY,
+        codec INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created_at INTEGER NOT NULL
+    )
+    ''')
+
+
+def _migrate_session_summaries(conn):
+    """Keep one rolling summary per session, apart from the memories
+
+    Summaries used to be stored as memories, where every session's prompt
+    could retrieve them; those rows are moved over, keeping the newest per
+    session.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS session_summaries (
+        session_id TEXT PRIMARY KEY,
+        content TEXT NOT NULL,
+        turns INTEGER NOT NULL DEFAULT 0,
+        updated_at INTEGER NOT NULL
+    )
+    ''')
+    rows = conn.execute(
+        "SELECT id, timestamp, content, metadata FROM memories "
+        "WHERE metadata LIKE '%\"conversation_summary\"%' ORDER BY id"
+    ).fetchall()
+    moved = []
+    for memory_id, timestamp, content, metadata in rows:
+        try:
+            meta = json.loads(metadata)
+            updated_at = epoch_ms(datetime.datetime.fromisoformat(timestamp))
+        except (TypeError, ValueError):
+            continue
+        if meta.get("type") != "conversation_summary" or not meta.get("session_id"):
+            continue
+        conn.execute(
+            "INSERT OR REPLACE INTO session_summaries (session_id, content, turns, updated_at) VALUES (?, ?, ?, ?)",
+            (meta["session_id"], content, meta.get("turns", 0), updated_at)
+        )
+        moved.append((memory_id,))
+    conn.executemany("DELETE FROM memories WHERE id = ?", moved)
+
+
+# Schema migrations, applied in order; PRAGMA user_version records the last one run
+def _migrate_retention_state(conn):
+    """Keep RetentionManager's run bookkeeping (last run, half-life) in the main database"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS retention_state (
+        key TEXT PRIMARY KEY,
+        value REAL
+    )
+    ''')
+
+
+MIGRATIONS = [
+    _migrate_memories_fts,
+    _migrate_messages,
+    _migrate_memory_indexes,
+    _migrate_retention,
+    _migrate_simhash,
+    _migrate_message_records,
+    _migrate_session_summaries,
+    _migrate_retention_state,
+]
@@ -0,0 +1,307 @@
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+from config import Config
+
+# Latency histogram buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace of the request being handled by the current thread or asyncio task
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+request_logger = logging.getLogger("assistant.requests")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing value per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Bucketed distribution of observed values per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                le = ("le", _format_value(bound) if bound == float("inf") else repr(bound))
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}"
+
+
+class RequestTrace:
+    """Timings collected while handling a single request"""
+
+    __slots__ = ("request_id", "route", "method", "started", "stages", "token")
+
+    def __init__(self, request_id, route, method):
+        self.request_id = request_id
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.token = None
+
+
+class _NullTimer:
+    """Timer used while instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    """Context manager timing one stage of the current request"""
+
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Request instrumentation exported in the Prometheus text format
+
+    With ``enabled`` set, request, stage and SQLite query latencies go into
+    histograms and LLM tokens into counters, all rendered by ``render`` for a
+    /metrics endpoint. With ``log_requests`` set, each request is also written
+    as a JSON log line with its request id and stage timings. When both are
+    off, ``stage`` returns a shared no-op timer, ``timed_query`` leaves
+    functions undecorated and ``start_request`` does nothing, so the
+    instrumentation costs nothing. Values are kept per worker process.
+    """
+
+    def __init__(self, enabled=False, log_requests=False, prefix="assistant"):
+        self.enabled = enabled
+        self.log_requests = log_requests
+        self.active = enabled or log_requests
+        self.prefix = prefix
+        self._collectors = []
+
+        self.requests = Counter(f"{prefix}_requests_total", "HTTP requests handled", ("route", "method", "status"))
+        self.request_seconds = Histogram(f"{prefix}_request_seconds", "HTTP request latency", ("route",))
+        self.stage_seconds = Histogram(f"{prefix}_stage_seconds", "Time spent in each request stage", ("stage",))
+        self.query_seconds = Histogram(f"{prefix}_sqlite_query_seconds", "SQLite query latency", ("query",))
+        self.llm_tokens = Counter(f"{prefix}_llm_tokens_total", "LLM tokens sent and received", ("direction",))
+        self.errors = Counter(f"{prefix}_errors_total", "Errors logged by the application", ("where",))
+        self._metrics = [
+            self.requests, self.request_seconds, self.stage_seconds,
+            self.query_seconds, self.llm_tokens, self.errors,
+        ]
+
+        if log_requests and not request_logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            request_logger.addHandler(handler)
+            request_logger.setLevel(logging.INFO)
+            request_logger.propagate = False
+
+    def start_request(self, route, method, request_id=None):
+        """Begin tracing a request; returns the trace, or None when disabled"""
+        if not self.active:
+            return None
+        trace = RequestTrace(request_id or uuid.uuid4().hex, route, method)
+        trace.token = _current_trace.set(trace)
+        return trace
+
+    def finish_request(self, trace, status, **fields):
+        """Record a finished request and write its log line"""
+        if trace is None:
+            return
+        elapsed = time.perf_counter() - trace.started
+        if self.enabled:
+            self.requests.inc(trace.route, trace.method, str(status))
+            self.request_seconds.observe(elapsed, trace.route)
+        if self.log_requests:
+            self.log("request", trace, status=status, duration_ms=round(elapsed * 1000, 2),
+                     stages={name: round(seconds * 1000, 2) for name, seconds in trace.stages.items()},
+                     **fields)
+        if trace.token is not None:
+            try:
+                _current_trace.reset(trace.token)
+            except ValueError:
+                # Finished from a different context (e.g. at the end of a stream)
+                pass
+            trace.token = None
+
+    def current_trace(self):
+        """Return the trace of the request being handled, if any"""
+        return _current_trace.get() if self.active else None
+
+    def stage(self, name):
+        """Context manager timing a stage of the current request"""
+        if not self.active:
+            return NULL_TIMER
+        return _StageTimer(self, name)
+
+    def record_stage(self, name, seconds):
+        if self.enabled:
+            self.stage_seconds.observe(seconds, name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+
+    def timed_query(self, name):
+        """Decorator timing a database call; a no-op when metrics are disabled"""
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.query_seconds.observe(time.perf_counter() - started, name)
+            return wrapper
+        return decorate
+
+    def count_tokens(self, prompt=0, completion=0):
+        """Count LLM tokens sent and received"""
+        if not self.enabled:
+            return
+        if prompt:
+            self.llm_tokens.inc("prompt", amount=prompt)
+        if completion:
+            self.llm_tokens.inc("completion", amount=completion)
+
+    def log(self, event, trace=None, **fields):
+        """Write a structured JSON log line"""
+        trace = trace or _current_trace.get()
+        record = {"ts": round(time.time(), 3), "event": event, "pid": os.getpid()}
+        if trace is not None:
+            record.update(request_id=trace.request_id, route=trace.route, method=trace.method)
+        record.update(fields)
+        request_logger.info(json.dumps(record, default=str))
+
+    def notice(self, message, **fields):
+        """Report a status message as a JSON log line when request logging is on, else print it"""
+        if self.log_requests:
+            self.log("notice", message=message, **fields)
+        else:
+            print(message)
+
+    def log_error(self, message, error, where="app"):
+        """Report an error as a JSON log line when request logging is on, else print it"""
+        if self.enabled:
+            self.errors.inc(where)
+        if self.log_requests:
+            self.log("error", message=message, error=str(error), error_type=type(error).__name__)
+        else:
+            print(f"{message}: {str(error)}")
+
+    def add_collector(self, collect):
+        """Register a callable returning ``(name, kind, help, value)`` tuples at scrape time
+
+        Collectors expose counters that components already keep (cache hits,
+        retries, queue sizes) without touching their hot paths.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, help, value in samples:
+                if value is None:
+                    continue
+                name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide instrumentation shared by the app and the models
+metrics = Metrics(enabled=Config.METRICS_ENABLED, log_requests=Config.REQUEST_LOG_ENABLED)
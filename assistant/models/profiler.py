@@ -0,0 +1,210 @@
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from models.metrics import metrics
+
+# Request ids that can go into a profile's file name as they are; others are replaced
+SAFE_REQUEST_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Frames from files under this directory are labelled relative to it (app.py, models/...)
+APP_DIR = str(Path(__file__).parent.parent)
+
+
+def frame_label(code, _cache={}):
+    """Label a code object as ``path:function`` for collapsed stacks"""
+    label = _cache.get(code)
+    if label is None:
+        filename = code.co_filename
+        if filename.startswith(APP_DIR):
+            filename = filename[len(APP_DIR):].lstrip(os.sep)
+        else:
+            # Shorten library paths to what follows the longest matching sys.path entry
+            for prefix in sorted((p for p in sys.path if p), key=len, reverse=True):
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix):].lstrip(os.sep)
+                    break
+        label = _cache[code] = f"{filename}:{code.co_name}"
+    return label
+
+
+class StackSampler:
+    """Low-overhead statistical profiler for a single thread
+
+    A background thread wakes every ``interval`` seconds, looks up the target
+    thread's current frame with ``sys._current_frames`` and counts the stack.
+    The profiled thread runs unmodified, so the overhead is the sampler's own
+    work, a few microseconds per sample. ``stop`` returns the counts keyed by
+    collapsed stack (root first, frames separated by ``;``), the input format
+    of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self, thread_id=None):
+        """Start sampling the given thread (the calling thread by default)"""
+        self._target = thread_id or threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self._counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        """Stop sampling and return ``{collapsed stack: samples}``"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return dict(self._counts)
+
+
+# Profiler backends by name. A backend is a callable taking the sampling
+# interval and returning an object with ``start()`` and ``stop()``, where
+# ``stop`` returns collapsed stack counts; other samplers can be registered
+# with register_backend.
+BACKENDS = {"sampler": StackSampler}
+
+
+def register_backend(name, factory):
+    """Make a profiler backend available under a name"""
+    BACKENDS[name] = factory
+
+
+def format_collapsed(counts):
+    """Render stack counts in the collapsed (folded) stack format"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+class _Session:
+    """A request being profiled"""
+
+    __slots__ = ("profile_id", "sampler", "started", "mode")
+
+    def __init__(self, profile_id, sampler, mode):
+        self.profile_id = profile_id
+        self.sampler = sampler
+        self.started = time.time()
+        self.mode = mode
+
+
+class RequestProfiler:
+    """Decides which requests to profile and stores their collapsed stacks
+
+    A request is profiled on demand when it carries ``token`` (compared in
+    constant time), or, in the global mode, when it is the ``sample_every``-th
+    request of this worker and fewer than ``max_per_minute`` requests have been
+    sampled in the last minute. Profiles are written to ``directory`` as
+    ``<profile id>.collapsed`` files, keeping the newest ``keep`` files.
+    """
+
+    def __init__(self, directory, token="", sample_every=0, max_per_minute=6,
+                 interval=0.005, keep=100, backend="sampler"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown profiler backend: {backend}")
+        self.directory = Path(directory)
+        self.token = token
+        self.sample_every = sample_every
+        self.max_per_minute = max_per_minute
+        self.interval = interval
+        self.keep = keep
+        self.backend = backend
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._sampled_at = []  # Start times of recent globally sampled requests
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_every > 0
+
+    def authorized(self, supplied):
+        """Whether a supplied token grants access to profiling"""
+        return bool(self.token) and bool(supplied) and hmac.compare_digest(str(supplied), self.token)
+
+    def _should_sample(self):
+        """Global mode: pick 1 in N requests, within the per-minute rate limit"""
+        if self.sample_every <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._requests += 1
+            if self._requests % self.sample_every:
+                return False
+            self._sampled_at = [started for started in self._sampled_at if now - started < 60]
+            if len(self._sampled_at) >= self.max_per_minute:
+                return False
+            self._sampled_at.append(now)
+            return True
+
+    def start(self, request_id=None, token=None):
+        """Start profiling the current request if requested or sampled; returns a session or None"""
+        if self.authorized(token):
+            mode = "on-demand"
+        elif self._should_sample():
+            mode = "sampled"
+        else:
+            return None
+        sampler = BACKENDS[self.backend](self.interval)
+        sampler.start()
+        # The request id may come from the client's X-Request-ID, so only a safe one names the file
+        if not request_id or not SAFE_REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{mode}-{request_id}"
+        return _Session(profile_id, sampler, mode)
+
+    def finish(self, session):
+        """Stop profiling a request and store its profile; returns the profile id"""
+        counts = session.sampler.stop()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{session.profile_id}.collapsed"
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(format_collapsed(counts))
+            os.replace(tmp_path, path)
+            self._rotate()
+        except OSError as e:
+            metrics.log_error("Error storing profile", e, where="profiler")
+            return None
+        return session.profile_id
+
+    def _rotate(self):
+        """Delete the oldest profiles beyond ``keep``"""
+        profiles = sorted(self.directory.glob("*.collapsed"), key=lambda path: path.stat().st_mtime)
+        for path in profiles[:max(len(profiles) - self.keep, 0)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def list_profiles(self):
+        """Return the stored profile ids, newest first"""
+        if not self.directory.exists():
+            return []
+        profiles = sorted(self.directory.glob("*.collapsed"), key=lambda path: path.stat().st_mtime, reverse=True)
+        return [path.stem for path in profiles]
+
+    def read_profile(self, profile_id):
+        """Return a stored profile's collapsed stacks, or None"""
+        path = self.directory / f"{profile_id}.collapsed"
+        # Profile ids are file names; refuse anything that would leave the directory
+        if path.parent != self.directory or not path.exists():
+            return None
+        return path.read_text()
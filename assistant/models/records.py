@@ -0,0 +1,277 @@
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+
+from models.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Record layout, version 1 (all integers little-endian):
+#
+#   header   u8 format version, u8 codec, u16 dictionary id, u8 role code
+#   [role]   u8 length + UTF-8 name, only when the role code is 0
+#   body     compressed (or, with codec RAW, plain) bytes of:
+#              u32 content length, UTF-8 content, UTF-8 metadata JSON (rest, may be empty)
+#
+# The role sits outside the compressed body, so listing who said what never
+# decompresses anything. Records whose body wouldn't shrink are stored RAW.
+FORMAT_VERSION = 1
+RAW, ZLIB, ZSTD = 0, 1, 2
+CODECS = {"none": RAW, "zlib": ZLIB, "zstd": ZSTD}
+ROLES = ("user", "assistant", "system", "tool")  # Role codes 1, 2, ...
+
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 9
+
+# zlib can only look back 32 KB, so a larger dictionary is wasted on it
+MAX_ZLIB_DICTIONARY = 32 * 1024
+
+# Seconds between checks for a dictionary trained by another process
+DICTIONARY_REFRESH = 300
+
+_HEADER = struct.Struct("<BBHB")
+_LENGTH = struct.Struct("<I")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES, start=1)}
+
+# A word with the whitespace or punctuation before it; dictionary phrases are runs of these
+_TOKEN = re.compile(rb"\W*\w+", re.S)
+MAX_PHRASE_TOKENS = 6
+
+
+def resolve_codec(name):
+    """Codec id for a MESSAGE_COMPRESSION setting; "auto" picks zstd when it is installed"""
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = "zstd" if zstandard is not None else "zlib"
+    if name not in CODECS:
+        raise ValueError(f"Unknown message compression: {name}")
+    if name == "zstd" and zstandard is None:
+        metrics.notice("zstandard is not installed; compressing messages with zlib")
+        return ZLIB
+    return CODECS[name]
+
+
+def pack_body(content, metadata=None):
+    """Uncompressed record body of a message's content and metadata JSON"""
+    content = content.encode("utf-8")
+    return _LENGTH.pack(len(content)) + content + (metadata or "").encode("utf-8")
+
+
+def train_dictionary(samples, codec, size=MAX_ZLIB_DICTIONARY):
+    """Build a compression dictionary from sample record bodies
+
+    zstd dictionaries come from zstandard's trainer. zlib has no trainer, but
+    any bytes can serve as its preset dictionary: it is filled with the
+    phrases found in the most samples, weighted by the bytes they would save,
+    with the most valuable last (closest to the data, so cheapest to refer to).
+    Returns None when there is too little to learn from.
+    """
+    samples = [sample for sample in samples if sample]
+    if codec == ZSTD:
+        try:
+            return zstandard.train_dictionary(size, samples, level=ZSTD_LEVEL).as_bytes()
+        except zstandard.ZstdError as e:
+            metrics.log_error("Error training compression dictionary", e, where="records")
+            return None
+    if codec != ZLIB:
+        return None
+
+    counts = Counter()
+    for sample in samples:
+        tokens = _TOKEN.findall(sample)
+        phrases = set()
+        for start in range(len(tokens)):
+            for end in range(start + 1, min(start + MAX_PHRASE_TOKENS, len(tokens)) + 1):
+                phrases.add(b"".join(tokens[start:end]))
+        counts.update(phrases)
+
+    # A phrase seen in one sample only is already covered by that record's own history
+    scored = sorted(
+        ((count * (len(phrase) - 3), phrase) for phrase, count in counts.items() if count > 1 and len(phrase) > 3),
+        reverse=True,
+    )
+    chosen, used = [], 0
+    size = min(size, MAX_ZLIB_DICTIONARY)
+    for _, phrase in scored:
+        if used + len(phrase) > size:
+            continue
+        if any(phrase in kept for kept in chosen[-64:]):
+            continue
+        chosen.append(phrase)
+        used += len(phrase)
+        if used >= size - 3:
+            break
+    return b"".join(reversed(chosen)) or None
+
+
+class MessageRecord:
+    """Lazily decoded view of a stored record
+
+    Nothing is decoded up front: ``role`` reads the header, and ``content``
+    and ``metadata`` decompress the body once and decode only their own slice
+    of it. RAW bodies are sliced straight out of the stored bytes.
+    """
+
+    __slots__ = ("_codec", "_data", "_header", "_body_offset", "_body")
+
+    def __init__(self, codec, data):
+        self._codec = codec
+        self._data = data
+        self._header = _HEADER.unpack_from(data)
+        if self._header[0] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported message record version: {self._header[0]}")
+        self._body_offset = _HEADER.size if self._header[3] else _HEADER.size + 1 + data[_HEADER.size]
+        self._body = None
+
+    @property
+    def role(self):
+        code = self._header[3]
+        if code:
+            return ROLES[code - 1]
+        return str(memoryview(self._data)[_HEADER.size + 1:self._body_offset], "utf-8")
+
+    @property
+    def body(self):
+        """The uncompressed body (a memoryview of the stored bytes when RAW)"""
+        if self._body is None:
+            _, codec, dictionary_id, _ = self._header
+            stored = memoryview(self._data)[self._body_offset:]
+            self._body = stored if codec == RAW else self._codec.decompressor(codec, dictionary_id)(stored)
+        return self._body
+
+    @property
+    def content(self):
+        body = self.body
+        length = _LENGTH.unpack_from(body)[0]
+        return str(body[_LENGTH.size:_LENGTH.size + length], "utf-8")
+
+    @property
+    def metadata(self):
+        """The message's metadata JSON text, or None"""
+        body = self.body
+        metadata = body[_LENGTH.size + _LENGTH.unpack_from(body)[0]:]
+        return str(metadata, "utf-8") if len(metadata) else None
+
+    @property
+    def dictionary_id(self):
+        return self._header[2]
+
+
+class MessageCodec:
+    """Encodes messages as compact records and opens stored ones
+
+    Dictionaries are numbered and kept by the database (``loader`` returns
+    ``{id: (codec, bytes)}``); every record names the dictionary it was
+    compressed with, so retraining never makes old records unreadable. New
+    records use the newest dictionary trained for the configured codec.
+    Compressor state is kept per thread, since zstandard's objects must not
+    be shared between threads.
+    """
+
+    def __init__(self, codec=ZLIB, loader=None, level=None):
+        self.codec = codec
+        self.level = level if level is not None else (ZSTD_LEVEL if codec == ZSTD else ZLIB_LEVEL)
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dictionaries = None
+        self._loaded_at = 0.0
+        self.current = 0
+
+    def reload(self):
+        """Re-read the dictionaries and pick the newest one for this codec"""
+        dictionaries = self.loader() if self.loader is not None else {}
+        with self._lock:
+            self._dictionaries = dictionaries
+            self._loaded_at = time.monotonic()
+            matching = [dictionary_id for dictionary_id, (codec, _) in dictionaries.items() if codec == self.codec]
+            self.current = max(matching, default=0)
+            # Compressor state built for the old dictionaries is rebuilt on next use
+            self._local = threading.local()
+
+    def _dictionary(self, dictionary_id):
+        if self._dictionaries is None or dictionary_id not in self._dictionaries:
+            self.reload()
+        if dictionary_id not in self._dictionaries:
+            raise ValueError(f"Unknown compression dictionary: {dictionary_id}")
+        return self._dictionaries[dictionary_id][1]
+
+    def encode(self, role, content, metadata=None):
+        """Pack a message into a record"""
+        if self._dictionaries is None or time.monotonic() - self._loaded_at > DICTIONARY_REFRESH:
+            self.reload()
+        code = _ROLE_CODES.get(role, 0)
+        name = b""
+        if not code:
+            name = role.encode("utf-8")
+            if len(name) > 255:
+                raise ValueError("Message role is too long")
+            name = bytes([len(name)]) + name
+
+        body = pack_body(content, metadata)
+        codec, dictionary_id = RAW, 0
+        if self.codec != RAW:
+            current = self.current
+            compressed = self.compressor(self.codec, current)(body)
+            if len(compressed) < len(body):
+                codec, dictionary_id, body = self.codec, current, compressed
+        return _HEADER.pack(FORMAT_VERSION, codec, dictionary_id, code) + name + body
+
+    def record(self, data):
+        """Lazy view of a stored record"""
+        return MessageRecord(self, data)
+
+    def compressor(self, codec, dictionary_id):
+        """Function compressing a body with a codec and dictionary"""
+        return self._function("compress", codec, dictionary_id)
+
+    def decompressor(self, codec, dictionary_id):
+        """Function decompressing a body stored with a codec and dictionary"""
+        return self._function("decompress", codec, dictionary_id)
+
+    def _function(self, direction, codec, dictionary_id):
+        # Built once per thread and looked up by every record after that
+        functions = self._local.__dict__
+        key = (direction, codec, dictionary_id)
+        function = functions.get(key)
+        if function is None:
+            zdict = self._dictionary(dictionary_id) if dictionary_id else None
+            if codec == ZSTD:
+                function = self._zstd(direction, zdict)
+            elif codec == ZLIB:
+                function = self._zlib(direction, zdict)
+            else:
+                raise ValueError(f"Unknown message record codec: {codec}")
+            functions[key] = function
+        return function
+
+    def _zstd(self, direction, zdict):
+        dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+        if direction == "decompress":
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress
+        # The dictionary id is in the record header, so the frame needn't repeat it
+        return zstandard.ZstdCompressor(level=self.level, dict_data=dict_data, write_checksum=False,
+                                        write_dict_id=False).compress
+
+    def _zlib(self, direction, zdict):
+        # Raw deflate: no zlib header or checksum, as the record is checked by SQLite
+        options = {"zdict": zdict} if zdict else {}
+        if direction == "decompress":
+            def inflate(data):
+                decompressor = zlib.decompressobj(-15, **options)
+                return decompressor.decompress(data) + decompressor.flush()
+            return inflate
+
+        # Priming a compressor with a dictionary is slow, so one primed copy is cloned per record
+        primed = zlib.compressobj(self.level, zlib.DEFLATED, -15, **options)
+
+        def deflate(body):
+            compressor = primed.copy()
+            return compressor.compress(body) + compressor.flush()
+        return deflate
@@ -0,0 +1,451 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call could not complete within its deadline"""
+
+
+def status_code(exc):
+    """Return the HTTP status of an API error from the groq SDK or httpx, if any"""
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        response = getattr(exc, "response", None)
+        code = getattr(response, "status_code", None)
+    return code
+
+
+def retry_after(exc):
+    """Return the Retry-After delay in seconds an API error asked for, if any"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc):
+    """Whether a failed call may succeed if tried again"""
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUSES
+    # No status: timeouts and connection errors from groq or httpx
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def is_upstream_failure(exc):
+    """Whether a failed call counts against the upstream's health
+
+    Timeouts, connection errors and 429/5xx do. Errors caused by the request
+    itself (400, 401, 422, ...) don't, so malformed input from one client
+    can't open the breaker for everyone.
+    """
+    if isinstance(exc, DeadlineExceeded):
+        return True
+    code = status_code(exc)
+    if code is not None and code >= 500:
+        return True
+    return is_retryable(exc)
+
+
+class CircuitBreaker:
+    """Fail fast while the upstream is unhealthy
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls are rejected for ``reset_timeout`` seconds. Then a single trial call
+    is let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        """State with the open timeout applied (caller holds the lock)"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self):
+        """Whether a call may go ahead right now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected_count += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_ignored(self):
+        """End a call that says nothing about the upstream's health, letting another trial through"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                self.opened_count += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "opened": self.opened_count,
+                "rejected": self.rejected_count,
+            }
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies used to pick the hedge delay"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=20):
+        """Return the given latency percentile, or None with too few samples"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class CallReport:
+    """What a single policy-governed call went through"""
+
+    __slots__ = ("attempts", "retries", "hedged", "hedge_won", "errors", "breaker_state", "elapsed")
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.hedged = False
+        self.hedge_won = False
+        self.errors = []
+        self.breaker_state = CircuitBreaker.CLOSED
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_won": self.hedge_won,
+            "errors": list(self.errors),
+            "breaker_state": self.breaker_state,
+            "elapsed": round(self.elapsed, 4),
+        }
+
+
+class CallPolicy:
+    """Deadlines, retries with jittered backoff, hedging and circuit breaking
+
+    ``call`` runs ``fn(timeout)`` where ``timeout`` is the time left before
+    the deadline, capped at ``attempt_timeout`` so that a hung attempt still
+    leaves time for a retry. Retryable failures (429/5xx, timeouts, connection errors) are
+    retried with full-jitter exponential backoff while time remains; only
+    upstream failures count towards opening the breaker. When
+    hedging is enabled and enough latency samples exist, a second identical
+    request is started if the first hasn't finished after the recent p95
+    latency, and whichever finishes first wins.
+    """
+
+    def __init__(self, timeout=30.0, attempt_timeout=None, max_retries=2, backoff_base=0.25, backoff_max=4.0,
+                 hedge=False, hedge_percentile=95, hedge_min_delay=0.25, breaker=None):
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.last_report = None
+
+    def _backoff(self, attempt, exc):
+        """Delay before the next attempt: Retry-After if given, else full jitter"""
+        requested = retry_after(exc)
+        if requested is not None:
+            return min(requested, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record_error(self, exc):
+        """Tell the breaker about a failed attempt, if it was the upstream's fault"""
+        if is_upstream_failure(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+
+    def _hedge_delay(self):
+        """How long to wait before sending a hedged request, or None to not hedge"""
+        if not self.hedge:
+            return None
+        p = self.latency.percentile(self.hedge_percentile)
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    def _finish(self, report, started, error=None):
+        """Record the outcome of a call"""
+        report.elapsed = time.monotonic() - started
+        report.breaker_state = self.breaker.state
+        with self._lock:
+            self.calls += 1
+            self.retries += report.retries
+            if report.hedged:
+                self.hedges += 1
+            if report.hedge_won:
+                self.hedge_wins += 1
+            if error is not None:
+                self.failures += 1
+            self.last_report = report.as_dict()
+
+    def call(self, fn, hedge=True):
+        """Run ``fn(timeout)`` under the policy; returns ``(result, report)``"""
+        report = CallReport()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        try:
+            result = self._call(fn, deadline, report, hedge)
+        except Exception as e:
+            self._finish(report, started, e)
+            e.report = report
+            raise
+        self._finish(report, started)
+        return result, report
+
+    def _call(self, fn, deadline, report, hedge):
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                report.errors.append("circuit_open")
+                raise CircuitOpenError("Upstream circuit breaker is open")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Call deadline exceeded")
+            if self.attempt_timeout:
+                remaining = min(remaining, self.attempt_timeout)
+
+            report.attempts += 1
+            attempt_started = time.monotonic()
+            try:
+                if hedge:
+                    result = self._attempt_hedged(fn, remaining, report)
+                else:
+                    result = fn(remaining)
+            except Exception as e:
+                self._record_error(e)
+                report.errors.append(status_code(e) or type(e).__name__)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                report.retries += 1
+                continue
+            except BaseException:
+                # Interrupted (e.g. cancelled) without an outcome: don't leave a half-open trial claimed
+                self.breaker.record_ignored()
+                raise
+
+            self.latency.record(time.monotonic() - attempt_started)
+            self.breaker.record_success()
+            return result
+
+    def _attempt_hedged(self, fn, remaining, report):
+        """One attempt, duplicated after the hedge delay if it is still running"""
+        delay = self._hedge_delay()
+        if delay is None or delay >= remaining:
+            return fn(remaining)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+        deadline = time.monotonic() + remaining
+        primary = self._executor.submit(fn, remaining)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        report.hedged = True
+        secondary = self._executor.submit(fn, deadline - time.monotonic())
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("Call deadline exceeded")
+            for future in done:
+                if future.exception() is None:
+                    report.hedge_won = future is secondary
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def call_async(self, fn, hedge=True):
+        """Async version of ``call`` for coroutine functions ``fn(timeout)``"""
+        report = CallReport()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        try:
+            result = await self._call_async(fn, deadline, report, hedge)
+        except Exception as e:
+            self._finish(report, started, e)
+            e.report = report
+            raise
+        self._finish(report, started)
+        return result, report
+
+    async def _call_async(self, fn, deadline, report, hedge):
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                report.errors.append("circuit_open")
+                raise CircuitOpenError("Upstream circuit breaker is open")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Call deadline exceeded")
+            if self.attempt_timeout:
+                remaining = min(remaining, self.attempt_timeout)
+
+            report.attempts += 1
+            attempt_started = time.monotonic()
+            try:
+                if hedge:
+                    result = await self._attempt_hedged_async(fn, remaining, report)
+                else:
+                    result = await asyncio.wait_for(fn(remaining), remaining)
+            except Exception as e:
+                # The attempt timeout is retried like any other; only the overall deadline is final
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                self._record_error(e)
+                report.errors.append("timeout" if timed_out else status_code(e) or type(e).__name__)
+                delay = self._backoff(attempt, e)
+                if attempt >= self.max_retries or not is_retryable(e) or time.monotonic() + delay >= deadline:
+                    if timed_out and time.monotonic() >= deadline:
+                        raise DeadlineExceeded("Call deadline exceeded") from e
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                report.retries += 1
+                continue
+            except BaseException:
+                # Interrupted (e.g. cancelled) without an outcome: don't leave a half-open trial claimed
+                self.breaker.record_ignored()
+                raise
+
+            self.latency.record(time.monotonic() - attempt_started)
+            self.breaker.record_success()
+            return result
+
+    async def _attempt_hedged_async(self, fn, remaining, report):
+        """One attempt, duplicated after the hedge delay; the loser is cancelled"""
+        delay = self._hedge_delay()
+        if delay is None or delay >= remaining:
+            return await asyncio.wait_for(fn(remaining), remaining)
+
+        deadline = time.monotonic() + remaining
+        primary = asyncio.ensure_future(fn(remaining))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        report.hedged = True
+        secondary = asyncio.ensure_future(fn(deadline - time.monotonic()))
+        pending = {primary, secondary}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        report.hedge_won = task is secondary
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        """Return call, retry and hedging counters plus the breaker state"""
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "failures": self.failures,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "last_call": self.last_report,
+            }
+        p95 = self.latency.percentile(95)
+        stats["latency_p95"] = None if p95 is None else round(p95, 4)
+        stats["breaker"] = self.breaker.stats()
+        return stats
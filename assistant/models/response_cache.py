@@ -0,0 +1,213 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from models.db import ConnectionPool
+from models.metrics import metrics
+
+# Expired rows are purged from the persistent tier once every this many writes
+PRUNE_EVERY = 100
+
+# Splits cached text into word-sized chunks when replaying it as a stream
+REPLAY_CHUNK_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def cache_key(model, messages, temperature, max_tokens):
+    """Hash a completion request, ignoring insignificant whitespace differences"""
+    normalized = [[message["role"], " ".join(message["content"].split())] for message in messages]
+    payload = json.dumps([model, normalized, round(float(temperature), 3), max_tokens],
+                         separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def replay_chunks(text):
+    """Split a cached response into chunks resembling streamed deltas"""
+    return REPLAY_CHUNK_PATTERN.findall(text)
+
+
+class _Flight:
+    """An in-flight computation that concurrent callers can wait on"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache:
+    """LRU + TTL cache of completion texts with single-flight request coalescing
+
+    Entries live in an in-process LRU dict. When ``db_path`` is given, they are
+    also written to a SQLite table shared by all workers, which is consulted on
+    an in-process miss. Concurrent callers asking for the same key while it is
+    being computed wait for the first caller's result instead of issuing their
+    own API call.
+    """
+
+    def __init__(self, max_entries=1024, ttl=600, db_path=None):
+        """Create the cache; ``db_path`` enables the persistent tier"""
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.pool = None
+        if db_path:
+            self.pool = ConnectionPool(db_path, size=4)
+            with self.pool.connection() as conn, conn:
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT,
+                    expires_at REAL
+                )
+                ''')
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self.store_errors = 0
+
+    def get(self, key, bypass=False):
+        """Return the cached text for a key, or None (always None when bypassing)"""
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        text = self._get_persistent(key, now)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.persistent_hits += 1
+            self._store_local(key, text, now)
+        return text
+
+    def set(self, key, text):
+        """Cache the text for a key
+
+        A failed write to the persistent tier is logged rather than raised:
+        the caller already has its answer, and the text is still cached in
+        this process.
+        """
+        now = time.time()
+        with self._lock:
+            self._store_local(key, text, now)
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+
+        if self.pool is None:
+            return
+        try:
+            with self.pool.connection() as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, text, now + self.ttl)
+                )
+                if prune:
+                    conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        except Exception as e:
+            with self._lock:
+                self.store_errors += 1
+            metrics.log_error("Error storing cached response", e, where="cache")
+
+    def get_or_compute(self, key, compute, bypass=False):
+        """Return the cached text for a key, computing it at most once at a time
+
+        Returns ``(text, cached)``. Exceptions raised by ``compute`` are passed
+        to every caller waiting on the same key, and nothing is cached; a
+        failure to cache a computed text never fails the callers (see set).
+        """
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+            return compute(), False
+
+        text = self.get(key)
+        if text is not None:
+            return text, True
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = compute()
+            self.set(key, flight.result)
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def stats(self):
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self.pool is not None,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "bypassed": self.bypassed,
+                "store_errors": self.store_errors,
+                "in_flight": len(self._inflight),
+            }
+
+    def _store_local(self, key, text, now):
+        """Insert into the LRU dict, evicting the oldest entries (caller holds the lock)"""
+        self._entries[key] = (now + self.ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_persistent(self, key, now):
+        """Look a key up in the SQLite tier"""
+        if self.pool is None:
+            return None
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT response FROM response_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+        return row[0] if row else None
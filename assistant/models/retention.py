@@ -0,0 +1,552 @@
+import atexit
+import datetime
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+from models.db import ConnectionPool, connect, enable_incremental_vacuum, incremental_vacuum_enabled
+from models.metrics import metrics
+
+SECONDS_PER_DAY = 86400
+
+# Floor of a decayed score, so the log-domain key of importance 0 stays finite
+MIN_SCORE = 1e-3
+
+# Rows moved per transaction, and batches per maintenance step
+BATCH_SIZE = 500
+MAX_BATCHES = 200
+
+COMPRESSION_LEVEL = 6
+
+
+def retention_key(score, at, half_life):
+    """Log-domain retention key of ``score`` at epoch second ``at``
+
+    A score halving every ``half_life`` seconds is worth
+    ``2 ** (key - now / half_life)`` at time ``now``. The key itself never
+    changes as time passes, so decay needs no periodic rewrite of every row,
+    and "decayed score below T" is the indexable range
+    ``key < log2(T) + now / half_life``.
+    """
+    return math.log2(max(score, MIN_SCORE)) + at / half_life
+
+
+def decayed_score(key, now, half_life):
+    """Score represented by a retention key at epoch second ``now``"""
+    return 2 ** (key - now / half_life)
+
+
+def iso_to_epoch(timestamp):
+    """Epoch seconds of a stored ISO timestamp (local time), or None"""
+    try:
+        return datetime.datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _compress(record):
+    return zlib.compress(json.dumps(record).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _decompress(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class ColdArchive:
+    """Compressed SQLite archive of memories and messages moved out of the main database
+
+    Each archived row keeps its id and the columns needed to find it, with
+    the rest stored as one zlib-compressed JSON blob.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path):
+        """Open the archive database, creating its tables only if ``migrate`` hasn't yet
+
+        Like Memory, an archive that is already current costs one read, so the
+        request that first needs it does no DDL.
+        """
+        self.path = path
+        self.pool = ConnectionPool(path, size=2)
+        with self.pool.connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < self.SCHEMA_VERSION:
+            self.migrate()
+
+    def migrate(self, vacuum=False):
+        """Create the archive's tables
+
+        A new archive is set up for incremental vacuum. An existing one is
+        only converted with ``vacuum``, which rewrites the whole file (see
+        ``migrate-db --vacuum``).
+        """
+        with self.pool.connection() as conn:
+            enable_incremental_vacuum(conn, rebuild=vacuum)
+            with conn:
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS archived_memories (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT,
+                    importance INTEGER,
+                    archived_at INTEGER,
+                    data BLOB
+                )
+                ''')
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS archived_messages (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT,
+                    ts INTEGER,
+                    archived_at INTEGER,
+                    data BLOB
+                )
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS archived_messages_session_ts ON archived_messages(session_id, ts)")
+                conn.execute("CREATE INDEX IF NOT EXISTS archived_messages_ts ON archived_messages(ts)")
+                conn.execute("CREATE INDEX IF NOT EXISTS archived_memories_archived_at ON archived_memories(archived_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS archived_messages_archived_at ON archived_messages(archived_at)")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def close(self):
+        self.pool.close()
+
+    def add_memories(self, rows):
+        """Archive (id, timestamp, content, importance, metadata) rows"""
+        now = int(time.time())
+        with self.pool.connection() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO archived_memories (id, timestamp, importance, archived_at, data) VALUES (?, ?, ?, ?, ?)",
+                [(row[0], row[1], row[3], now, _compress({"content": row[2], "metadata": row[4]})) for row in rows]
+            )
+
+    def add_messages(self, rows):
+        """Archive (id, session_id, role, content, ts, metadata) rows"""
+        now = int(time.time())
+        with self.pool.connection() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO archived_messages (id, session_id, ts, archived_at, data) VALUES (?, ?, ?, ?, ?)",
+                [(row[0], row[1], row[4], now, _compress({"role": row[2], "content": row[3], "metadata": row[5]}))
+                 for row in rows]
+            )
+
+    def get_memories(self, memory_ids):
+        """Fetch archived memories by id"""
+        if not memory_ids:
+            return []
+        placeholders = ", ".join("?" for _ in memory_ids)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, timestamp, importance, data FROM archived_memories WHERE id IN ({placeholders})",
+                list(memory_ids)
+            ).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "timestamp": row[1],
+                "content": _decompress(row[3])["content"],
+                "importance": row[2],
+                "archived": True
+            }
+            for row in rows
+        ]
+
+    def iter_messages(self, session_id=None, batch_size=500):
+        """Yield archived messages oldest first, like Memory.iter_messages"""
+        after = (-1, -1)
+        while True:
+            params = [after[0], after[0], after[1]]
+            session_clause = ""
+            if session_id is not None:
+                session_clause = "AND session_id = ?"
+                params.append(session_id)
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT id, session_id, ts, data FROM archived_messages "
+                    f"WHERE ts >= ? AND (ts > ? OR id > ?) {session_clause} ORDER BY ts, id LIMIT ?",
+                    params + [batch_size]
+                ).fetchall()
+            for row in rows:
+                data = _decompress(row[3])
+                yield {
+                    "id": row[0],
+                    "session_id": row[1],
+                    "role": data["role"],
+                    "content": data["content"],
+                    "ts": row[2],
+                    "archived": True
+                }
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][2], rows[-1][0])
+
+    def prune(self, before):
+        """Delete rows archived before an epoch second; returns the number deleted"""
+        with self.pool.connection() as conn, conn:
+            deleted = conn.execute("DELETE FROM archived_memories WHERE archived_at < ?", (before,)).rowcount
+            deleted += conn.execute("DELETE FROM archived_messages WHERE archived_at < ?", (before,)).rowcount
+        return deleted
+
+    def vacuum(self, pages):
+        """Release up to ``pages`` free pages back to the file system"""
+        with self.pool.connection() as conn:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+
+    def stats(self):
+        with self.pool.connection() as conn:
+            memories = conn.execute("SELECT COUNT(*) FROM archived_memories").fetchone()[0]
+            messages = conn.execute("SELECT COUNT(*) FROM archived_messages").fetchone()[0]
+        return {
+            "path": self.path,
+            "memories": memories,
+            "messages": messages,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+class RetentionManager:
+    """Importance decay, access bumps and tiering that bound the main database's size
+
+    Every memory carries a retention key (see ``retention_key``): its
+    importance decays with a half-life of ``half_life_days`` and is raised by
+    ``access_bump`` each time it is retrieved. Retrievals are counted in
+    memory and applied in one transaction every ``flush_interval`` seconds.
+
+    Every ``interval`` seconds one worker (whichever claims the run in the
+    database) moves to the cold archive, or deletes when there is none:
+    memories older than ``min_age_days`` whose decayed score fell below
+    ``min_score``; messages older than ``message_days``; and the lowest-value
+    rows beyond the ``max_memories`` / ``max_messages`` / ``max_db_mb`` caps.
+    Archived rows older than ``archive_days`` are deleted, and freed pages
+    are released ``vacuum_pages`` at a time with incremental VACUUM (once
+    the database uses incremental auto-vacuum). Zero disables a cap.
+    """
+
+    def __init__(self, memory, archive=None, half_life_days=30, access_bump=1.0, min_score=0.5,
+                 min_age_days=7, max_memories=0, message_days=90, max_messages=0, max_db_mb=0,
+                 archive_days=0, interval=3600, flush_interval=30, vacuum_pages=1000, on_archive=None):
+        """Create the manager and start its background thread"""
+        self.memory = memory
+        self.archive = archive
+        self.half_life = half_life_days * SECONDS_PER_DAY
+        self.access_bump = access_bump
+        self.min_score = min_score
+        self.min_age_days = min_age_days
+        self.max_memories = max_memories
+        self.message_days = message_days
+        self.max_messages = max_messages
+        self.max_db_bytes = max_db_mb * 1024 * 1024
+        self.archive_days = archive_days
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.vacuum_pages = vacuum_pages
+        self.on_archive = on_archive  # Called with the ids of memories leaving the main database
+
+        # Counters exposed through stats()
+        self.runs = 0
+        self.bumps = 0
+        self.archived_memories = 0
+        self.archived_messages = 0
+        self.deleted = 0
+        self.last_run = None
+
+        self._pending = Counter()  # memory id -> retrievals not yet applied
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start()
+        atexit.register(self.close)
+
+    def _start(self):
+        """Start the background thread for the current process"""
+        self._pid = os.getpid()
+        self._pending = Counter()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def record_access(self, memory_ids):
+        """Count retrievals of memories; applied with the next flush"""
+        with self._lock:
+            # Threads don't survive a fork, so each worker needs its own
+            if self._pid != os.getpid():
+                self._start()
+            self._pending.update(memory_ids)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush_access()
+                if self._due():
+                    self.run()
+            except Exception as e:
+                metrics.log_error("Error in retention maintenance", e, where="retention")
+
+    def close(self, timeout=5.0):
+        """Apply pending retrievals and stop the background thread"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopped.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.flush_access()
+
+    def _score_now(self, key, importance, timestamp, now):
+        """Decayed score of a row, deriving it from importance and age if it has no key yet"""
+        if key is not None:
+            return decayed_score(key, now, self.half_life)
+        created = iso_to_epoch(timestamp) or now
+        return max(importance or 0, MIN_SCORE) * 2 ** (-(now - created) / self.half_life)
+
+    def flush_access(self):
+        """Add the bump for each pending retrieval to the memories' scores"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+
+        now = time.time()
+        ids = list(pending)
+        with self.memory.pool.connection() as conn, conn:
+            for start in range(0, len(ids), BATCH_SIZE):
+                chunk = ids[start:start + BATCH_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT id, retention, importance, timestamp FROM memories WHERE id IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE memories SET retention = ?, access_count = access_count + ? WHERE id = ?",
+                    [
+                        (retention_key(self._score_now(key, importance, timestamp, now)
+                                       + self.access_bump * pending[memory_id], now, self.half_life),
+                         pending[memory_id], memory_id)
+                        for memory_id, key, importance, timestamp in rows
+                    ]
+                )
+        with self._lock:
+            self.bumps += sum(pending.values())
+        return len(ids)
+
+    def _due(self):
+        with self.memory.pool.connection() as conn:
+            row = conn.execute("SELECT value FROM retention_state WHERE key = 'last_run'").fetchone()
+        return row is None or time.time() - row[0] >= self.interval
+
+    def _claim(self, conn):
+        """Record this worker as running maintenance unless another did so within the interval"""
+        now = time.time()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO retention_state (key, value) VALUES ('last_run', 0)")
+            claimed = conn.execute(
+                "UPDATE retention_state SET value = ? WHERE key = 'last_run' AND value <= ?",
+                (now, now - self.interval)
+            ).rowcount
+        return claimed == 1
+
+    def run(self, force=False):
+        """Run one maintenance pass; returns its report, or None if another worker ran it"""
+        conn = connect(self.memory.db_path)
+        try:
+            if not self._claim(conn) and not force:
+                return None
+            started = time.perf_counter()
+            report = {"rescaled": self._rescale(conn)}
+            report["backfilled"] = self._backfill(conn)
+
+            now = time.time()
+            cutoff = datetime.datetime.fromtimestamp(now - self.min_age_days * SECONDS_PER_DAY).isoformat()
+            threshold = math.log2(max(self.min_score, MIN_SCORE)) + now / self.half_life
+            report["decayed_memories"] = self._move_memories(
+                conn, "retention < ? AND timestamp < ?", (threshold, cutoff), "retention")
+            report["old_messages"] = self._move_messages(
+                conn, "ts < ?", (int((now - self.message_days * SECONDS_PER_DAY) * 1000),), "ts"
+            ) if self.message_days > 0 else 0
+
+            report["capped_memories"] = self._cap(conn, "memories", self.max_memories, self._move_memories, "retention")
+            report["capped_messages"] = self._cap(conn, "messages", self.max_messages, self._move_messages, "ts")
+            report["size_capped"] = self._enforce_size(conn)
+
+            if self.archive is not None and self.archive_days > 0:
+                report["archive_pruned"] = self.archive.prune(int(now - self.archive_days * SECONDS_PER_DAY))
+                self.archive.vacuum(self.vacuum_pages)
+            report["vacuumed_pages"] = self._vacuum(conn)
+            report["seconds"] = round(time.perf_counter() - started, 3)
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.runs += 1
+            self.last_run = dict(report, finished_at=time.time())
+        return report
+
+    def _backfill(self, conn):
+        """Give rows stored without a retention key one derived from their importance and age"""
+        now = time.time()
+        filled = 0
+        for _ in range(MAX_BATCHES):
+            rows = conn.execute(
+                "SELECT id, importance, timestamp FROM memories WHERE retention IS NULL LIMIT ?", (BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany("UPDATE memories SET retention = ? WHERE id = ?", [
+                    (retention_key(self._score_now(None, importance, timestamp, now), now, self.half_life), memory_id)
+                    for memory_id, importance, timestamp in rows
+                ])
+            filled += len(rows)
+        return filled
+
+    def _rescale(self, conn):
+        """Convert stored keys when the configured half-life changes, preserving current scores"""
+        row = conn.execute("SELECT value FROM retention_state WHERE key = 'half_life'").fetchone()
+        if row is not None and row[0] == self.half_life:
+            return False
+        now = time.time()
+        with conn:
+            if row is not None:
+                conn.execute(
+                    "UPDATE memories SET retention = retention - ? + ? WHERE retention IS NOT NULL",
+                    (now / row[0], now / self.half_life)
+                )
+            conn.execute("INSERT OR REPLACE INTO retention_state (key, value) VALUES ('half_life', ?)",
+                         (self.half_life,))
+        return row is not None
+
+    def _move_memories(self, conn, where, params, order, limit=None):
+        """Archive (or delete) memories matching a condition, a batch at a time
+
+        The newest row always stays: SQLite hands out max(id) + 1 as the next
+        id, so keeping it means ids are never reused for new rows while older
+        rows with the same id sit in the archive.
+        """
+        newest = conn.execute("SELECT MAX(id) FROM memories").fetchone()[0] or 0
+        moved = 0
+        for _ in range(MAX_BATCHES):
+            batch = BATCH_SIZE if limit is None else min(BATCH_SIZE, limit - moved)
+            if batch <= 0:
+                break
+            rows = conn.execute(
+                f"SELECT id, timestamp, content, importance, metadata FROM memories "
+                f"WHERE id < ? AND {where} ORDER BY {order} LIMIT ?",
+                (newest,) + params + (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            # Archive first: a crash in between leaves a duplicate, never a loss
+            if self.archive is not None:
+                self.archive.add_memories(rows)
+            with conn:
+                conn.executemany("DELETE FROM memories WHERE id = ?", [(memory_id,) for memory_id in ids])
+            if self.on_archive is not None:
+                self.on_archive(ids)
+            moved += len(rows)
+            if len(rows) < batch:
+                break
+        with self._lock:
+            if self.archive is not None:
+                self.archived_memories += moved
+            else:
+                self.deleted += moved
+        return moved
+
+    def _move_messages(self, conn, where, params, order, limit=None):
+        """Archive (or delete) messages matching a condition, a batch at a time (keeping the newest)"""
+        newest = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+        moved = 0
+        for _ in range(MAX_BATCHES):
+            batch = BATCH_SIZE if limit is None else min(BATCH_SIZE, limit - moved)
+            if batch <= 0:
+                break
+            rows = conn.execute(
+                f"SELECT id, session_id, role, content, ts, metadata, record FROM messages "
+                f"WHERE id < ? AND {where} ORDER BY {order} LIMIT ?",
+                (newest,) + params + (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            if self.archive is not None:
+                self.archive.add_messages([self.memory.decode_message_row(row) for row in rows])
+            with conn:
+                conn.executemany("DELETE FROM messages WHERE id = ?", [(row[0],) for row in rows])
+            moved += len(rows)
+            if len(rows) < batch:
+                break
+        with self._lock:
+            if self.archive is not None:
+                self.archived_messages += moved
+            else:
+                self.deleted += moved
+        return moved
+
+    def _cap(self, conn, table, cap, move, order):
+        """Move the lowest-value rows of a table beyond its row cap"""
+        if cap <= 0:
+            return 0
+        excess = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - cap
+        if excess <= 0:
+            return 0
+        return move(conn, "1", (), order, limit=excess)
+
+    def _used_bytes(self, conn):
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return pages * page_size
+
+    def _enforce_size(self, conn):
+        """Move the oldest messages and lowest-value memories out until the data fits ``max_db_mb``"""
+        if self.max_db_bytes <= 0:
+            return 0
+        moved = 0
+        for _ in range(MAX_BATCHES):
+            if self._used_bytes(conn) <= self.max_db_bytes:
+                break
+            step = self._move_messages(conn, "1", (), "ts", limit=BATCH_SIZE)
+            step += self._move_memories(conn, "1", (), "retention", limit=BATCH_SIZE)
+            if not step:
+                break
+            moved += step
+        return moved
+
+    def _vacuum(self, conn):
+        """Release up to ``vacuum_pages`` free pages of the main database
+
+        Does nothing until the database uses incremental auto-vacuum (see
+        ``migrate-db --vacuum``): converting it takes a full VACUUM, which
+        would lock out every request for as long as it runs.
+        """
+        if self.vacuum_pages <= 0 or not incremental_vacuum_enabled(conn):
+            return 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        return min(free, self.vacuum_pages)
+
+    def get_memories(self, memory_ids):
+        """Fetch memories by id from the main database, falling back to the archive"""
+        found = self.memory.get_memories_by_ids(memory_ids)
+        missing = set(memory_ids) - {item["id"] for item in found}
+        if missing and self.archive is not None:
+            found.extend(self.archive.get_memories(list(missing)))
+        return found
+
+    def stats(self):
+        """Return maintenance counters and archive size"""
+        with self._lock:
+            stats = {
+                "runs": self.runs,
+                "bumps": self.bumps,
+                "pending_bumps": len(self._pending),
+                "archived_memories": self.archived_memories,
+                "archived_messages": self.archived_messages,
+                "deleted": self.deleted,
+                "last_run": self.last_run,
+            }
+        if self.archive is not None:
+            stats["archive"] = self.archive.stats()
+        return stats
@@ -0,0 +1,246 @@
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Words and the character trigrams inside them are the embedding features
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Function words that carry no topical meaning and would dominate short queries
+STOP_WORDS = frozenset("""
+a about am an and are as at be been but by can could did do does for from had has have he her
+him his how i if in into is it its me my no not of on or our she so some something than that the
+their them then there these they this to us was we were what when where which who why will with
+would you your
+""".split())
+
+
+class HashingEmbedder:
+    """Dependency-free text embedder using signed feature hashing
+
+    Each text becomes a bag of lowercased words plus character trigrams of those
+    words, hashed with CRC32 (stable across processes) into a fixed number of
+    dimensions. Counts are log-scaled and the vector is L2-normalized, so a dot
+    product between two embeddings is their cosine similarity.
+    """
+
+    def __init__(self, dim=512, trigram_weight=0.5):
+        """Create an embedder producing ``dim``-dimensional vectors"""
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+
+    def _features(self, text):
+        """Yield (feature, weight) pairs for a text"""
+        for word in WORD_PATTERN.findall(text.lower()):
+            if word in STOP_WORDS:
+                continue
+            yield "w:" + word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3], self.trigram_weight
+
+    def embed(self, texts):
+        """Embed a batch of texts into a (len(texts), dim) float32 matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices = []
+            weights = []
+            for feature, weight in self._features(text or ""):
+                h = zlib.crc32(feature.encode("utf-8"))
+                indices.append(h % self.dim)
+                # Use the top bit as the sign so collisions tend to cancel out
+                weights.append(weight if h & 0x80000000 else -weight)
+            if not indices:
+                continue
+            vector = np.bincount(indices, weights=weights, minlength=self.dim)
+            vector = np.sign(vector) * np.log1p(np.abs(vector))
+            norm = np.linalg.norm(vector)
+            if norm:
+                matrix[row] = vector / norm
+        return matrix
+
+
+class SemanticIndex:
+    """In-memory cosine-similarity index over the memories table
+
+    Vectors live in a growable NumPy matrix with a parallel array of memory
+    ids. The index is saved next to the database as ``.npy`` files, loaded
+    memory-mapped at start-up, and caught up with rows added by other worker
+    processes before each search.
+    """
+
+    def __init__(self, memory, path=None, embedder=None, save_every=100, recheck_interval=60):
+        """Create the index for a Memory instance, loading saved vectors if present"""
+        self.memory = memory
+        self.embedder = embedder or HashingEmbedder()
+        self.path = path or memory.db_path
+        self.save_every = save_every
+        self.recheck_interval = recheck_interval
+
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        self._rows = {}  # memory id -> row in the matrix
+        self._max_id = 0
+        self._unsaved = 0
+        self._checked_at = 0.0
+
+        self._load()
+
+    @property
+    def vectors_file(self):
+        return f"{self.path}.vectors.npy"
+
+    @property
+    def ids_file(self):
+        return f"{self.path}.vector_ids.npy"
+
+    def __len__(self):
+        return self._size
+
+    def _load(self):
+        """Memory-map previously saved vectors, ignoring stale or mismatched files"""
+        try:
+            vectors = np.load(self.vectors_file, mmap_mode="r")
+            ids = np.load(self.ids_file)
+        except (OSError, ValueError):
+            return
+        if vectors.ndim != 2 or vectors.shape[1] != self.embedder.dim or len(vectors) != len(ids):
+            return
+
+        with self._lock:
+            self._vectors = vectors
+            self._ids = ids
+            self._size = len(ids)
+            self._rows = {int(memory_id): row for row, memory_id in enumerate(ids)}
+            self._max_id = int(ids.max()) if len(ids) else 0
+
+    def save(self):
+        """Write the vectors next to the database, replacing the files atomically"""
+        with self._lock:
+            vectors = np.ascontiguousarray(self._vectors[:self._size])
+            ids = self._ids[:self._size].copy()
+            self._unsaved = 0
+
+        for target, array in ((self.vectors_file, vectors), (self.ids_file, ids)):
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, target)
+
+    def close(self):
+        """Save any vectors added since the last save"""
+        if self._unsaved:
+            self.save()
+
+    def _reserve(self, extra):
+        """Grow the matrix (doubling) so ``extra`` more rows fit (caller holds the lock)"""
+        needed = self._size + extra
+        capacity = len(self._vectors)
+        if needed <= capacity and isinstance(self._vectors, np.ndarray) and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, capacity * 2, 64)
+        vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._vectors = vectors
+        self._ids = ids
+
+    def add(self, items):
+        """Add or replace (memory id, text) pairs"""
+        items = list(items)
+        if not items:
+            return
+        embeddings = self.embedder.embed([text for _, text in items])
+
+        with self._lock:
+            self._reserve(len(items))
+            for (memory_id, _), vector in zip(items, embeddings):
+                row = self._rows.get(memory_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[memory_id] = row
+                    self._ids[row] = memory_id
+                self._vectors[row] = vector
+                self._max_id = max(self._max_id, memory_id)
+            self._unsaved += len(items)
+            should_save = self._unsaved >= self.save_every
+
+        if should_save:
+            self.save()
+
+    def remove(self, memory_ids):
+        """Remove memories from the index by moving the last row into each hole"""
+        with self._lock:
+            self._reserve(0)
+            for memory_id in memory_ids:
+                row = self._rows.pop(memory_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    moved_id = int(self._ids[last])
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = moved_id
+                    self._rows[moved_id] = row
+                self._size -= 1
+                self._unsaved += 1
+
+    def sync(self, max_rows=None):
+        """Embed memories added since the last sync; returns the number indexed"""
+        rows = self.memory.get_memories_after(self._max_id, limit=max_rows)
+        self.add(rows)
+
+        # Periodically look for rows deleted elsewhere (a size mismatch) and drop them
+        now = time.monotonic()
+        if (max_rows is None or len(rows) < max_rows) and now - self._checked_at >= self.recheck_interval:
+            self._checked_at = now
+            if self.memory.count_memories() != self._size:
+                live = set(self.memory.get_memory_ids())
+                self.remove([memory_id for memory_id in list(self._rows) if memory_id not in live])
+        return len(rows)
+
+    def search_many(self, queries, k=3, min_score=0.15):
+        """Return the top-k (memory id, score) pairs for each query"""
+        query_vectors = self.embedder.embed(queries)
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return [[] for _ in queries]
+            scores = query_vectors @ self._vectors[:size].T
+            ids = self._ids[:size].copy()
+
+        k = min(k, size)
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(int(ids[i]), float(row[i])) for i in top if row[i] >= min_score])
+        return results
+
+    def search(self, query, k=3, budget_ms=50, min_score=0.15):
+        """Find the memories most relevant to a query within a latency budget
+
+        Catching up with new memories is done in small batches and stops once
+        the budget is spent; whatever has been indexed so far is searched.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        while self.sync(max_rows=256) == 256 and time.perf_counter() < deadline:
+            pass
+
+        matches = self.search_many([query], k=k, min_score=min_score)[0]
+        if not matches:
+            return []
+
+        scores = dict(matches)
+        memories = self.memory.get_memories_by_ids(list(scores))
+        for item in memories:
+            item["score"] = scores[item["id"]]
+        memories.sort(key=lambda item: item["score"], reverse=True)
+        return memories
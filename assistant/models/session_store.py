@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from models.context_packer import Turn
+
+
+class _Session:
+    """Conversation state for a single session"""
+
+    __slots__ = ("messages", "chars", "tokens", "summary", "last_access")
+
+    def __init__(self, now, max_messages):
+        # A bounded deque drops the oldest turn in O(1) when a new one arrives
+        self.messages = deque(maxlen=max_messages)
+        self.chars = 0
+        self.tokens = 0  # Estimated prompt tokens of the stored turns
+        self.summary = None  # Turn summarizing turns that were compacted away
+        self.last_access = now
+
+
+class SessionStore:
+    """Thread-safe, bounded store of per-session conversation histories
+
+    Sessions are kept in least-recently-used order. Idle sessions are dropped
+    after ``ttl`` seconds, and the least recently used sessions are evicted
+    whenever the session count or the total number of stored characters goes
+    over its cap. Older turns can be replaced by a summary with ``compact``.
+    """
+
+    def __init__(self, max_sessions=5000, max_total_chars=20000000, ttl=3600, max_messages=20):
+        """Initialize an empty store with the given limits"""
+        self.max_sessions = max_sessions
+        self.max_total_chars = max_total_chars
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_chars = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_history(self, session_id):
+        """Return a copy of the turns stored for a session, oldest first"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            state = self._sessions.get(session_id)
+            if state is None:
+                self.misses += 1
+                return []
+            self.hits += 1
+            state.last_access = now
+            self._sessions.move_to_end(session_id)
+            return list(state.messages)
+
+    def append(self, session_id, role, content):
+        """Append a message to a session, creating the session if needed"""
+        now = time.monotonic()
+        turn = Turn(role, content)
+        size = len(content or "")
+        tokens = turn.tokens  # Estimated outside the lock
+
+        with self._lock:
+            self._expire(now)
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = _Session(now, self.max_messages)
+                self._sessions[session_id] = state
+            else:
+                self._sessions.move_to_end(session_id)
+            state.last_access = now
+
+            # Account for the turn the deque is about to drop
+            if len(state.messages) == self.max_messages:
+                dropped = state.messages[0]
+                state.chars -= len(dropped.content or "")
+                state.tokens -= dropped.tokens
+                self._total_chars -= len(dropped.content or "")
+
+            state.messages.append(turn)
+            state.chars += size
+            state.tokens += tokens
+            self._total_chars += size
+
+            self._enforce_limits(session_id)
+
+    def get_summary(self, session_id):
+        """Return the summary Turn of a session's compacted turns, or None"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return state.summary if state is not None else None
+
+    def size(self, session_id):
+        """Return ``(messages, tokens)`` stored for a session, or None if unknown"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            return len(state.messages), state.tokens
+
+    def compact(self, session_id, turns, summary):
+        """Replace the given oldest turns of a session with a summary
+
+        ``turns`` must be a prefix of what ``get_history`` returned; turns that
+        were dropped or compacted since are skipped. ``summary`` is the Turn
+        replacing them. Returns the number of turns removed.
+        """
+        compacted = {id(turn) for turn in turns}
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return 0
+
+            removed = 0
+            while state.messages and id(state.messages[0]) in compacted:
+                turn = state.messages.popleft()
+                state.chars -= len(turn.content or "")
+                state.tokens -= turn.tokens
+                self._total_chars -= len(turn.content or "")
+                removed += 1
+
+            if state.summary is not None:
+                state.chars -= len(state.summary.content)
+                self._total_chars -= len(state.summary.content)
+            state.summary = summary
+            state.chars += len(summary.content)
+            self._total_chars += len(summary.content)
+
+            self._enforce_limits(session_id)
+            return removed
+
+    def restore(self, session_id, summary=None):
+        """Start an uncached session, with the summary of turns compacted before it was dropped
+
+        Returns False, changing nothing, when the session is still cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if session_id in self._sessions:
+                return False
+            state = self._sessions[session_id] = _Session(now, self.max_messages)
+            if summary is not None:
+                state.summary = summary
+                state.chars = len(summary.content)
+                self._total_chars += state.chars
+            self._enforce_limits(session_id)
+            return True
+
+    def __contains__(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return state is not None and not (self.ttl and state.last_access < time.monotonic() - self.ttl)
+
+    def clear(self, session_id):
+        """Forget everything stored for a session"""
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+            if state is not None:
+                self._total_chars -= state.chars
+
+    def stats(self):
+        """Return occupancy and hit/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(state.messages) for state in self._sessions.values()),
+                "summaries": sum(1 for state in self._sessions.values() if state.summary is not None),
+                "chars": self._total_chars,
+                "max_sessions": self.max_sessions,
+                "max_total_chars": self.max_total_chars,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _expire(self, now):
+        """Drop sessions idle for longer than the TTL (caller holds the lock)"""
+        if not self.ttl:
+            return
+        cutoff = now - self.ttl
+        # The dict is in access order, so expired sessions are at the front
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if state.last_access >= cutoff:
+                break
+            del self._sessions[session_id]
+            self._total_chars -= state.chars
+            self.expirations += 1
+
+    def _enforce_limits(self, keep):
+        """Evict least recently used sessions until within limits (caller holds the lock)"""
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_chars > self.max_total_chars
+        ):
+            session_id, state = self._sessions.popitem(last=False)
+            if session_id == keep:
+                # Never evict the session being written to; put it back as most recent
+                self._sessions[session_id] = state
+                continue
+            self._total_chars -= state.chars
+            self.evictions += 1
@@ -0,0 +1,73 @@
+import hashlib
+import re
+
+import numpy as np
+
+# Word characters that make up the features of a text
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+FINGERPRINT_BITS = 64
+
+# The fingerprint is split into this many 16-bit bands. Two fingerprints that
+# differ in at most BANDS - 1 bits agree exactly on at least one band, so
+# looking up rows sharing any band finds every such near-duplicate.
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def words(text):
+    """Case- and punctuation-insensitive set of the words in a text"""
+    return set(WORD_PATTERN.findall(text.casefold()))
+
+
+def jaccard(a, b):
+    """Jaccard similarity of two sets (1.0 for two empty sets)"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def features(text):
+    """Case- and punctuation-insensitive words and word pairs of a text"""
+    words = WORD_PATTERN.findall(text.casefold())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def simhash(text):
+    """64-bit SimHash of a text, or None if it has no words
+
+    Each bit is the majority vote of that bit across the hashes of the text's
+    features, so texts sharing most features get fingerprints differing in
+    only a few bits.
+    """
+    hashes = [_feature_hash(feature) for feature in features(text)]
+    if not hashes:
+        return None
+    # One row of 64 bits (least significant first) per feature, counted per column
+    bits = np.unpackbits(np.array(hashes, dtype="<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(majority, bitorder="little").tobytes(), "little")
+
+
+def bands(fingerprint):
+    """Split a fingerprint into its BANDS band values"""
+    return [fingerprint >> (band * BAND_BITS) & BAND_MASK for band in range(BANDS)]
+
+
+def hamming(a, b):
+    """Number of differing bits between two fingerprints"""
+    return bin(a ^ b).count("1")
+
+
+def to_signed(fingerprint):
+    """Store an unsigned 64-bit fingerprint in a signed SQLite INTEGER"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
@@ -0,0 +1,224 @@
+import atexit
+import os
+import queue
+import re
+import threading
+
+from models.context_packer import Turn, estimate_tokens, truncate_to_tokens
+from models.metrics import metrics
+from models.resilience import CallPolicy, CircuitBreaker
+
+# Sentinel telling the worker thread to exit
+_STOP = object()
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Arya, an AI assistant. "
+    "Merge the previous summary with the new conversation turns into one concise summary written "
+    "in the third person. Keep facts about the user (name, preferences, goals), decisions made, "
+    "open questions and anything Arya promised to do. Leave out jokes and small talk. "
+    "Reply with the summary only."
+)
+
+# Prefix of the summary message added to the prompt
+SUMMARY_LABEL = "Summary of the earlier conversation: "
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def extractive_summary(previous, turns, max_tokens):
+    """Summarize turns without the LLM by keeping the first sentence of each
+
+    Used when the API is unavailable, so compaction never loses a session's
+    history outright. The previous summary is shortened first to make room.
+    """
+    lines = []
+    for turn in turns:
+        speaker = "User" if turn.role == "user" else "Arya"
+        first = SENTENCE_END.split((turn.content or "").strip(), 1)[0]
+        lines.append(f"{speaker}: {truncate_to_tokens(first, 40)}")
+    text = " ".join(lines)
+    if previous:
+        room = max_tokens - estimate_tokens(text)
+        if room > 16:
+            text = f"{truncate_to_tokens(previous, room)} {text}"
+    return truncate_to_tokens(text, max_tokens)
+
+
+class ConversationSummarizer:
+    """Background compaction of long conversations into rolling summaries
+
+    After each exchange ``schedule`` checks a session's size. Once it holds
+    more than ``trigger_tokens`` (or is about to hit the session store's turn
+    limit), the session is queued, and a worker thread summarizes everything
+    but the most recent ``keep_tokens`` worth of turns together with the
+    previous summary. The summary replaces those turns in the session store,
+    so the prompt carries one short message instead of many raw turns, and is
+    saved as that session's summary in the database (replacing the previous
+    one) so it survives the session store. Summaries are never stored as
+    memories: they hold personal facts that must not reach other sessions.
+    """
+
+    def __init__(self, client, memory, trigger_tokens=2000, keep_tokens=600, max_tokens=256,
+                 policy=None, max_queue=1000):
+        """Create the summarizer and start its worker thread
+
+        ``client`` is the GroqClient whose sessions are compacted and whose
+        API calls produce the summaries. The calls run under their own
+        ``policy``, so background failures never trip the circuit breaker
+        that guards user requests.
+        """
+        self.client = client
+        self.memory = memory
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self.max_tokens = max_tokens
+        self.policy = policy or CallPolicy(breaker=CircuitBreaker())
+        self.max_queue = max_queue
+
+        # Counters exposed through stats()
+        self.scheduled = 0
+        self.compactions = 0
+        self.compacted_turns = 0
+        self.fallbacks = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._thread = None
+        self._start()
+        atexit.register(self.close)
+
+    def _start(self):
+        """Start the worker thread for the current process"""
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._pending = set()
+        self._thread = threading.Thread(target=self._run, name="conversation-summarizer", daemon=True)
+        self._thread.start()
+
+    def needs_compaction(self, session_id):
+        """Whether a session is large enough to be summarized"""
+        size = self.client.sessions.size(session_id)
+        if size is None:
+            return False
+        messages, tokens = size
+        return messages > 2 and (
+            tokens > self.trigger_tokens or messages >= self.client.sessions.max_messages - 2
+        )
+
+    def schedule(self, session_id):
+        """Queue a session for compaction if it has grown past the threshold"""
+        if not self.needs_compaction(session_id):
+            return False
+
+        with self._lock:
+            # Threads don't survive a fork, so a forked worker needs its own
+            if self._pid != os.getpid():
+                self._start()
+            if session_id in self._pending:
+                return False
+            self._pending.add(session_id)
+            self.scheduled += 1
+
+        try:
+            self._queue.put_nowait(session_id)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(session_id)
+            return False
+        return True
+
+    def load(self, session_id):
+        """The stored summary Turn of a session, or None"""
+        text = self.memory.get_session_summary(session_id)
+        return Turn("system", SUMMARY_LABEL + text) if text else None
+
+    def compact(self, session_id):
+        """Summarize a session's older turns now; returns the number of turns removed"""
+        sessions = self.client.sessions
+        history = sessions.get_history(session_id)
+
+        # Keep the newest turns up to keep_tokens; everything older is summarized
+        kept = 0
+        split = len(history)
+        while split > 0 and kept + history[split - 1].tokens <= self.keep_tokens:
+            split -= 1
+            kept += history[split].tokens
+        split = min(split, len(history) - 2)
+        if split < 2:
+            return 0
+        turns = history[:split]
+
+        previous = sessions.get_summary(session_id)
+        if previous is not None:
+            previous_text = previous.content[len(SUMMARY_LABEL):]
+        else:
+            # The session store may have dropped the session since it was last summarized
+            previous_text = self.memory.get_session_summary(session_id) or ""
+        text = self._summarize(previous_text, turns)
+
+        removed = sessions.compact(session_id, turns, Turn("system", SUMMARY_LABEL + text))
+        self.memory.save_session_summary(session_id, text, removed)
+
+        with self._lock:
+            self.compactions += 1
+            self.compacted_turns += removed
+        return removed
+
+    def _summarize(self, previous, turns):
+        """Ask the LLM for a summary, falling back to an extractive one"""
+        transcript = "\n".join(
+            f"{'User' if turn.role == 'user' else 'Arya'}: {turn.content}" for turn in turns
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Previous summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"},
+        ]
+        try:
+            text = self.client._complete(messages, max_tokens=self.max_tokens, policy=self.policy).strip()
+            if text:
+                return truncate_to_tokens(text, self.max_tokens)
+        except Exception as e:
+            metrics.log_error("Error summarizing conversation", e, where="summarizer")
+
+        with self._lock:
+            self.fallbacks += 1
+        return extractive_summary(previous, turns, self.max_tokens)
+
+    def _run(self):
+        """Worker loop: compact queued sessions one at a time"""
+        while True:
+            session_id = self._queue.get()
+            if session_id is _STOP:
+                return
+            try:
+                self.compact(session_id)
+            except Exception as e:
+                metrics.log_error("Error compacting conversation", e, where="summarizer")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(session_id)
+
+    def close(self, timeout=5.0):
+        """Stop the worker after the sessions already queued"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        """Return compaction counters"""
+        with self._lock:
+            return {
+                "trigger_tokens": self.trigger_tokens,
+                "keep_tokens": self.keep_tokens,
+                "scheduled": self.scheduled,
+                "pending": len(self._pending),
+                "compactions": self.compactions,
+                "compacted_turns": self.compacted_turns,
+                "fallbacks": self.fallbacks,
+                "failed": self.failed,
+            }
@@ -0,0 +1,272 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+import requests
+
+from models.metrics import metrics
+
+# Word characters used to normalize queries and index fixture documents
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+
+# Most results a search returns (also the most Google returns per request)
+MAX_RESULTS = 10
+
+
+def normalize_query(query):
+    """Case- and punctuation-insensitive form of a query, used as its cache key"""
+    return " ".join(TERM_PATTERN.findall(query.casefold()))
+
+
+def url_key(url):
+    """Key under which results pointing at the same page are deduplicated"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}{parts.path.rstrip('/')}?{parts.query}" if parts.query else f"{host}{parts.path.rstrip('/')}"
+
+
+class SearchProvider:
+    """A web search backend
+
+    Subclasses implement ``search(query, limit)`` returning a ranked list of
+    ``{"title", "snippet", "url"}`` dicts. ``timeout`` is the provider's
+    deadline in seconds; None takes the WebSearch default.
+    """
+
+    name = "provider"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def search(self, query, limit):
+        raise NotImplementedError
+
+
+class GoogleSearchProvider(SearchProvider):
+    """Google Programmable Search (Custom Search JSON API)"""
+
+    name = "google"
+
+    def __init__(self, api_key, engine_id, timeout=None):
+        super().__init__(timeout)
+        self.api_key = api_key
+        self.engine_id = engine_id
+        self.session = requests.Session()
+
+    def search(self, query, limit):
+        response = self.session.get(
+            GOOGLE_SEARCH_URL,
+            params={"key": self.api_key, "cx": self.engine_id, "q": query, "num": min(limit, MAX_RESULTS)},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return [
+            {"title": item.get("title", ""), "snippet": item.get("snippet", ""), "url": item.get("link", "")}
+            for item in response.json().get("items", [])
+        ]
+
+
+class FixtureSearchProvider(SearchProvider):
+    """Offline provider searching a fixed set of documents
+
+    Documents are ``{"title", "snippet", "url"}`` dicts, given directly or
+    loaded from a JSON file, and are ranked by how many query terms they
+    contain. Useful for tests, benchmarks and running without network access;
+    ``delay`` simulates a provider's response time.
+    """
+
+    name = "fixture"
+
+    def __init__(self, documents=None, path=None, delay=0.0, timeout=None):
+        super().__init__(timeout)
+        if path is not None:
+            with open(path) as f:
+                documents = json.load(f)
+        self.documents = list(documents or [])
+        self.delay = delay
+
+        # Inverted index: term -> ids of the documents containing it
+        self._index = {}
+        for doc_id, document in enumerate(self.documents):
+            text = f"{document.get('title', '')} {document.get('snippet', '')}".casefold()
+            for term in set(TERM_PATTERN.findall(text)):
+                self._index.setdefault(term, []).append(doc_id)
+
+    def search(self, query, limit):
+        if self.delay:
+            time.sleep(self.delay)
+        scores = {}
+        for term in set(TERM_PATTERN.findall(query.casefold())):
+            for doc_id in self._index.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0) + 1
+        ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:limit]
+        return [dict(self.documents[doc_id]) for doc_id in ranked]
+
+
+# Provider classes by the names used in SEARCH_PROVIDERS
+PROVIDERS = {
+    "google": GoogleSearchProvider,
+    "fixture": FixtureSearchProvider,
+}
+
+
+def providers_from_config(names, api_key=None, engine_id=None, fixture_path=None):
+    """Create the named providers; with no names, every provider that is configured"""
+    if not names:
+        names = []
+        if api_key and engine_id:
+            names.append("google")
+        if fixture_path:
+            names.append("fixture")
+
+    providers = []
+    for name in names:
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown search provider: {name}")
+        if name == "google":
+            providers.append(GoogleSearchProvider(api_key, engine_id))
+        else:
+            providers.append(FixtureSearchProvider(path=fixture_path))
+    return providers
+
+
+class WebSearch:
+    """Concurrent fan-out over several search providers with a TTL cache in front
+
+    A query is sent to every provider at once on a shared thread pool, and
+    each provider's answer is used if it arrives within that provider's
+    deadline, so a search takes as long as the slowest allowed provider rather
+    than the sum of them. Answers are interleaved by rank and deduplicated by
+    URL. Complete result sets are cached per normalized query for ``cache_ttl``
+    seconds; results missing a provider that failed or timed out are not.
+    """
+
+    def __init__(self, providers, timeout=2.0, cache_ttl=300, cache_size=1024, max_workers=16):
+        """Create the searcher; ``timeout`` is the default per-provider deadline"""
+        self.providers = list(providers)
+        for provider in self.providers:
+            # Providers also use their deadline to time out their own requests
+            if provider.timeout is None:
+                provider.timeout = timeout
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.max_workers = max_workers
+
+        self._cache = OrderedDict()  # (normalized query, limit) -> (expires_at, results)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+        # Counters exposed through stats()
+        self.searches = 0
+        self.cache_hits = 0
+        self.provider_errors = {provider.name: 0 for provider in self.providers}
+        self.provider_timeouts = {provider.name: 0 for provider in self.providers}
+
+    @property
+    def enabled(self):
+        return bool(self.providers)
+
+    def _executor(self):
+        """Thread pool of the current process (threads don't survive a fork)"""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="web-search")
+                self._pid = os.getpid()
+            return self._pool
+
+    def search(self, query, limit=5):
+        """Return up to ``limit`` (1 to MAX_RESULTS) merged results for a query"""
+        normalized = normalize_query(query)
+        if not normalized or not self.providers:
+            return []
+
+        # Bounded so callers can't fill the cache with one query under many limits
+        limit = max(1, min(limit, MAX_RESULTS))
+        key = (normalized, limit)
+        now = time.monotonic()
+        with self._lock:
+            self.searches += 1
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+                    return [dict(result) for result in entry[1]]
+                del self._cache[key]
+
+        rankings, complete = self._fan_out(query, limit)
+        results = self._merge(rankings, limit)
+
+        if complete:
+            with self._lock:
+                self._cache[key] = (time.monotonic() + self.cache_ttl, results)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [dict(result) for result in results]
+
+    def _fan_out(self, query, limit):
+        """Query every provider concurrently; returns (rankings, whether all answered)"""
+        executor = self._executor()
+        started = time.monotonic()
+        futures = [(provider, executor.submit(provider.search, query, limit)) for provider in self.providers]
+
+        rankings, complete = [], True
+        for provider, future in futures:
+            deadline = started + provider.timeout
+            try:
+                results = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                complete = False
+                with self._lock:
+                    self.provider_timeouts[provider.name] += 1
+                continue
+            except Exception as e:
+                complete = False
+                with self._lock:
+                    self.provider_errors[provider.name] += 1
+                metrics.log_error(f"Error searching with {provider.name}", e, where="search")
+                continue
+            rankings.append([dict(result, source=provider.name) for result in results])
+        return rankings, complete
+
+    @staticmethod
+    def _merge(rankings, limit):
+        """Interleave provider rankings by position, dropping duplicate URLs"""
+        merged, seen = [], set()
+        for position in range(max((len(ranking) for ranking in rankings), default=0)):
+            for ranking in rankings:
+                if position >= len(ranking):
+                    continue
+                result = ranking[position]
+                key = url_key(result.get("url") or result.get("title", ""))
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(result)
+                if len(merged) >= limit:
+                    return merged
+        return merged
+
+    def stats(self):
+        """Return cache and per-provider counters"""
+        with self._lock:
+            return {
+                "providers": [provider.name for provider in self.providers],
+                "searches": self.searches,
+                "cache_hits": self.cache_hits,
+                "cached_queries": len(self._cache),
+                "provider_errors": dict(self.provider_errors),
+                "provider_timeouts": dict(self.provider_timeouts),
+            }
@@ -158,37 +158,8 @@ function setupActionHandlers() {
         // Show typing indicator
         showTypingIndicator(true);
         
-        // Call the actual API instead of simulating responses
-        fetch('/api/send_message', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                message: messageText
-            })
-        })
-        .then(response => response.json())
-        .then(data => {
-            // Hide typing indicator
-            showTypingIndicator(false);
-            
-            // Add assistant response to conversation
-            addMessage('assistant', data.message);
-            
-            // Handle suggestions if provided in the API response
-            if (data.suggestions && data.suggestions.length > 0) {
-                updateSuggestions(data.suggestions);
-            }
-            
-            // Speak response if text-to-speech is enabled
-            const voiceOutputButton = document.querySelector('.voice-output-button');
-            if (voiceOutputButton && voiceOutputButton.getAttribute('data-enabled') === 'true') {
-                if (typeof window.speakText === 'function') {
-                    window.speakText(data.message);
-                }
-            }
-        })
+        // Stream the reply so text appears as soon as the first tokens arrive
+        streamAssistantReply(messageText)
         .catch(error => {
             console.error('Error:', error);
             showTypingIndicator(false);
@@ -219,6 +190,120 @@ function setupActionHandlers() {
     }
 }
 
+/**
+ * Stream the assistant reply from the Server-Sent Events endpoint
+ */
+function streamAssistantReply(messageText) {
+    return fetch('/api/stream_message', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+        },
+        body: JSON.stringify({
+            message: messageText
+        })
+    })
+    .then(response => {
+        if (!response.ok || !response.body) {
+            throw new Error(`Streaming request failed with status ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let liveMessage = null;
+        
+        // Handle one complete "event: ...\ndata: ..." block
+        const handleEvent = (block) => {
+            let eventName = 'message';
+            const dataLines = [];
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trimStart());
+                }
+            });
+            if (dataLines.length === 0) return;
+            const payload = JSON.parse(dataLines.join('\n'));
+            
+            if (eventName === 'done') {
+                if (liveMessage) liveMessage.remove();
+                showTypingIndicator(false);
+                handleAssistantReply(payload);
+            } else if (payload.delta) {
+                if (!liveMessage) {
+                    showTypingIndicator(false);
+                    liveMessage = createStreamingMessage();
+                }
+                appendStreamingText(liveMessage, payload.delta);
+            }
+        };
+        
+        const pump = () => reader.read().then(({ done, value }) => {
+            if (done) return;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                handleEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+            return pump();
+        });
+        
+        return pump();
+    });
+}
+
+/**
+ * Show the final assistant reply, suggestions and speech output
+ */
+function handleAssistantReply(data) {
+    // Add assistant response to conversation
+    addMessage('assistant', data.message);
+    
+    // Handle suggestions if provided in the API response
+    if (data.suggestions && data.suggestions.length > 0) {
+        updateSuggestions(data.suggestions);
+    }
+    
+    // Speak response if text-to-speech is enabled
+    const voiceOutputButton = document.querySelector('.voice-output-button');
+    if (voiceOutputButton && voiceOutputButton.getAttribute('data-enabled') === 'true') {
+        if (typeof window.speakText === 'function') {
+            window.speakText(data.message);
+        }
+    }
+}
+
+/**
+ * Create a placeholder assistant message that is filled in while streaming
+ */
+function createStreamingMessage() {
+    const messagesContainer = document.querySelector('.conversation-messages');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant-message message-appear';
+    messageDiv.innerHTML = '<div class="message-content"></div>';
+    if (messagesContainer) {
+        messagesContainer.appendChild(messageDiv);
+    }
+    return messageDiv;
+}
+
+/**
+ * Append a streamed text delta to the placeholder message
+ */
+function appendStreamingText(messageDiv, delta) {
+    const contentDiv = messageDiv.querySelector('.message-content');
+    contentDiv.appendChild(document.createTextNode(delta));
+    
+    const messagesContainer = messageDiv.parentElement;
+    if (messagesContainer) {
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+}
+
 /**
  * Add a message to the conversation
  */